@@ -0,0 +1,226 @@
+"""
+Benchmark de la conversión de valores de la importación.
+
+Genera filas sintéticas de una tabla ancha (enteros, flotantes, numéricos, textos,
+booleanos, fechas y timestamps, como texto de CSV o valores nativos de Excel, con
+vacíos y valores inválidos), las convierte celda por celda con convertir_valor_segun_tipo,
+con el plan de conversión compilado (motor 'python') y por columnas (motor 'pandas'),
+reporta el tiempo de cada uno y verifica que todos den los mismos valores y tipos.
+
+Con --corpus además convierte cada columna de los .xlsx/.csv de un directorio (p. ej.
+exports/) con cada tipo de columna y verifica que ambos motores coincidan con
+convertir_valor_segun_tipo.
+
+No requiere base de datos:
+    python BenchmarkImportacion.py --filas 20000 --columnas 120 --corpus exports
+"""
+import os
+import csv
+import glob
+import time
+import random
+import argparse
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, Integer, Numeric, String, Text
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+import ImportExcel
+from ImportExcel import (
+    convertir_valor_segun_tipo,
+    compilar_plan_conversion,
+    mapear_filas_importacion,
+    mapear_filas_importacion_pandas,
+    load_workbook
+)
+from ExportExcel import log_ok, log_fail, log_step
+
+# Tipos de columna que se repiten a lo ancho de la tabla sintética
+TIPOS_BENCHMARK = [Integer(), BigInteger(), Float(), Numeric(10, 3), String(100), Text(), Boolean(), Date(), DateTime()]
+
+# Formato de las fechas como texto; cada columna usa uno, como en un archivo real
+FORMATOS_FECHA_BENCHMARK = ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f"]
+
+def generar_valor(tipo, formato_fecha: str, aleatorio: random.Random):
+    """Valor de celda para una columna del tipo dado: texto de CSV, nativo de Excel, vacío o inválido."""
+    sorteo = aleatorio.random()
+    if sorteo < 0.05:
+        return None
+    if sorteo < 0.08:
+        return ""
+    if sorteo < 0.10:
+        return aleatorio.choice(["n/a", "  ", "abc", "1e400", "--"])
+    como_texto = sorteo < 0.6
+    if isinstance(tipo, Boolean):
+        return aleatorio.choice(["true", "false", "Sí", "no", "1", "0", " V ", "F"]) if como_texto else aleatorio.random() < 0.5
+    if isinstance(tipo, (Integer, BigInteger)):
+        numero = aleatorio.randrange(-10000, 100000)
+        return aleatorio.choice([str(numero), f" {numero}.0 "]) if como_texto else aleatorio.choice([numero, float(numero)])
+    if isinstance(tipo, (Float, Numeric)):
+        numero = round(aleatorio.uniform(-1000, 1000), 3)
+        return str(numero) if como_texto else numero
+    if isinstance(tipo, (Date, DateTime)):
+        fecha = datetime(2023, 1, 1) + timedelta(days=aleatorio.randrange(900), seconds=aleatorio.randrange(86400))
+        if not como_texto:
+            return fecha
+        return fecha.strftime(formato_fecha)
+    return f"Texto {aleatorio.randrange(1000)}" if como_texto else aleatorio.randrange(1000)
+
+def generar_tabla(filas: int, columnas: int, semilla: int = 42):
+    """Headers, mapeo, tipos y filas reproducibles de una tabla sintética ancha."""
+    aleatorio = random.Random(semilla)
+    headers = [f"col_{i}" for i in range(columnas)]
+    tipos = {header: TIPOS_BENCHMARK[i % len(TIPOS_BENCHMARK)] for i, header in enumerate(headers)}
+    formatos = {header: FORMATOS_FECHA_BENCHMARK[i % len(FORMATOS_FECHA_BENCHMARK)] for i, header in enumerate(headers)}
+    mapeo = {header: header for header in headers}
+    datos = [[generar_valor(tipos[header], formatos[header], aleatorio) for header in headers] for _ in range(filas)]
+    return headers, mapeo, tipos, datos
+
+def mapear_por_celda(rows, headers, mapeo_columnas, tipos_columnas):
+    """Conversión de referencia: convertir_valor_segun_tipo celda por celda, como antes del plan."""
+    resultado = []
+    for fila in rows:
+        datos = {}
+        for i, valor in enumerate(fila):
+            if i < len(headers) and headers[i] in mapeo_columnas:
+                columna = mapeo_columnas[headers[i]]
+                tipo_columna = tipos_columnas.get(columna)
+                if tipo_columna:
+                    try:
+                        valor_convertido = convertir_valor_segun_tipo(valor, tipo_columna)
+                    except Exception:
+                        valor_convertido = valor
+                else:
+                    valor_convertido = valor
+                datos[columna] = valor_convertido
+        resultado.append(datos)
+    return resultado
+
+def mapear_con_plan(rows, headers, mapeo_columnas, tipos_columnas):
+    """Conversión con el plan compilado, motor 'python' (el compilado se incluye en el tiempo medido)."""
+    plan = compilar_plan_conversion(headers, mapeo_columnas, tipos_columnas)
+    errores = {'errores_otros': 0}
+    return [datos for _, datos in mapear_filas_importacion(rows, plan, errores)]
+
+def mapear_con_pandas(rows, headers, mapeo_columnas, tipos_columnas):
+    """Conversión por columnas, motor 'pandas'."""
+    plan = compilar_plan_conversion(headers, mapeo_columnas, tipos_columnas)
+    errores = {'errores_otros': 0}
+    return [datos for _, datos in mapear_filas_importacion_pandas(rows, plan, errores)]
+
+MOTORES_BENCHMARK = (
+    ("convertir_valor_segun_tipo", mapear_por_celda),
+    ("plan de conversión", mapear_con_plan),
+    ("pandas", mapear_con_pandas),
+)
+
+def comparar_resultados(referencia: list, candidato: list) -> list:
+    """Retorna las diferencias (hasta 20) de valor o tipo entre dos conversiones."""
+    diferencias = []
+    if len(referencia) != len(candidato):
+        diferencias.append(f"Cantidad de filas distinta: {len(referencia)} vs {len(candidato)}")
+    for numero, (fila_a, fila_b) in enumerate(zip(referencia, candidato), start=1):
+        if list(fila_a) != list(fila_b):
+            diferencias.append(f"Fila {numero}: columnas distintas")
+        for columna, valor_a in fila_a.items():
+            valor_b = fila_b.get(columna)
+            # repr para que NaN coincida consigo mismo
+            if type(valor_a) is not type(valor_b) or repr(valor_a) != repr(valor_b):
+                diferencias.append(f"Fila {numero}, {columna}: {valor_a!r} vs {valor_b!r}")
+        if len(diferencias) >= 20:
+            break
+    return diferencias
+
+def leer_archivo_corpus(ruta: str) -> tuple:
+    """Headers y filas crudas (sin validar encabezados) de un .xlsx o .csv."""
+    if ruta.lower().endswith(".csv"):
+        with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+            filas = list(csv.reader(f))
+    else:
+        wb = load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            filas = [list(fila) for fila in wb.worksheets[0].iter_rows(values_only=True)]
+        finally:
+            wb.close()
+    if not filas:
+        return [], []
+    return [str(header) for header in filas[0]], filas[1:]
+
+def verificar_corpus(directorio: str) -> int:
+    """
+    Convierte cada archivo del directorio suponiendo, por turno, que todas sus columnas son de
+    cada tipo de TIPOS_BENCHMARK, y compara ambos motores con convertir_valor_segun_tipo.
+    Retorna la cantidad de diferencias.
+    """
+    rutas = sorted(glob.glob(os.path.join(directorio, "*.xlsx")) + glob.glob(os.path.join(directorio, "*.csv")))
+    celdas = 0
+    total_diferencias = 0
+    for ruta in rutas:
+        headers, rows = leer_archivo_corpus(ruta)
+        if not rows:
+            continue
+        mapeo = {header: header for header in headers}
+        for tipo in TIPOS_BENCHMARK:
+            tipos = {header: tipo for header in headers}
+            referencia = [datos for datos in mapear_por_celda(rows, headers, mapeo, tipos) if datos]
+            for nombre, funcion in MOTORES_BENCHMARK[1:]:
+                diferencias = comparar_resultados(referencia, funcion(rows, headers, mapeo, tipos))
+                for diferencia in diferencias:
+                    log_fail(f"{os.path.basename(ruta)} ({tipo.__class__.__name__}, {nombre}): {diferencia}")
+                total_diferencias += len(diferencias)
+            celdas += len(rows) * len(headers)
+    log_step(f"Corpus: {len(rutas)} archivo(s), {celdas} celdas por tipo, {len(TIPOS_BENCHMARK)} tipos")
+    return total_diferencias
+
+def medir(nombre: str, funcion, *args) -> tuple:
+    """Ejecuta la conversión y retorna (resultado, segundos)."""
+    log_step(f"Convirtiendo con {nombre}...")
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+def main():
+    """Función principal del script."""
+    parser = argparse.ArgumentParser(description="Compara la conversión por celda con los motores de conversión de la importación")
+    parser.add_argument("--filas", type=int, default=20000, help="Cantidad de filas sintéticas (default: 20000)")
+    parser.add_argument("--columnas", type=int, default=120, help="Cantidad de columnas de la tabla (default: 120)")
+    parser.add_argument("--sin-verificar", action="store_true", help="No comparar los valores convertidos")
+    parser.add_argument("--corpus", default=None, help="Directorio con archivos .xlsx/.csv reales para verificar los motores")
+    args = parser.parse_args()
+
+    headers, mapeo, tipos, rows = generar_tabla(args.filas, args.columnas)
+    # Los valores inválidos generan una advertencia por celda: no medir el logging
+    ImportExcel.logger.setLevel(logging.ERROR)
+    # La importación de pandas ocurre una vez por proceso: no medirla
+    ImportExcel._obtener_pandas()
+    resultados = [(nombre,) + medir(nombre, funcion, rows, headers, mapeo, tipos) for nombre, funcion in MOTORES_BENCHMARK]
+
+    celdas = args.filas * args.columnas
+    segundos_celda = resultados[0][2]
+    print(f"\n{'Conversión':<28} {'Celdas':>12} {'Segundos':>10} {'Celdas/s':>12} {'Aceleración':>12}")
+    for nombre, _, segundos in resultados:
+        print(f"{nombre:<28} {celdas:>12} {segundos:>10.2f} {celdas / segundos:>12.0f} {segundos_celda / segundos:>11.2f}x")
+    print()
+
+    if args.sin_verificar:
+        return
+    log_step("Verificando que todas las conversiones den los mismos valores y tipos...")
+    diferencias = []
+    for nombre, candidato, _ in resultados[1:]:
+        diferencias.extend(f"{nombre}: {diferencia}" for diferencia in comparar_resultados(resultados[0][1], candidato))
+    if args.corpus:
+        log_step(f"Verificando los motores con los archivos de {args.corpus}...")
+        cantidad = verificar_corpus(args.corpus)
+        if cantidad:
+            diferencias.append(f"{cantidad} diferencia(s) en el corpus")
+    if diferencias:
+        for diferencia in diferencias:
+            log_fail(diferencia)
+    else:
+        log_ok("Valores y tipos idénticos en todas las conversiones")
+
+if __name__ == "__main__":
+    main()
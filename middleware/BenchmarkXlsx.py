@@ -0,0 +1,182 @@
+"""
+Benchmark de los motores de escritura XLSX de la exportación.
+
+Genera filas sintéticas con los tipos de una tabla de análisis (enteros, decimales,
+textos repetidos, fechas, booleanos y nulos), las escribe con escribir_filas_xlsx usando
+el motor 'openpyxl' y el motor 'directo', y reporta tiempo, pico de memoria y tamaño
+de cada archivo. Luego verifica que ambos archivos tengan los mismos valores, estilos
+por celda y anchos de columna.
+
+No requiere base de datos:
+    python BenchmarkXlsx.py --filas 200000
+"""
+import os
+import re
+import time
+import random
+import zipfile
+import argparse
+import logging
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+from ExportExcel import (
+    MOTORES_XLSX,
+    OPENPYXL_AVAILABLE,
+    ESCRITOR_POR_TIPO_PG,
+    crear_escritor_columna,
+    load_workbook,
+    escribir_filas_xlsx,
+    log_ok,
+    log_fail,
+    log_step
+)
+
+COLUMNAS_BENCHMARK = [
+    "id_analisis", "lote", "especie", "germinacion", "peso_mil_semillas",
+    "fecha_inicio", "fecha_fin", "repetido", "observaciones", "comentarios",
+]
+
+# Tipos de PostgreSQL de cada columna, para armar los escritores por columna como en la exportación
+TIPOS_BENCHMARK = [
+    "bigint", "character varying", "text", "integer", "double precision",
+    "timestamp without time zone", "timestamp without time zone", "boolean", "text", "text",
+]
+
+PATRON_COL_XML = re.compile(r'<col [^>]*/>')
+PATRON_ATRIBUTO_XML = re.compile(r'(\w+)="([^"]*)"')
+
+def generar_filas(cantidad: int, semilla: int = 42):
+    """Filas sintéticas reproducibles con la mezcla de tipos de una tabla de análisis."""
+    aleatorio = random.Random(semilla)
+    especies = ["Trigo", "Cebada", "Soja", "Maíz", "Arroz", "Avena", "Raigrás", "Trébol blanco"]
+    base = datetime(2024, 1, 1, 8, 30)
+    for i in range(1, cantidad + 1):
+        inicio = base + timedelta(days=aleatorio.randrange(700), minutes=aleatorio.randrange(600))
+        yield (
+            i,
+            f"L-{aleatorio.randrange(5000):05d}",
+            aleatorio.choice(especies),
+            aleatorio.randrange(101),
+            round(aleatorio.uniform(1, 60), 3),
+            inicio,
+            inicio + timedelta(days=7) if aleatorio.random() < 0.8 else None,
+            aleatorio.random() < 0.1,
+            aleatorio.choice(["", "Sin observaciones", "Muestra húmeda", None]),
+            f"Comentario <{i}> & notas" if i % 17 == 0 else None,
+        )
+
+def medir_motor(motor: str, filas: int, ruta: str) -> dict:
+    """Escribe las filas con un motor y retorna tiempo, pico de memoria de Python y tamaño."""
+    escritores = tuple(crear_escritor_columna(*ESCRITOR_POR_TIPO_PG[tipo]) for tipo in TIPOS_BENCHMARK)
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    partes, total = escribir_filas_xlsx(
+        generar_filas(filas), "benchmark", COLUMNAS_BENCHMARK, ruta, motor_xlsx=motor, escritores=escritores
+    )
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'motor': motor,
+        'partes': partes,
+        'filas': total,
+        'segundos': segundos,
+        'pico_mb': pico / (1024 * 1024),
+        'bytes': sum(os.path.getsize(parte) for parte in partes),
+    }
+
+def leer_anchos(ruta: str) -> dict:
+    """Anchos de columna declarados en la primera hoja del archivo."""
+    with zipfile.ZipFile(ruta) as zf:
+        hoja = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    anchos = {}
+    for col in PATRON_COL_XML.findall(hoja):
+        atributos = dict(PATRON_ATRIBUTO_XML.findall(col))
+        anchos[int(atributos["min"])] = float(atributos["width"])
+    return anchos
+
+def firma_celda(cell) -> tuple:
+    """Valor y atributos de estilo visibles de una celda."""
+    return (
+        cell.value,
+        cell.alignment.horizontal,
+        bool(cell.font.b),
+        cell.fill.fgColor.rgb if cell.fill.fill_type else None,
+        cell.border.left.style,
+    )
+
+def comparar_archivos(ruta_a: str, ruta_b: str) -> list:
+    """Retorna las diferencias (hasta 20) entre dos archivos: celdas y anchos de columna."""
+    diferencias = []
+    anchos_a, anchos_b = leer_anchos(ruta_a), leer_anchos(ruta_b)
+    if anchos_a != anchos_b:
+        diferencias.append(f"Anchos distintos: {anchos_a} vs {anchos_b}")
+    wb_a = load_workbook(ruta_a, read_only=True)
+    wb_b = load_workbook(ruta_b, read_only=True)
+    try:
+        filas_a = wb_a.active.iter_rows()
+        filas_b = wb_b.active.iter_rows()
+        for numero, (fila_a, fila_b) in enumerate(zip(filas_a, filas_b), start=1):
+            for cell_a, cell_b in zip(fila_a, fila_b):
+                if firma_celda(cell_a) != firma_celda(cell_b):
+                    diferencias.append(f"Fila {numero}: {firma_celda(cell_a)} vs {firma_celda(cell_b)}")
+            if len(fila_a) != len(fila_b):
+                diferencias.append(f"Fila {numero}: {len(fila_a)} vs {len(fila_b)} celdas")
+            if len(diferencias) >= 20:
+                break
+        if next(filas_a, None) is not None or next(filas_b, None) is not None:
+            diferencias.append("Cantidad de filas distinta")
+    finally:
+        wb_a.close()
+        wb_b.close()
+    return diferencias
+
+def main():
+    """Función principal del script."""
+    parser = argparse.ArgumentParser(description="Compara los motores de escritura XLSX de la exportación")
+    parser.add_argument("--filas", type=int, default=100000, help="Cantidad de filas sintéticas (default: 100000)")
+    parser.add_argument("--out", default=None, help="Directorio para los archivos generados (default: temporal)")
+    parser.add_argument("--sin-verificar", action="store_true", help="No comparar el contenido de los archivos")
+    args = parser.parse_args()
+
+    if not OPENPYXL_AVAILABLE:
+        log_fail("openpyxl no está instalado (requerido como referencia del benchmark)")
+        return
+
+    out_dir = args.out or tempfile.mkdtemp(prefix="inia_benchmark_xlsx_")
+    os.makedirs(out_dir, exist_ok=True)
+    resultados = []
+    for motor in MOTORES_XLSX:
+        log_step(f"Escribiendo {args.filas} filas con el motor {motor}...")
+        resultados.append(medir_motor(motor, args.filas, os.path.join(out_dir, f"benchmark_{motor}.xlsx")))
+
+    print(f"\n{'Motor':<10} {'Filas':>10} {'Segundos':>10} {'Filas/s':>12} {'Pico MB':>9} {'Tamaño MB':>10}")
+    for r in resultados:
+        print(f"{r['motor']:<10} {r['filas']:>10} {r['segundos']:>10.2f} {r['filas'] / r['segundos']:>12.0f} "
+              f"{r['pico_mb']:>9.1f} {r['bytes'] / (1024 * 1024):>10.2f}")
+    referencia, directo = resultados
+    print(f"\nAceleración del motor directo: {referencia['segundos'] / directo['segundos']:.2f}x\n")
+
+    if args.sin_verificar:
+        return
+    log_step("Verificando que ambos archivos tengan el mismo contenido...")
+    diferencias = []
+    for parte_a, parte_b in zip(referencia['partes'], directo['partes']):
+        diferencias.extend(comparar_archivos(parte_a, parte_b))
+    if len(referencia['partes']) != len(directo['partes']):
+        diferencias.append(f"Partes distintas: {len(referencia['partes'])} vs {len(directo['partes'])}")
+    if diferencias:
+        for diferencia in diferencias:
+            log_fail(diferencia)
+    else:
+        log_ok("Valores, estilos y anchos idénticos en ambos motores")
+    log_step(f"Archivos en {out_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,30 @@
+import io
 import os
+import re
 import csv
+import math
+import time
+import queue
+import itertools
 import argparse
+import functools
+import shutil
 import logging
-from datetime import date, datetime
-from typing import Optional, Dict, Any, List
+import zipfile
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext, ExitStack
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Callable
 from urllib.parse import quote_plus
+from xml.sax.saxutils import escape as escapar_xml
 
 # Importar dependencias usando módulo común
-from dependencies_common import importar_sqlalchemy, importar_openpyxl
+from dependencies_common import importar_sqlalchemy, importar_openpyxl, importar_pyarrow
+from trace_common import TRAZA
 
 # Importar SQLAlchemy
 create_engine, text, inspect, _, sessionmaker, automap_base = importar_sqlalchemy()
@@ -15,11 +32,84 @@ create_engine, text, inspect, _, sessionmaker, automap_base = importar_sqlalchem
 # Importar openpyxl
 OPENPYXL_AVAILABLE, Workbook, load_workbook, get_column_letter, Font, PatternFill, Border, Side, Alignment = importar_openpyxl()
 import openpyxl.styles
+if OPENPYXL_AVAILABLE:
+    from openpyxl.styles import NamedStyle
+    from openpyxl.cell import WriteOnlyCell
+
+# Importar pyarrow (opcional, solo para formatos parquet y arrow)
+PYARROW_AVAILABLE, pa, pq = importar_pyarrow()
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Cantidad de filas que se traen por lote desde el cursor del servidor durante la exportación
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 5000))
+# Exportación en paralelo: una tabla por worker, cada uno con su propia conexión del pool
+EXPORT_PARALLEL = os.getenv("EXPORT_PARALLEL", "false").lower() in ("1", "true", "yes")
+EXPORT_PARALLEL_WORKERS = int(os.getenv("EXPORT_PARALLEL_WORKERS", 4))
+# En modo paralelo, todos los workers leen el mismo snapshot (pg_export_snapshot)
+EXPORT_CONSISTENT = os.getenv("EXPORT_CONSISTENT", "true").lower() in ("1", "true", "yes")
+
+# Lectura particionada de tablas grandes: cantidad de rangos leídos en paralelo (1 = deshabilitado)
+EXPORT_SHARDS = int(os.getenv("EXPORT_SHARDS", 1))
+# Solo se particionan tablas con al menos esta cantidad estimada de filas (pg_class.reltuples)
+EXPORT_SHARD_MIN_ROWS = int(os.getenv("EXPORT_SHARD_MIN_ROWS", 500000))
+# Lotes que cada rango puede tener leídos por adelantado mientras espera su turno
+EXPORT_SHARD_QUEUE_SIZE = int(os.getenv("EXPORT_SHARD_QUEUE_SIZE", 4))
+# Rangos leyéndose a la vez entre todas las exportaciones (cada uno con su conexión del pool);
+# junto con EXPORT_PARALLEL_WORKERS debe entrar en DB_POOL_SIZE + DB_MAX_OVERFLOW
+EXPORT_SHARD_MAX_READERS = int(os.getenv("EXPORT_SHARD_MAX_READERS", 8))
+
+# Modo libro único: todas las tablas como hojas de un solo .xlsx
+EXPORT_SINGLE_WORKBOOK = os.getenv("EXPORT_SINGLE_WORKBOOK", "false").lower() in ("1", "true", "yes")
+
+# Compresión de los archivos parquet (zstd, snappy, gzip, none)
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+
+# Formatos columnares y extensión de sus archivos (arrow = formato de streaming IPC)
+FORMATOS_COLUMNARES = {"parquet": ".parquet", "arrow": ".arrows"}
+
+# Listas de IDs a partir de este tamaño se filtran con una tabla temporal en lugar de un array
+EXPORT_IDS_TEMP_TABLE_MIN = int(os.getenv("EXPORT_IDS_TEMP_TABLE_MIN", 10000))
+
+# Cada cuántas filas escritas se actualiza el progreso de la exportación en curso
+PROGRESO_INTERVALO_FILAS = 1000
+
+# Límite de filas por hoja de Excel (incluye el encabezado)
+EXCEL_MAX_FILAS = 1048576
+
+# Usar el modo write_only de openpyxl (las filas se escriben a disco sin quedar en memoria)
+EXPORT_WRITE_ONLY = os.getenv("EXPORT_WRITE_ONLY", "true").lower() in ("1", "true", "yes")
+
+# Motor de escritura de los .xlsx: 'openpyxl' (modo write-only) o 'directo' (XML emitido sin objetos celda)
+EXPORT_XLSX_ENGINE = os.getenv("EXPORT_XLSX_ENGINE", "openpyxl").lower()
+MOTORES_XLSX = ("openpyxl", "directo")
+
+# Motor directo: máximo de textos distintos en la tabla de shared strings; los siguientes se escriben inline
+EXPORT_XLSX_SHARED_STRINGS_MAX = int(os.getenv("EXPORT_XLSX_SHARED_STRINGS_MAX", 1000000))
+
+# Anchos de columna: se calculan con el encabezado y esta cantidad de filas iniciales, así se
+# fijan antes de la primera fila (las hojas write_only escriben las columnas junto con ella)
+EXPORT_XLSX_MUESTRA_ANCHOS = int(os.getenv("EXPORT_XLSX_MUESTRA_ANCHOS", 1000))
+
+# Estilos con nombre registrados en cada Workbook exportado
+ESTILO_ENCABEZADO = "inia_encabezado"
+ESTILO_DATO_NUMERO = "inia_dato_numero"
+ESTILO_DATO_FECHA = "inia_dato_fecha"
+ESTILO_DATO_TEXTO = "inia_dato_texto"
+
+# Estilo de datos por tipo exacto del valor (bool cuenta como número, igual que isinstance(int))
+ESTILOS_POR_TIPO = {
+    int: ESTILO_DATO_NUMERO,
+    float: ESTILO_DATO_NUMERO,
+    bool: ESTILO_DATO_NUMERO,
+    datetime: ESTILO_DATO_FECHA,
+    date: ESTILO_DATO_FECHA,
+    str: ESTILO_DATO_TEXTO,
+    type(None): ESTILO_DATO_TEXTO,
+}
+
 # Importar funciones comunes de base de datos
 from db_common import (
     obtener_engine,
@@ -50,33 +140,57 @@ def ensure_output_dir(path: str) -> str:
     os.makedirs(path, exist_ok=True)
     return os.path.abspath(path)
 
+# ================================
+# MÓDULO: PROGRESO DE EXPORTACIÓN
+# ================================
+class ProgresoExportacion:
+    """Contador de filas escritas, compartido por todos los threads de una exportación."""
+    
+    def __init__(self):
+        self.filas = 0
+        self._lock = threading.Lock()
+    
+    def sumar_filas(self, cantidad: int):
+        if cantidad:
+            with self._lock:
+                self.filas += cantidad
+
+# Progreso de la exportación en curso (None si nadie lo sigue)
+PROGRESO_EXPORTACION: contextvars.ContextVar = contextvars.ContextVar("progreso_exportacion", default=None)
+
+def sumar_filas_exportadas(cantidad: int):
+    """Suma filas al progreso de la exportación en curso, si hay uno activo."""
+    progreso = PROGRESO_EXPORTACION.get()
+    if progreso is not None:
+        progreso.sumar_filas(cantidad)
+
+# Tablas que no generaron archivo en la exportación en curso (None si nadie lo sigue).
+# Las exportaciones registran el error de cada tabla y siguen con las demás, así que
+# quien necesita saber si el resultado está completo (p. ej. la caché) lo lee de acá.
+TABLAS_FALLIDAS_EXPORTACION: contextvars.ContextVar = contextvars.ContextVar("tablas_fallidas_exportacion", default=None)
+
+def registrar_tabla_fallida(tabla: str):
+    """Anota una tabla sin archivo en la exportación en curso, si alguien la sigue."""
+    fallidas = TABLAS_FALLIDAS_EXPORTACION.get()
+    if fallidas is not None:
+        fallidas.add(tabla)
+
 def serialize_value(value):
     """Serializa un valor para exportación."""
-    # #region agent log
-    import json as _json_log
-    try:
-        _log_data = {"value_type": str(type(value).__name__), "value_repr": repr(value)[:200] if value is not None else "None"}
-        with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-            _f.write(_json_log.dumps({"location": "ExportExcel.py:serialize_value", "message": "serialize_value called", "data": _log_data, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "B"}) + "\n")
-    except: pass
-    # #endregion
     if value is None:
         return ""
-    if isinstance(value, (datetime, date)):
+    if isinstance(value, datetime):
         return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
     if isinstance(value, bool):
         return "true" if value else "false"
-    # #region agent log
-    if isinstance(value, str):
+    if TRAZA.debug and isinstance(value, str):
         try:
-            _encoded = value.encode('utf-8')
-            with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                _f.write(_json_log.dumps({"location": "ExportExcel.py:serialize_value_str", "message": "string value OK", "data": {"value_preview": value[:100] if len(value) > 100 else value}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "B"}) + "\n")
-        except UnicodeEncodeError as _ue:
-            with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                _f.write(_json_log.dumps({"location": "ExportExcel.py:serialize_value_str_error", "message": "UNICODE ERROR in string", "data": {"error": str(_ue), "value_repr": repr(value)[:200]}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "B"}) + "\n")
-        except: pass
-    # #endregion
+            value.encode('utf-8')
+        except UnicodeEncodeError as ue:
+            TRAZA.evento("error", "ExportExcel.py:serialize_value", "Texto no codificable en UTF-8",
+                         error=str(ue), valor=repr(value)[:200])
     return value
 
 # ================================
@@ -261,13 +375,9 @@ def obtener_datos_tabla(session, tabla_nombre: str, columnas: list, filtro_where
     Returns:
         Lista de filas de resultados
     """
-    # #region agent log
-    import json as _json_log
-    try:
-        with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-            _f.write(_json_log.dumps({"location": "ExportExcel.py:obtener_datos_tabla", "message": "Query start", "data": {"tabla": tabla_nombre, "columnas": columnas[:5], "filtro": filtro_where}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "C"}) + "\n")
-    except: pass
-    # #endregion
+    if TRAZA.debug:
+        TRAZA.evento("debug", "ExportExcel.py:obtener_datos_tabla", "Inicio de consulta",
+                     tabla=tabla_nombre, columnas=columnas[:5], filtro=filtro_where)
     query_str = f"SELECT {', '.join(columnas)} FROM {tabla_nombre}"
     if filtro_where:
         query_str += f" WHERE {filtro_where}"
@@ -278,40 +388,83 @@ def obtener_datos_tabla(session, tabla_nombre: str, columnas: list, filtro_where
     else:
         result = session.execute(query)
     rows = result.fetchall()
-    # #region agent log
-    try:
-        with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-            _f.write(_json_log.dumps({"location": "ExportExcel.py:obtener_datos_tabla_result", "message": "Query result", "data": {"tabla": tabla_nombre, "row_count": len(rows)}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "C"}) + "\n")
-        # Log first row data types and sample values
-        if rows:
-            first_row_info = []
-            for i, val in enumerate(rows[0]):
-                col_info = {"col_idx": i, "type": str(type(val).__name__)}
-                if isinstance(val, str):
-                    try:
-                        val.encode('utf-8')
-                        col_info["utf8_ok"] = True
-                        col_info["preview"] = val[:50] if len(val) > 50 else val
-                    except UnicodeEncodeError as ue:
-                        col_info["utf8_ok"] = False
-                        col_info["error"] = str(ue)
-                        col_info["repr"] = repr(val)[:100]
-                elif val is not None:
-                    col_info["repr"] = repr(val)[:50]
-                first_row_info.append(col_info)
-            with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                _f.write(_json_log.dumps({"location": "ExportExcel.py:obtener_datos_tabla_first_row", "message": "First row analysis", "data": {"tabla": tabla_nombre, "columns_info": first_row_info}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "A"}) + "\n")
-    except Exception as _e:
-        try:
-            with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                _f.write(_json_log.dumps({"location": "ExportExcel.py:obtener_datos_tabla_log_error", "message": "Error logging row data", "data": {"error": str(_e)}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "A"}) + "\n")
-        except: pass
-    # #endregion
+    if TRAZA.info:
+        TRAZA.evento("info", "ExportExcel.py:obtener_datos_tabla", "Resultado de consulta",
+                     tabla=tabla_nombre, filas=len(rows))
+    if TRAZA.debug and rows:
+        TRAZA.evento("debug", "ExportExcel.py:obtener_datos_tabla", "Tipos de la primera fila",
+                     tabla=tabla_nombre,
+                     columnas=[{"col_idx": idx, "tipo": type(val).__name__, "repr": repr(val)[:50]}
+                               for idx, val in enumerate(rows[0])])
     return rows
 
+def iterar_datos_tabla(
+    session,
+    tabla_nombre: str,
+    columnas: list,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    orden: Optional[str] = None
+) -> Iterator:
+    """
+    Obtiene los datos de una tabla en modo streaming.
+
+    A diferencia de obtener_datos_tabla, no materializa el resultado completo:
+    usa un cursor con nombre del lado del servidor (yield_per) y trae las filas
+    en lotes de chunk_size, de modo que la memoria usada no depende del tamaño de la tabla.
+
+    Args:
+        session: Sesión de SQLAlchemy
+        tabla_nombre: Nombre de la tabla
+        columnas: Lista de columnas a seleccionar
+        filtro_where: Cláusula WHERE adicional (opcional)
+        filtro_params: Parámetros para la cláusula WHERE (opcional)
+        chunk_size: Cantidad de filas por lote leído desde el servidor
+        orden: Cláusula ORDER BY (opcional)
+
+    Yields:
+        Filas de resultados, una a una
+    """
+    query_str = f"SELECT {', '.join(columnas)} FROM {tabla_nombre}"
+    if filtro_where:
+        query_str += f" WHERE {filtro_where}"
+    if orden:
+        query_str += f" ORDER BY {orden}"
+
+    query = text(query_str).execution_options(yield_per=max(1, chunk_size))
+    result = session.execute(query, filtro_params or {})
+    try:
+        for lote in result.partitions():
+            yield from lote
+    finally:
+        result.close()
+
 # ================================
 # MÓDULO: MAPEO DE CAMPOS DE FECHA
 # ================================
+# Columna que indica si un análisis está activo, por tipo de análisis
+COLUMNA_ACTIVO_POR_TIPO = {
+    'dosn': 'dosn_activo',
+    'pureza': 'pureza_activo',
+    'germinacion': 'germinacion_activo',
+    'pms': 'pms_activo',
+    'sanitario': 'sanitario_activo',
+    'tetrazolio': 'tetrazolio_activo',
+    'pureza_pnotatum': 'pureza_activo'
+}
+
+# Tablas de análisis vinculadas a un recibo (y por lo tanto a un lote)
+TABLAS_ANALISIS_POR_RECIBO = {
+    'dosn': {'tabla': 'dosn', 'id_col': 'dosn_id', 'recibo_col': 'recibo_id', 'activo_col': 'dosn_activo'},
+    'pureza': {'tabla': 'pureza', 'id_col': 'pureza_id', 'recibo_col': 'recibo_id', 'activo_col': 'pureza_activo'},
+    'germinacion': {'tabla': 'germinacion', 'id_col': 'germinacion_id', 'recibo_col': 'recibo_id', 'activo_col': 'germinacion_activo'},
+    'pms': {'tabla': 'pms', 'id_col': 'pms_id', 'recibo_col': 'recibo_id', 'activo_col': 'pms_activo'},
+    'sanitario': {'tabla': 'sanitario', 'id_col': 'sanitario_id', 'recibo_col': 'sanitario_reciboid', 'activo_col': 'sanitario_activo'},
+    'tetrazolio': {'tabla': 'tetrazolio', 'id_col': 'tetrazolio_id', 'recibo_col': 'recibo_id', 'activo_col': 'tetrazolio_activo'},
+    'pureza_pnotatum': {'tabla': 'pureza_pnotatum', 'id_col': 'pureza_pnotatum_id', 'recibo_col': 'recibo_id', 'activo_col': 'pureza_activo'}
+}
+
 def obtener_campo_fecha_analisis(tipo_analisis: str, campo_fecha: Optional[str] = None) -> Optional[str]:
     """
     Obtiene el campo de fecha de análisis apropiado para un tipo de análisis.
@@ -376,6 +529,104 @@ def obtener_campo_fecha_analisis(tipo_analisis: str, campo_fecha: Optional[str]
     # Detección automática: usar el campo default
     return tipo_info['default']
 
+# ================================
+# MÓDULO: EXPORTACIÓN INCREMENTAL (WATERMARK)
+# ================================
+# Los xid de las filas (xmin) son de 32 bits y dan la vuelta; se comparan en aritmética circular
+XID_MODULO = 2 ** 32
+XID_MITAD = 2 ** 31
+
+def parsear_watermark(valor: str) -> tuple:
+    """
+    Interpreta un watermark de exportación incremental.
+    
+    Formatos aceptados:
+        - 'txid:<n>' o '<n>': id de transacción (de txid_current_snapshot); exporta las filas
+          insertadas o actualizadas desde esa transacción, según xmin
+        - Fecha/fecha y hora ISO (YYYY-MM-DD[THH:MM:SS]): exporta las filas cuyo campo de
+          fecha del análisis (obtener_campo_fecha_analisis) es igual o posterior. Si trae
+          zona horaria se convierte a UTC sin zona (fecha_sin_zona)
+    
+    Returns:
+        Tupla ('txid', int) o ('fecha', datetime sin zona horaria)
+    
+    Raises:
+        ValueError: Si el valor no tiene un formato válido
+    """
+    texto = (valor or "").strip()
+    if texto.lower().startswith("txid:"):
+        texto_xid = texto[5:].strip()
+        if not texto_xid.isdigit():
+            raise ValueError(f"Watermark de transacción inválido: '{valor}'")
+        return 'txid', int(texto_xid)
+    if texto.isdigit():
+        return 'txid', int(texto)
+    try:
+        return 'fecha', fecha_sin_zona(datetime.fromisoformat(texto))
+    except ValueError:
+        raise ValueError(f"Watermark inválido: '{valor}'. Use 'txid:<n>' o una fecha ISO (YYYY-MM-DD)")
+
+def fecha_sin_zona(valor: datetime) -> datetime:
+    """Retorna la fecha sin zona horaria; las que tienen zona se convierten antes a UTC."""
+    if valor.tzinfo is None:
+        return valor
+    return valor.astimezone(timezone.utc).replace(tzinfo=None)
+
+def condicion_watermark(tipo_analisis: str, watermark: tuple, columnas_validas: list,
+                        campo_fecha: Optional[str] = None) -> tuple:
+    """
+    Retorna (condición WHERE, parámetros) para exportar solo lo posterior al watermark.
+    
+    El watermark es inclusivo: una fila en el límite puede repetirse en la siguiente
+    exportación, pero nunca se pierde. Retorna (None, {}) si no aplica ningún filtro
+    (watermark txid 0, o la tabla no tiene el campo de fecha del tipo).
+    """
+    tipo, valor = watermark
+    if tipo == 'txid':
+        if valor <= 0:
+            return None, {}
+        # xmin está "en o después" del watermark si la distancia circular es menor a 2^31
+        return (
+            f"((xmin::text::bigint - :watermark_xid + {XID_MODULO}) % {XID_MODULO}) < {XID_MITAD}",
+            {'watermark_xid': valor % XID_MODULO}
+        )
+    campo_fecha_analisis = obtener_campo_fecha_analisis(tipo_analisis, campo_fecha)
+    if not campo_fecha_analisis or campo_fecha_analisis not in columnas_validas:
+        log_fail(f"{tipo_analisis} no tiene campo de fecha para el watermark, se exporta completo")
+        return None, {}
+    return f"{campo_fecha_analisis} >= :watermark_fecha", {'watermark_fecha': valor}
+
+def obtener_watermark_actual(session, watermark: tuple, tipos_analisis: List[str],
+                             campo_fecha: Optional[str] = None) -> str:
+    """
+    Calcula el watermark a usar en la próxima exportación incremental.
+    
+    Debe llamarse antes de leer los datos: para txid es el xmin del snapshot actual
+    (ninguna transacción anterior queda sin ver); para fechas es la fecha máxima del
+    campo de fecha de cada tipo. Retorna el watermark como texto, en el mismo formato
+    que se recibió.
+    """
+    tipo, valor = watermark
+    if tipo == 'txid':
+        resultado = session.execute(text("SELECT txid_snapshot_xmin(txid_current_snapshot())")).scalar()
+        return f"txid:{resultado}"
+    
+    maximo = valor
+    for tipo_analisis in tipos_analisis:
+        tabla_nombre = tipo_analisis.lower()
+        campo_fecha_analisis = obtener_campo_fecha_analisis(tabla_nombre, campo_fecha)
+        if not campo_fecha_analisis or campo_fecha_analisis not in verificar_estructura_tabla(session, tabla_nombre):
+            continue
+        maximo_tabla = session.execute(text(f"SELECT MAX({campo_fecha_analisis}) FROM {tabla_nombre}")).scalar()
+        if maximo_tabla is None:
+            continue
+        if not isinstance(maximo_tabla, datetime):
+            maximo_tabla = datetime.combine(maximo_tabla, datetime.min.time())
+        maximo_tabla = fecha_sin_zona(maximo_tabla)
+        if maximo_tabla > maximo:
+            maximo = maximo_tabla
+    return maximo.isoformat()
+
 # ================================
 # MÓDULO: PARSING DE IDs DE ANÁLISIS
 # ================================
@@ -435,14 +686,45 @@ def parsear_analisis_ids(analisis_ids_str: str) -> Dict[str, List[int]]:
 # ================================
 # MÓDULO: FUNCIONES AUXILIARES EXCEL
 # ================================
-def crear_workbook_excel(titulo: str) -> tuple:
-    """Crea un nuevo Workbook de Excel. Retorna (wb, ws)."""
+def crear_workbook_excel(titulo: str, write_only: bool = EXPORT_WRITE_ONLY,
+                         motor_xlsx: str = EXPORT_XLSX_ENGINE) -> tuple:
+    """
+    Crea un nuevo Workbook de Excel. Retorna (wb, ws).
+    
+    En modo write_only las filas se escriben directo a disco a medida que se agregan,
+    sin mantener las celdas en memoria. Los estilos con nombre quedan registrados
+    en ambos modos. Con motor_xlsx='directo' se usa LibroXlsxDirecto en lugar de openpyxl.
+    """
+    wb = crear_libro_excel(write_only, motor_xlsx)
+    ws = crear_hoja_excel(wb, titulo)
+    return wb, ws
+
+def crear_libro_excel(write_only: bool = EXPORT_WRITE_ONLY, motor_xlsx: str = EXPORT_XLSX_ENGINE):
+    """Crea un Workbook sin hojas y con los estilos con nombre registrados."""
+    if motor_xlsx == "directo":
+        return LibroXlsxDirecto()
     if not OPENPYXL_AVAILABLE:
         raise RuntimeError("openpyxl no está instalado")
-    wb = Workbook()
-    ws = wb.active
-    ws.title = titulo[:31]  # límite de Excel
-    return wb, ws
+    wb = Workbook(write_only=write_only)
+    if not write_only:
+        # Descartar la hoja vacía inicial: todas las hojas se crean con crear_hoja_excel
+        wb.remove(wb.active)
+    registrar_estilos_excel(wb)
+    return wb
+
+def crear_hoja_excel(wb, titulo: str):
+    """Agrega una hoja al Workbook con el formato base de la exportación."""
+    if isinstance(wb, LibroXlsxDirecto):
+        return wb.crear_hoja(titulo[:31])
+    ws = wb.create_sheet(titulo[:31])  # límite de Excel
+    # Altura de fila estándar para los datos (la del encabezado se define aparte)
+    ws.sheet_format.defaultRowHeight = 18
+    ws.sheet_format.customHeight = True
+    return ws
+
+def es_hoja_write_only(ws) -> bool:
+    """Indica si la hoja pertenece a un Workbook en modo write_only."""
+    return bool(getattr(ws.parent, 'write_only', False))
 
 def obtener_estilo_encabezado():
     """Retorna el estilo para los encabezados."""
@@ -513,98 +795,159 @@ def obtener_estilo_datos():
         'font': font
     }
 
+def registrar_estilos_excel(wb):
+    """
+    Registra en el Workbook los estilos con nombre usados por la exportación.
+    Cada celda referencia el estilo por nombre en lugar de copiar fuente, borde y alineación.
+    """
+    if not OPENPYXL_AVAILABLE:
+        return
+    
+    existentes = set(wb.named_styles)
+    
+    estilo = obtener_estilo_encabezado()
+    if ESTILO_ENCABEZADO not in existentes:
+        wb.add_named_style(NamedStyle(
+            name=ESTILO_ENCABEZADO,
+            fill=estilo['fill'],
+            font=estilo['font'],
+            border=estilo['border'],
+            alignment=estilo['alignment']
+        ))
+    
+    estilo = obtener_estilo_datos()
+    # Alineación horizontal según el tipo de dato original
+    alineaciones = {
+        ESTILO_DATO_NUMERO: 'right',
+        ESTILO_DATO_FECHA: 'center',
+        ESTILO_DATO_TEXTO: 'left',
+    }
+    for nombre, horizontal in alineaciones.items():
+        if nombre in existentes:
+            continue
+        wb.add_named_style(NamedStyle(
+            name=nombre,
+            font=estilo['font'],
+            border=estilo['border'],
+            alignment=Alignment(horizontal=horizontal, vertical='center', wrap_text=True)
+        ))
+
+def obtener_estilo_por_valor(value) -> str:
+    """Retorna el nombre del estilo de datos que corresponde al tipo del valor original."""
+    nombre = ESTILOS_POR_TIPO.get(type(value))
+    if nombre is not None:
+        return nombre
+    if isinstance(value, (int, float)):
+        return ESTILO_DATO_NUMERO
+    if isinstance(value, (datetime, date)):
+        return ESTILO_DATO_FECHA
+    return ESTILO_DATO_TEXTO
+
 def escribir_encabezados_excel(ws, encabezados: list):
     """Escribe los encabezados en una hoja de Excel con formato profesional."""
-    ws.append(encabezados)
-    
     if not OPENPYXL_AVAILABLE:
+        ws.append(encabezados)
         return
     
-    estilo = obtener_estilo_encabezado()
-    if estilo:
-        # Aplicar estilo a cada celda del encabezado
-        for col_idx, header in enumerate(encabezados, start=1):
-            cell = ws.cell(row=1, column=col_idx)
-            cell.fill = estilo['fill']
-            cell.font = estilo['font']
-            cell.border = estilo['border']
-            cell.alignment = estilo['alignment']
-        
-        # Ajustar altura de la fila de encabezado
-        ws.row_dimensions[1].height = 25
+    # La altura debe definirse antes de agregar la fila (en write_only la fila se escribe al instante)
+    ws.row_dimensions[1].height = 25
+    
+    celdas = []
+    for header in encabezados:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.style = ESTILO_ENCABEZADO
+        celdas.append(cell)
+    ws.append(celdas)
 
-def escribir_filas_excel(ws, rows: list):
-    """Escribe las filas de datos en una hoja de Excel con formato profesional."""
-    # #region agent log
-    import json as _json_log
-    try:
-        with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-            _f.write(_json_log.dumps({"location": "ExportExcel.py:escribir_filas_excel", "message": "Starting to write rows", "data": {"row_count": len(rows)}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "D"}) + "\n")
-    except: pass
-    # #endregion
+def iniciar_anchos_columnas(encabezados: list) -> list:
+    """Retorna el largo inicial de cada columna (el del encabezado) para acumular anchos."""
+    return [len(str(header)) for header in encabezados]
+
+def medir_anchos_filas(rows: Iterable, escritores: tuple, anchos: list, max_width: int = 50):
+    """Actualiza `anchos` con el largo de los valores serializados, como escribir_filas_excel."""
+    for row in rows:
+        for col_idx, (escritor, original_value) in enumerate(zip(escritores, row)):
+            if anchos[col_idx] < max_width:
+                largo = len(str(escritor(original_value)[0]))
+                if largo > anchos[col_idx]:
+                    anchos[col_idx] = largo
+
+def escribir_filas_excel(ws, rows: Iterable, anchos: Optional[list] = None, max_width: int = 50,
+                         escritores: Optional[tuple] = None) -> int:
+    """
+    Escribe las filas de datos en una hoja de Excel con formato profesional.
+    Acepta cualquier iterable de filas (por ejemplo el generador de iterar_datos_tabla).
+    
+    Si se pasa `anchos` (ver iniciar_anchos_columnas), se actualiza en la misma pasada
+    con el largo máximo de cada columna, sin seguir midiendo las que ya llegaron a max_width.
+    
+    `escritores` es la tupla de escritores por columna (ver obtener_escritores_columnas);
+    sin ella, cada valor se serializa y estiliza según su tipo en tiempo de ejecución.
+    
+    Retorna la cantidad de filas escritas.
+    """
+    # Se evalúa una sola vez: con las trazas apagadas el bucle no paga nada por fila
+    trazar_filas = TRAZA.debug
+    if trazar_filas:
+        TRAZA.evento("debug", "ExportExcel.py:escribir_filas_excel", "Inicio de escritura de filas",
+                     filas=len(rows) if hasattr(rows, '__len__') else None)
+    filas_escritas = 0
     if not OPENPYXL_AVAILABLE:
         for row in rows:
             values = [serialize_value(value) for value in row]
             ws.append(values)
-        return
-    
-    estilo = obtener_estilo_datos()
-    start_row = ws.max_row + 1
+            filas_escritas += 1
+        sumar_filas_exportadas(filas_escritas)
+        return filas_escritas
     
+    progreso = PROGRESO_EXPORTACION.get()
     for row_num, row in enumerate(rows, start=0):
-        # Guardar valores originales para determinar tipo
-        original_values = list(row)
-        values = [serialize_value(value) for value in row]
-        # #region agent log
-        try:
-            with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                _f.write(_json_log.dumps({"location": "ExportExcel.py:escribir_filas_excel_before_append", "message": f"Appending row {row_num}", "data": {"row_num": row_num}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "D"}) + "\n")
-        except: pass
-        # #endregion
+        filas_escritas += 1
+        if progreso is not None and filas_escritas % PROGRESO_INTERVALO_FILAS == 0:
+            progreso.sumar_filas(PROGRESO_INTERVALO_FILAS)
+        if escritores is None:
+            escritores = escritores_dinamicos(len(row))
+        # Cada columna tiene su escritor: valor serializado y estilo sin despachar por tipo
+        values = []
+        for col_idx, (escritor, original_value) in enumerate(zip(escritores, row)):
+            valor, estilo = escritor(original_value)
+            cell = WriteOnlyCell(ws, value=valor)
+            cell.style = estilo
+            values.append(cell)
+            if anchos is not None and anchos[col_idx] < max_width:
+                largo = len(str(valor))
+                if largo > anchos[col_idx]:
+                    anchos[col_idx] = largo
+        if trazar_filas:
+            TRAZA.evento("debug", "ExportExcel.py:escribir_filas_excel", "Agregando fila", fila=row_num)
         try:
             ws.append(values)
         except Exception as _append_err:
-            # #region agent log
-            try:
-                with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                    _f.write(_json_log.dumps({"location": "ExportExcel.py:escribir_filas_excel_append_error", "message": "ERROR appending row", "data": {"row_num": row_num, "error": str(_append_err), "values_repr": [repr(v)[:100] for v in values]}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "D"}) + "\n")
-            except: pass
-            # #endregion
+            TRAZA.evento("error", "ExportExcel.py:escribir_filas_excel", "Error al agregar fila",
+                         fila=row_num, error=str(_append_err),
+                         valores=[repr(c.value)[:100] for c in values])
             raise
-        row_idx = start_row + row_num
-        
-        if estilo:
-            # Aplicar estilo a cada celda de la fila
-            for col_idx, (original_value, serialized_value) in enumerate(zip(original_values, values), start=1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell.border = estilo['border']
-                cell.font = estilo['font']
-                
-                # Alineación horizontal según el tipo de dato original
-                if isinstance(original_value, (int, float)):
-                    cell.alignment = Alignment(
-                        horizontal='right',
-                        vertical='center',
-                        wrap_text=True
-                    )
-                elif isinstance(original_value, (datetime, date)):
-                    cell.alignment = Alignment(
-                        horizontal='center',
-                        vertical='center',
-                        wrap_text=True
-                    )
-                else:
-                    cell.alignment = Alignment(
-                        horizontal='left',
-                        vertical='center',
-                        wrap_text=True
-                    )
-        
-        # Altura de fila estándar
-        ws.row_dimensions[row_idx].height = 18
+    
+    if progreso is not None:
+        progreso.sumar_filas(filas_escritas % PROGRESO_INTERVALO_FILAS)
+    return filas_escritas
 
-def ajustar_ancho_columnas_excel(ws, columnas: list, min_width: int = 12, max_width: int = 50):
-    """Ajusta el ancho de las columnas en una hoja de Excel."""
+def ajustar_ancho_columnas_excel(ws, columnas: list, min_width: int = 12, max_width: int = 50,
+                                 anchos: Optional[list] = None):
+    """
+    Ajusta el ancho de las columnas en una hoja de Excel.
+    
+    Con `anchos` (acumulados por escribir_filas_excel) no se vuelve a leer la hoja.
+    Sin ellos se recorren las celdas, lo que no es posible en hojas write_only.
+    """
+    if anchos is not None:
+        for idx, max_len in enumerate(anchos, start=1):
+            calculated_width = min(max(min_width, max_len + 3), max_width)
+            ws.column_dimensions[get_column_letter(idx)].width = calculated_width
+        return
+    if es_hoja_write_only(ws):
+        # Las celdas ya se escribieron a disco y no se pueden releer
+        return
     for idx, col_name in enumerate(columnas, start=1):
         # Calcular el ancho basado en el contenido
         max_len = len(str(col_name))  # Empezar con el ancho del encabezado
@@ -623,121 +966,1420 @@ def ajustar_ancho_columnas_excel(ws, columnas: list, min_width: int = 12, max_wi
 def guardar_workbook_excel(wb, xlsx_path: str) -> bool:
     """Guarda un Workbook de Excel en un archivo."""
     try:
+        if isinstance(wb, LibroXlsxDirecto):
+            wb.guardar(xlsx_path)
+            return True
         wb.save(xlsx_path)
         return True
     except Exception as e:
         log_fail(f"Error guardando Excel: {e}")
         return False
 
+def descartar_workbook_excel(wb):
+    """Libera un Workbook que no se va a guardar, incluidos los archivos temporales de sus hojas."""
+    if isinstance(wb, LibroXlsxDirecto):
+        for hoja in wb.hojas:
+            hoja.archivo.close()
+        return
+    if getattr(wb, 'write_only', False):
+        # openpyxl borra los temporales de las hojas write_only recién al guardar el libro
+        try:
+            wb.save(os.devnull)
+        except Exception:
+            pass
+
 # ================================
-# MÓDULO: EXPORTACIÓN EXCEL GENÉRICA
+# MÓDULO: ESCRITORES POR COLUMNA
 # ================================
-def export_analisis_generico(session, model, xlsx_path: str, filtro_where: Optional[str] = None, filtro_params: Optional[Dict[str, Any]] = None) -> str:
+def obtener_tipos_columnas(session, tabla_nombre: str) -> Dict[str, str]:
+    """Retorna {columna: data_type} de information_schema.columns para una tabla."""
+    query = text("""
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = :tabla
+    """)
+    return dict(session.execute(query, {"tabla": tabla_nombre}).fetchall())
+
+def obtener_precision_numericas(session, tabla_nombre: str) -> Dict[str, tuple]:
     """
-    Exporta otros análisis con formato genérico.
-    
-    Args:
-        session: Sesión de SQLAlchemy
-        model: Modelo de la tabla
-        xlsx_path: Ruta del archivo Excel a generar
-        filtro_where: Cláusula WHERE adicional (opcional)
-        filtro_params: Parámetros para la cláusula WHERE (opcional)
-    
-    Returns:
-        Ruta del archivo generado o cadena vacía si falla
+    Retorna {columna: (precisión, escala)} de las columnas numeric de una tabla.
+    Para numeric sin restricción ambas son None.
+    """
+    query = text("""
+        SELECT column_name, numeric_precision, numeric_scale
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = :tabla AND data_type = 'numeric'
+    """)
+    filas = session.execute(query, {"tabla": tabla_nombre}).fetchall()
+    return {columna: (precision, escala) for columna, precision, escala in filas}
+
+def _fecha_hora_iso(value):
+    return value.isoformat(sep=" ")
+
+def _fecha_iso(value):
+    return value.isoformat()
+
+def _booleano_texto(value):
+    return "true" if value else "false"
+
+# data_type de PostgreSQL -> (serializador o None si el valor se escribe tal cual, estilo).
+# Mismo resultado que serialize_value + obtener_estilo_por_valor para el tipo que entrega psycopg2
+# (numeric llega como Decimal, que se escribe como número con el estilo de texto).
+ESCRITOR_POR_TIPO_PG = {
+    'smallint': (None, ESTILO_DATO_NUMERO),
+    'integer': (None, ESTILO_DATO_NUMERO),
+    'bigint': (None, ESTILO_DATO_NUMERO),
+    'real': (None, ESTILO_DATO_NUMERO),
+    'double precision': (None, ESTILO_DATO_NUMERO),
+    'numeric': (None, ESTILO_DATO_TEXTO),
+    'boolean': (_booleano_texto, ESTILO_DATO_NUMERO),
+    'date': (_fecha_iso, ESTILO_DATO_FECHA),
+    'timestamp without time zone': (_fecha_hora_iso, ESTILO_DATO_FECHA),
+    'timestamp with time zone': (_fecha_hora_iso, ESTILO_DATO_FECHA),
+    'text': (None, ESTILO_DATO_TEXTO),
+    'character varying': (None, ESTILO_DATO_TEXTO),
+    'character': (None, ESTILO_DATO_TEXTO),
+}
+
+def escritor_dinamico(value) -> tuple:
+    """Escritor para columnas sin tipo conocido: serializa y estiliza según el tipo del valor."""
+    return serialize_value(value), obtener_estilo_por_valor(value)
+
+def escritores_dinamicos(cantidad: int) -> tuple:
+    return (escritor_dinamico,) * cantidad
+
+def crear_escritor_columna(serializar: Optional[Callable], estilo: str) -> Callable:
+    """
+    Escritor de una columna: recibe el valor leído y retorna (valor serializado, estilo).
+    Los NULL se escriben vacíos con el estilo de texto, igual que serialize_value.
+    """
+    if serializar is None:
+        def escribir(value):
+            if value is None:
+                return "", ESTILO_DATO_TEXTO
+            return value, estilo
+    else:
+        def escribir(value):
+            if value is None:
+                return "", ESTILO_DATO_TEXTO
+            return serializar(value), estilo
+    return escribir
+
+def obtener_escritores_columnas(session, tabla_nombre: str, columnas: list) -> tuple:
     """
+    Retorna la tupla de escritores por columna según los tipos reales de la tabla, para
+    escribir cada fila aplicando un escritor por posición sin despachar por tipo en cada celda.
+    Las columnas de tipos sin escritor (o si no se pudieron leer los tipos) usan escritor_dinamico.
+    """
+    if TRAZA.debug:
+        # serialize_value registra los textos no codificables cuando las trazas están activas
+        return escritores_dinamicos(len(columnas))
     try:
-        if not OPENPYXL_AVAILABLE:
-            log_fail("openpyxl no está instalado")
-            return ""
-        
-        # Obtener y validar columnas
-        columnas_validas, columnas_analisis = obtener_columnas_validas(session, model)
-        if not columnas_analisis:
-            return ""
-        
-        # Obtener nombre de tabla
-        tabla_nombre = obtener_nombre_tabla(model)
-        
-        # Obtener datos con filtros opcionales
-        rows = obtener_datos_tabla(session, tabla_nombre, columnas_analisis, filtro_where, filtro_params)
+        tipos_pg = obtener_tipos_columnas(session, tabla_nombre)
+    except Exception as e:
+        log_fail(f"No se pudieron leer los tipos de {tabla_nombre}, se usa escritura dinámica: {e}")
+        try:
+            session.rollback()
+        except:
+            pass
+        return escritores_dinamicos(len(columnas))
+    escritores = []
+    for columna in columnas:
+        escritor = ESCRITOR_POR_TIPO_PG.get(tipos_pg.get(columna))
+        escritores.append(crear_escritor_columna(*escritor) if escritor else escritor_dinamico)
+    return tuple(escritores)
+
+# ================================
+# MÓDULO: ESCRITURA XLSX DIRECTA
+# ================================
+# Índice de cada estilo con nombre en cellXfs de XLSX_ESTILOS_XML (0 es el estilo por defecto)
+INDICE_ESTILO_XLSX = {
+    ESTILO_ENCABEZADO: 1,
+    ESTILO_DATO_NUMERO: 2,
+    ESTILO_DATO_FECHA: 3,
+    ESTILO_DATO_TEXTO: 4,
+}
+
+XLSX_NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+XLSX_NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+XLSX_NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+XLSX_CABECERA_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Caracteres que XML 1.0 no admite (openpyxl rechaza la celda; el motor directo los descarta)
+CARACTERES_ILEGALES_XML = re.compile(r"[\000-\010\013\014\016-\037]")
+
+def _borde_xlsx(estilo: str) -> str:
+    lados = "".join(f'<{lado} style="{estilo}"><color rgb="00000000"/></{lado}>' for lado in ("left", "right", "top", "bottom"))
+    return f"<border>{lados}<diagonal/></border>"
+
+def _xf_xlsx(font_id: int, fill_id: int, border_id: int, horizontal: str, xf_id: Optional[int] = None) -> str:
+    atributos = f'numFmtId="0" fontId="{font_id}" fillId="{fill_id}" borderId="{border_id}"'
+    if xf_id is not None:
+        atributos += f' xfId="{xf_id}"'
+    aplicar = ' applyFont="1" applyBorder="1" applyAlignment="1"' + (' applyFill="1"' if fill_id else '')
+    return f'<xf {atributos}{aplicar}><alignment horizontal="{horizontal}" vertical="center" wrapText="1"/></xf>'
+
+def construir_estilos_xlsx() -> str:
+    """
+    Tabla de estilos (styles.xml) con los mismos estilos con nombre que registrar_estilos_excel:
+    encabezado (fondo 4472C4, negrita blanca, borde medio, centrado) y datos por tipo
+    (borde fino, alineados a la derecha, al centro o a la izquierda).
+    """
+    estilos = [
+        (1, 2, 1, "center"),  # encabezado: fuente 1, relleno 2, borde 1
+        (2, 0, 2, "right"),   # dato número
+        (2, 0, 2, "center"),  # dato fecha
+        (2, 0, 2, "left"),    # dato texto
+    ]
+    nombres = [ESTILO_ENCABEZADO, ESTILO_DATO_NUMERO, ESTILO_DATO_FECHA, ESTILO_DATO_TEXTO]
+    xf_base = '<xf numFmtId="0" fontId="0" fillId="0" borderId="0"'
+    return (
+        XLSX_CABECERA_XML
+        + f'<styleSheet xmlns="{XLSX_NS_MAIN}">'
+        + '<fonts count="3">'
+        + '<font><sz val="11"/><color theme="1"/><name val="Calibri"/><family val="2"/><scheme val="minor"/></font>'
+        + '<font><b val="1"/><color rgb="00FFFFFF"/><sz val="11"/></font>'
+        + '<font><sz val="11"/></font>'
+        + '</fonts>'
+        + '<fills count="3"><fill><patternFill/></fill><fill><patternFill patternType="gray125"/></fill>'
+        + '<fill><patternFill patternType="solid"><fgColor rgb="004472C4"/><bgColor rgb="004472C4"/></patternFill></fill></fills>'
+        + '<borders count="3"><border><left/><right/><top/><bottom/><diagonal/></border>'
+        + _borde_xlsx("medium") + _borde_xlsx("thin") + '</borders>'
+        + f'<cellStyleXfs count="{len(estilos) + 1}">{xf_base}/>'
+        + "".join(_xf_xlsx(*estilo) for estilo in estilos) + '</cellStyleXfs>'
+        + f'<cellXfs count="{len(estilos) + 1}">{xf_base} xfId="0"/>'
+        + "".join(_xf_xlsx(*estilo, xf_id=idx) for idx, estilo in enumerate(estilos, start=1)) + '</cellXfs>'
+        + f'<cellStyles count="{len(nombres) + 1}"><cellStyle name="Normal" xfId="0" builtinId="0"/>'
+        + "".join(f'<cellStyle name="{nombre}" xfId="{idx}"/>' for idx, nombre in enumerate(nombres, start=1))
+        + '</cellStyles></styleSheet>'
+    )
+
+XLSX_ESTILOS_XML = construir_estilos_xlsx()
+
+def letra_columna_excel(indice: int) -> str:
+    """Letra de la columna (1 -> A, 27 -> AA) sin depender de openpyxl."""
+    letras = ""
+    while indice > 0:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+def texto_inline_xlsx(valor: str) -> str:
+    """Contenido <t> de un texto: escapado y con xml:space="preserve" si tiene espacios en los bordes."""
+    valor = escapar_xml(CARACTERES_ILEGALES_XML.sub("", valor))
+    if valor != valor.strip():
+        return f'<t xml:space="preserve">{valor}</t>'
+    return f"<t>{valor}</t>"
+
+class HojaXlsxDirecta:
+    """
+    Hoja de un LibroXlsxDirecto. Las filas se emiten como XML a un archivo temporal
+    (el bloque <cols> con los anchos va antes de <sheetData>); LibroXlsxDirecto.guardar
+    las copia al ZIP.
+    """
+    
+    def __init__(self, libro: "LibroXlsxDirecto", titulo: str):
+        self.libro = libro
+        self.titulo = titulo
+        self.archivo = tempfile.TemporaryFile()
+        self.anchos = []
+    
+    def escribir(self, columnas: list, rows: Iterable, escritores: Optional[tuple] = None,
+                 min_width: int = 12, max_width: int = 50) -> int:
+        """
+        Escribe encabezados y filas con los mismos valores, estilos y anchos que
+        escribir_hoja_tabla con openpyxl (anchos medidos en las primeras
+        EXPORT_XLSX_MUESTRA_ANCHOS filas), usando los escritores por columna
+        (ver obtener_escritores_columnas). Retorna la cantidad de filas escritas.
+        """
+        libro = self.libro
+        textos = libro.textos
+        max_textos = EXPORT_XLSX_SHARED_STRINGS_MAX
+        escritores = escritores or escritores_dinamicos(len(columnas))
+        indices = INDICE_ESTILO_XLSX
+        s_fecha = INDICE_ESTILO_XLSX[ESTILO_DATO_FECHA]
+        letras = [letra_columna_excel(i) for i in range(1, len(columnas) + 1)]
+        anchos = iniciar_anchos_columnas(columnas)
+        muestra_anchos = EXPORT_XLSX_MUESTRA_ANCHOS
+        salida = io.TextIOWrapper(self.archivo, encoding="utf-8", newline="")
+        escribir = salida.write
         
-        # Crear workbook
-        wb, ws = crear_workbook_excel(tabla_nombre)
+        def _texto(ref: str, estilo: int, valor: str, compartir: bool = True) -> str:
+            indice = textos.get(valor)
+            if indice is None:
+                if not compartir or len(textos) >= max_textos:
+                    return f'<c r="{ref}" s="{estilo}" t="inlineStr"><is>{texto_inline_xlsx(valor)}</is></c>'
+                indice = textos[valor] = len(textos)
+            return f'<c r="{ref}" s="{estilo}" t="s"><v>{indice}</v></c>'
         
-        # Escribir datos
-        escribir_encabezados_excel(ws, columnas_analisis)
-        escribir_filas_excel(ws, rows)
+        s_encabezado = INDICE_ESTILO_XLSX[ESTILO_ENCABEZADO]
+        escribir('<row r="1" ht="25" customHeight="1">')
+        escribir("".join(_texto(f"{letras[i]}1", s_encabezado, str(h)) for i, h in enumerate(columnas)))
+        escribir("</row>")
         
-        # Ajustar columnas
-        ajustar_ancho_columnas_excel(ws, columnas_analisis)
+        progreso = PROGRESO_EXPORTACION.get()
+        filas_escritas = 0
+        numero_fila = 1
+        for row in rows:
+            numero_fila += 1
+            filas_escritas += 1
+            if progreso is not None and filas_escritas % PROGRESO_INTERVALO_FILAS == 0:
+                progreso.sumar_filas(PROGRESO_INTERVALO_FILAS)
+            celdas = [f'<row r="{numero_fila}">']
+            midiendo = filas_escritas <= muestra_anchos
+            for i, (escritor, original) in enumerate(zip(escritores, row)):
+                valor, estilo = escritor(original)
+                estilo = indices[estilo]
+                ref = f"{letras[i]}{numero_fila}"
+                tipo = type(valor)
+                if tipo is str:
+                    # Las fechas casi nunca se repiten: inline, sin crecer la tabla de shared strings
+                    celdas.append(_texto(ref, estilo, valor, estilo != s_fecha) if valor
+                                  else f'<c r="{ref}" s="{estilo}"/>')
+                    largo = len(valor)
+                elif tipo is int or tipo is float or tipo is Decimal:
+                    # NaN/infinito quedan como celda vacía, igual que openpyxl. Se escribe el
+                    # valor exacto: "%.16g" pasaría bigint > 2^53 a exponente y truncaría numeric
+                    if math.isfinite(valor):
+                        numero = repr(valor) if tipo is float else str(valor)
+                        celdas.append(f'<c r="{ref}" s="{estilo}" t="n"><v>{numero}</v></c>')
+                    else:
+                        celdas.append(f'<c r="{ref}" s="{estilo}"/>')
+                    largo = len(str(valor))
+                else:
+                    texto = str(valor)
+                    celdas.append(_texto(ref, estilo, texto))
+                    largo = len(texto)
+                if midiendo and largo > anchos[i] and anchos[i] < max_width:
+                    anchos[i] = largo
+            celdas.append("</row>")
+            escribir("".join(celdas))
         
-        # Guardar
-        if guardar_workbook_excel(wb, xlsx_path):
-            log_ok(f"Archivo generado: {xlsx_path} ({len(rows)} filas)")
-            return xlsx_path
-        return ""
-    except Exception as e:
-        tabla_nombre = obtener_nombre_tabla(model)
-        log_fail(f"No se pudo exportar {tabla_nombre} a Excel: {e}")
-        return ""
+        salida.flush()
+        salida.detach()
+        if progreso is not None:
+            progreso.sumar_filas(filas_escritas % PROGRESO_INTERVALO_FILAS)
+        self.anchos = [min(max(min_width, largo + 3), max_width) for largo in anchos]
+        return filas_escritas
+    
+    def copiar_a_zip(self, zf: zipfile.ZipFile, nombre: str):
+        """Escribe la hoja completa en el ZIP: cabecera con anchos, filas y cierre."""
+        cols = "".join(
+            f'<col min="{i}" max="{i}" width="{ancho}" customWidth="1"/>' for i, ancho in enumerate(self.anchos, start=1)
+        )
+        cabecera = (
+            XLSX_CABECERA_XML
+            + f'<worksheet xmlns="{XLSX_NS_MAIN}" xmlns:r="{XLSX_NS_REL}">'
+            + '<sheetFormatPr baseColWidth="8" defaultRowHeight="18" customHeight="1"/>'
+            + (f"<cols>{cols}</cols>" if cols else "")
+            + "<sheetData>"
+        )
+        with zf.open(nombre, "w", force_zip64=True) as destino:
+            destino.write(cabecera.encode("utf-8"))
+            self.archivo.seek(0)
+            shutil.copyfileobj(self.archivo, destino, 1024 * 1024)
+            destino.write(b"</sheetData></worksheet>")
+        self.archivo.close()
 
-def export_table_xlsx(session, model, output_dir: str) -> str:
-    """Exporta una tabla a formato Excel."""
-    table = obtener_nombre_tabla(model)
-    # Normalizar nombre de archivo: siempre lowercase para evitar problemas con alias
-    table_normalized = table.lower()
-    xlsx_path = os.path.join(output_dir, f"{table_normalized}.xlsx")
-    log_step(f"➡️ Exportando {table} a Excel...")
+class LibroXlsxDirecto:
+    """
+    Libro XLSX escrito sin el modelo de objetos de openpyxl: las celdas se emiten como XML
+    a partir de las tuplas del cursor, con una tabla de estilos precalculada y shared strings.
+    Misma interfaz que usa la exportación con openpyxl: crear_hoja_excel, escribir_hoja_tabla
+    y guardar_workbook_excel.
+    """
     
-    try:
-        if not OPENPYXL_AVAILABLE:
-            log_fail("openpyxl no está instalado")
-            return ""
+    def __init__(self):
+        self.hojas: List[HojaXlsxDirecta] = []
+        self.textos: Dict[str, int] = {}
+    
+    def crear_hoja(self, titulo: str) -> HojaXlsxDirecta:
+        hoja = HojaXlsxDirecta(self, titulo)
+        self.hojas.append(hoja)
+        return hoja
+    
+    def guardar(self, ruta: str):
+        """Arma el paquete XLSX: hojas, estilos, shared strings, libro y relaciones."""
+        cantidad = len(self.hojas)
+        tipos_hojas = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, cantidad + 1)
+        )
+        content_types = (
+            XLSX_CABECERA_XML
+            + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            + '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            + '<Default Extension="xml" ContentType="application/xml"/>'
+            + '<Override PartName="/xl/workbook.xml" '
+              'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + '<Override PartName="/xl/styles.xml" '
+              'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + '<Override PartName="/xl/sharedStrings.xml" '
+              'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            + tipos_hojas + '</Types>'
+        )
+        rels = (
+            XLSX_CABECERA_XML + f'<Relationships xmlns="{XLSX_NS_PKG_REL}">'
+            + f'<Relationship Id="rId1" Type="{XLSX_NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+            + '</Relationships>'
+        )
+        hojas_xml = "".join(
+            f'<sheet name="{escapar_xml(hoja.titulo, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, hoja in enumerate(self.hojas, start=1)
+        )
+        workbook = (
+            XLSX_CABECERA_XML + f'<workbook xmlns="{XLSX_NS_MAIN}" xmlns:r="{XLSX_NS_REL}">'
+            + f'<sheets>{hojas_xml}</sheets></workbook>'
+        )
+        workbook_rels = (
+            XLSX_CABECERA_XML + f'<Relationships xmlns="{XLSX_NS_PKG_REL}">'
+            + "".join(
+                f'<Relationship Id="rId{i}" Type="{XLSX_NS_REL}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                for i in range(1, cantidad + 1)
+            )
+            + f'<Relationship Id="rId{cantidad + 1}" Type="{XLSX_NS_REL}/styles" Target="styles.xml"/>'
+            + f'<Relationship Id="rId{cantidad + 2}" Type="{XLSX_NS_REL}/sharedStrings" Target="sharedStrings.xml"/>'
+            + '</Relationships>'
+        )
         
-        # Usar formato genérico para todos los análisis
-        return export_analisis_generico(session, model, xlsx_path)
-    except Exception as e:
-        log_fail(f"No se pudo exportar {table} a Excel: {e}")
-        return ""
+        with zipfile.ZipFile(ruta, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            zf.writestr("[Content_Types].xml", content_types)
+            zf.writestr("_rels/.rels", rels)
+            zf.writestr("xl/workbook.xml", workbook)
+            zf.writestr("xl/_rels/workbook.xml.rels", workbook_rels)
+            zf.writestr("xl/styles.xml", XLSX_ESTILOS_XML)
+            for i, hoja in enumerate(self.hojas, start=1):
+                hoja.copiar_a_zip(zf, f"xl/worksheets/sheet{i}.xml")
+            with zf.open("xl/sharedStrings.xml", "w", force_zip64=True) as destino:
+                salida = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+                salida.write(XLSX_CABECERA_XML + f'<sst xmlns="{XLSX_NS_MAIN}" uniqueCount="{len(self.textos)}">')
+                for texto in self.textos:
+                    salida.write(f"<si>{texto_inline_xlsx(texto)}</si>")
+                salida.write("</sst>")
+                salida.flush()
+                salida.detach()
+        self.textos.clear()
 
 # ================================
-# MÓDULO: EXPORTACIÓN CON FILTROS
+# MÓDULO: LECTURA PARTICIONADA Y PARTES
 # ================================
-def export_analisis_filtrados(
-    session,
-    tipos_analisis: List[str],
-    analisis_ids: Optional[Dict[str, List[int]]] = None,
-    fecha_desde: Optional[date] = None,
-    fecha_hasta: Optional[date] = None,
-    campo_fecha: Optional[str] = None,
-    output_dir: str = "exports",
-    fmt: str = "xlsx"
-) -> List[str]:
+def obtener_pk_numerica(session, tabla_nombre: str) -> Optional[str]:
+    """Retorna la columna de la PK si es una sola columna entera, o None."""
+    try:
+        query = text("""
+            SELECT kcu.column_name, c.data_type
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+                ON tc.constraint_name = kcu.constraint_name
+                AND tc.table_schema = kcu.table_schema
+            JOIN information_schema.columns c
+                ON c.table_schema = kcu.table_schema
+                AND c.table_name = kcu.table_name
+                AND c.column_name = kcu.column_name
+            WHERE tc.constraint_type = 'PRIMARY KEY'
+                AND tc.table_schema = 'public'
+                AND tc.table_name = :tabla
+        """)
+        result = session.execute(query, {"tabla": tabla_nombre}).fetchall()
+        if len(result) == 1 and result[0][1] in ('smallint', 'integer', 'bigint'):
+            return result[0][0]
+        return None
+    except Exception as e:
+        log_fail(f"Error obteniendo PK de {tabla_nombre}: {e}")
+        return None
+
+def estimar_filas_tabla(session, tabla_nombre: str) -> int:
+    """Cantidad estimada de filas de una tabla según las estadísticas (pg_class.reltuples)."""
+    try:
+        query = text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:tabla AS regclass)")
+        result = session.execute(query, {"tabla": tabla_nombre}).scalar()
+        return max(0, int(result or 0))
+    except Exception as e:
+        log_fail(f"Error estimando filas de {tabla_nombre}: {e}")
+        return 0
+
+def calcular_rangos_tabla(session, tabla_nombre: str, shards: int) -> List[tuple]:
     """
-    Exporta análisis con filtros avanzados (IDs y fechas).
-    
-    Args:
-        session: Sesión de SQLAlchemy
-        tipos_analisis: Lista de tipos de análisis a exportar (ej: ['dosn', 'pureza'])
-        analisis_ids: Diccionario mapeando tipo de análisis a lista de IDs
-                     (ej: {'dosn': [1, 2, 3], 'pureza': [5, 6]})
-        fecha_desde: Fecha de inicio del rango (opcional)
-        fecha_hasta: Fecha de fin del rango (opcional)
-        campo_fecha: Campo de fecha específico a usar ('auto' para detección automática)
-        output_dir: Directorio de salida
-        fmt: Formato de exportación ('xlsx' o 'csv')
+    Divide una tabla en rangos disjuntos que cubren todas sus filas.
     
-    Returns:
-        Lista de rutas de archivos generados
+    Usa rangos de la PK (MIN/MAX) si es una columna entera; si no, rangos de páginas
+    físicas por ctid. Retorna una lista de (condicion_where, params) en orden.
+    El primer y el último rango quedan abiertos: MIN/MAX se calculan antes de que los rangos
+    importen su snapshot, y las filas confirmadas entre medio también se deben leer.
+    """
+    pk = obtener_pk_numerica(session, tabla_nombre)
+    if pk:
+        minimo, maximo = session.execute(text(f"SELECT MIN({pk}), MAX({pk}) FROM {tabla_nombre}")).fetchone()
+        if minimo is None:
+            return []
+        paso = max(1, math.ceil((maximo - minimo + 1) / shards))
+        cortes = list(range(minimo + paso, maximo + 1, paso))
+        if not cortes:
+            return [("TRUE", {})]
+        rangos = [(f"{pk} < :shard_hasta", {'shard_hasta': cortes[0]})]
+        for desde, hasta in zip(cortes, cortes[1:]):
+            rangos.append((
+                f"{pk} >= :shard_desde AND {pk} < :shard_hasta",
+                {'shard_desde': desde, 'shard_hasta': hasta}
+            ))
+        rangos.append((f"{pk} >= :shard_desde", {'shard_desde': cortes[-1]}))
+        return rangos
+    
+    query_paginas = text("""
+        SELECT pg_relation_size(CAST(:tabla AS regclass)) / current_setting('block_size')::int
+    """)
+    paginas = max(1, int(session.execute(query_paginas, {"tabla": tabla_nombre}).scalar() or 0))
+    paso = max(1, math.ceil(paginas / shards))
+    rangos = []
+    for desde in range(0, paginas, paso):
+        if desde + paso >= paginas:
+            # El último rango queda abierto para cubrir páginas agregadas después del cálculo
+            rangos.append(("ctid >= CAST(:shard_desde AS tid)", {'shard_desde': f"({desde},0)"}))
+        else:
+            rangos.append((
+                "ctid >= CAST(:shard_desde AS tid) AND ctid < CAST(:shard_hasta AS tid)",
+                {'shard_desde': f"({desde},0)", 'shard_hasta': f"({desde + paso},0)"}
+            ))
+    return rangos
+
+_pool_rangos = None
+_pool_rangos_lock = threading.Lock()
+
+def obtener_pool_rangos() -> ThreadPoolExecutor:
+    """
+    Retorna (creándolo una sola vez) el pool que lee los rangos de todas las tablas particionadas.
+    Al ser compartido, la cantidad de conexiones de lectura por rangos no se multiplica por la
+    cantidad de workers. Los rangos de cada tabla se encolan en orden y el pool los atiende en
+    ese orden, así que el rango que se está consumiendo siempre tiene un thread asignado.
+    """
+    global _pool_rangos
+    with _pool_rangos_lock:
+        if _pool_rangos is None:
+            _pool_rangos = ThreadPoolExecutor(
+                max_workers=max(1, EXPORT_SHARD_MAX_READERS), thread_name_prefix="inia-shard"
+            )
+        return _pool_rangos
+
+def iterar_datos_tabla_particionada(
+    tabla_nombre: str,
+    columnas: list,
+    rangos: List[tuple],
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    snapshot_id: Optional[str] = None
+) -> Iterator:
+    """
+    Lee los rangos de una tabla en paralelo (una conexión del pool por rango, hasta
+    EXPORT_SHARD_MAX_READERS rangos a la vez en total) y entrega las filas en el orden de los rangos.
+    
+    Cada rango adelanta hasta EXPORT_SHARD_QUEUE_SIZE lotes mientras espera su turno,
+    por lo que la memoria queda acotada. Con snapshot_id todos los rangos leen el mismo corte.
+    
+    Yields:
+        Filas de resultados, una a una
+    """
+    Session = sessionmaker(bind=obtener_engine_paralelo())
+    colas = [queue.Queue(maxsize=max(1, EXPORT_SHARD_QUEUE_SIZE)) for _ in rangos]
+    cancelado = threading.Event()
+    fin_rango = object()
+    
+    def _encolar(cola, item) -> bool:
+        while not cancelado.is_set():
+            try:
+                cola.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _leer_rango(cola, condicion, params_rango):
+        session = Session()
+        try:
+            if snapshot_id:
+                importar_snapshot(session, snapshot_id)
+            where = f"({filtro_where}) AND ({condicion})" if filtro_where else condicion
+            params = dict(filtro_params or {})
+            params.update(params_rango)
+            query_str = f"SELECT {', '.join(columnas)} FROM {tabla_nombre} WHERE {where}"
+            query = text(query_str).execution_options(yield_per=max(1, chunk_size))
+            result = session.execute(query, params)
+            try:
+                for lote in result.partitions():
+                    if not _encolar(cola, lote):
+                        return
+            finally:
+                result.close()
+            _encolar(cola, fin_rango)
+        except Exception as e:
+            _encolar(cola, e)
+        finally:
+            session.close()
+    
+    pool = obtener_pool_rangos()
+    futuros = []
+    try:
+        for cola, (condicion, params_rango) in zip(colas, rangos):
+            futuros.append(pool.submit(_leer_rango, cola, condicion, params_rango))
+        for cola in colas:
+            while True:
+                item = cola.get()
+                if item is fin_rango:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield from item
+    finally:
+        cancelado.set()
+        for futuro in futuros:
+            futuro.cancel()
+        wait(futuros)
+
+def ruta_parte_archivo(ruta: str, numero: int) -> str:
+    """Retorna la ruta de la parte N de un archivo (tabla.xlsx -> tabla_partN.xlsx)."""
+    base, extension = os.path.splitext(ruta)
+    return f"{base}_part{numero}{extension}"
+
+def obtener_partes_archivo(ruta: str) -> List[str]:
+    """
+    Retorna todas las partes de un archivo exportado a partir de la ruta retornada
+    por la exportación: la misma ruta, o tabla_part1.xlsx, tabla_part2.xlsx, ... si se dividió.
+    """
+    base, extension = os.path.splitext(ruta)
+    if not base.endswith("_part1"):
+        return [ruta]
+    base_original = base[:-len("_part1")] + extension
+    partes = []
+    numero = 1
+    while os.path.exists(ruta_parte_archivo(base_original, numero)):
+        partes.append(ruta_parte_archivo(base_original, numero))
+        numero += 1
+    return partes
+
+def abrir_lectura_tabla(
+    session,
+    pila_contextos: ExitStack,
+    tabla_nombre: str,
+    columnas: list,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    shards: int = EXPORT_SHARDS
+) -> Iterator:
+    """
+    Retorna el iterador de filas de una tabla: particionado en rangos paralelos si shards > 1
+    y la tabla tiene al menos EXPORT_SHARD_MIN_ROWS filas estimadas; si no, una lectura única.
+    Los recursos que requiera (snapshot) quedan registrados en pila_contextos.
+    """
+    if shards > 1 and estimar_filas_tabla(session, tabla_nombre) >= EXPORT_SHARD_MIN_ROWS:
+        rangos = calcular_rangos_tabla(session, tabla_nombre, shards)
+        if len(rangos) > 1:
+            # Reusar el snapshot de la sesión si ya lee uno; si no, exportar uno para los rangos
+            snapshot_id = session.info.get('snapshot_id')
+            if not snapshot_id and EXPORT_CONSISTENT:
+                snapshot_id = pila_contextos.enter_context(snapshot_exportacion())
+            log_step(f"Leyendo {tabla_nombre} en {len(rangos)} rangos en paralelo...")
+            return iterar_datos_tabla_particionada(
+                tabla_nombre, columnas, rangos, filtro_where, filtro_params, chunk_size, snapshot_id
+            )
+    return iterar_datos_tabla(session, tabla_nombre, columnas, filtro_where, filtro_params, chunk_size)
+
+def escribir_hoja_tabla(ws, columnas: list, rows: Iterator, escritores: Optional[tuple] = None) -> int:
+    """
+    Escribe encabezados y hasta el límite de filas de Excel en una hoja. Retorna la cantidad
+    de filas escritas.
+    
+    Los anchos se calculan con el encabezado y las primeras EXPORT_XLSX_MUESTRA_ANCHOS filas
+    y se fijan antes de escribir, porque las hojas write_only emiten las columnas junto con
+    la primera fila. Las filas de la muestra se escriben después sin volver a leerlas.
+    """
+    if escritores is None:
+        escritores = escritores_dinamicos(len(columnas))
+    if isinstance(ws, HojaXlsxDirecta):
+        return ws.escribir(columnas, itertools.islice(rows, EXCEL_MAX_FILAS - 1), escritores)
+    filas_hoja = itertools.islice(rows, EXCEL_MAX_FILAS - 1)
+    muestra = list(itertools.islice(filas_hoja, EXPORT_XLSX_MUESTRA_ANCHOS))
+    anchos = iniciar_anchos_columnas(columnas)
+    medir_anchos_filas(muestra, escritores, anchos)
+    ajustar_ancho_columnas_excel(ws, columnas, anchos=anchos)
+    escribir_encabezados_excel(ws, columnas)
+    return escribir_filas_excel(ws, itertools.chain(muestra, filas_hoja), escritores=escritores)
+
+def escribir_tabla_xlsx(
+    session,
+    tabla_nombre: str,
+    columnas: list,
+    xlsx_path: str,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    shards: int = EXPORT_SHARDS,
+    motor_xlsx: str = EXPORT_XLSX_ENGINE
+) -> tuple:
+    """
+    Lee una tabla y la escribe en uno o más archivos Excel.
+    
+    Si las filas superan el límite de una hoja de Excel, se escriben
+    tabla_part1.xlsx, tabla_part2.xlsx, ... en orden.
+    
+    Returns:
+        Tupla (lista de rutas generadas, total de filas escritas)
+    """
+    escritores = obtener_escritores_columnas(session, tabla_nombre, columnas)
+    with ExitStack() as pila_contextos:
+        rows = abrir_lectura_tabla(
+            session, pila_contextos, tabla_nombre, columnas, filtro_where, filtro_params, chunk_size, shards
+        )
+        return escribir_filas_xlsx(rows, tabla_nombre, columnas, xlsx_path, motor_xlsx, escritores)
+
+def escribir_filas_xlsx(rows: Iterable, titulo: str, columnas: list, xlsx_path: str,
+                        motor_xlsx: str = EXPORT_XLSX_ENGINE, escritores: Optional[tuple] = None) -> tuple:
+    """
+    Escribe filas ya leídas en uno o más archivos Excel (tabla_part1.xlsx, ... si superan
+    el límite de una hoja). Retorna (lista de rutas generadas, total de filas escritas).
+    """
+    rows = iter(rows)
+    partes = []
+    total_filas = 0
+    while True:
+        wb, ws = crear_workbook_excel(titulo, motor_xlsx=motor_xlsx)
+        total_filas += escribir_hoja_tabla(ws, columnas, rows, escritores)
+        
+        # Si quedan filas, este archivo y los siguientes se guardan como partes
+        siguiente = next(rows, None)
+        if partes or siguiente is not None:
+            ruta = ruta_parte_archivo(xlsx_path, len(partes) + 1)
+        else:
+            ruta = xlsx_path
+        if not guardar_workbook_excel(wb, ruta):
+            return [], total_filas
+        partes.append(ruta)
+        
+        if siguiente is None:
+            return partes, total_filas
+        rows = itertools.chain([siguiente], rows)
+
+def agregar_tabla_a_libro(
+    session,
+    wb,
+    tabla_nombre: str,
+    columnas: list,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    shards: int = EXPORT_SHARDS
+) -> int:
+    """
+    Lee una tabla y la agrega como hoja(s) de un Workbook existente (modo libro único).
+    Si supera el límite de filas de Excel, continúa en hojas tabla_part2, tabla_part3, ...
+    Retorna la cantidad de filas escritas.
+    """
+    escritores = obtener_escritores_columnas(session, tabla_nombre, columnas)
+    with ExitStack() as pila_contextos:
+        rows = abrir_lectura_tabla(
+            session, pila_contextos, tabla_nombre, columnas, filtro_where, filtro_params, chunk_size, shards
+        )
+        return agregar_filas_a_libro(wb, tabla_nombre, columnas, rows, escritores)
+
+def agregar_filas_a_libro(wb, titulo: str, columnas: list, rows: Iterable, escritores: Optional[tuple] = None) -> int:
+    """
+    Agrega filas ya leídas como hoja(s) de un Workbook existente; si superan el límite
+    de Excel, continúa en hojas titulo_part2, titulo_part3, ... Retorna las filas escritas.
+    """
+    rows = iter(rows)
+    total_filas = 0
+    numero_parte = 1
+    while True:
+        titulo_hoja = titulo if numero_parte == 1 else f"{titulo[:24]}_part{numero_parte}"
+        ws = crear_hoja_excel(wb, titulo_hoja)
+        total_filas += escribir_hoja_tabla(ws, columnas, rows, escritores)
+        siguiente = next(rows, None)
+        if siguiente is None:
+            return total_filas
+        rows = itertools.chain([siguiente], rows)
+        numero_parte += 1
+
+def export_tablas_libro_unico(session, tablas: List[Dict[str, Any]], xlsx_path: str,
+                              motor_xlsx: str = EXPORT_XLSX_ENGINE) -> str:
+    """
+    Exporta varias tablas como hojas de un único Workbook, una tabla tras otra.
+    
+    Cada hoja se lee dentro de un savepoint: si una falla se vuelve al savepoint (la
+    transacción de la sesión, y el snapshot que haya importado, siguen vigentes) y el libro
+    no se guarda, para no entregar una hoja a medio escribir.
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        tablas: Lista de dicts con 'tabla', 'columnas' y opcionalmente 'filtro_where' / 'filtro_params'
+        xlsx_path: Ruta del archivo Excel a generar
+        motor_xlsx: Motor de escritura ('openpyxl' o 'directo')
+    
+    Returns:
+        Ruta del archivo generado o cadena vacía si no se exportó ninguna tabla o alguna falló
+    """
+    if motor_xlsx != "directo" and not OPENPYXL_AVAILABLE:
+        log_fail("openpyxl no está instalado")
+        return ""
+    
+    wb = crear_libro_excel(motor_xlsx=motor_xlsx)
+    hojas = 0
+    total_filas = 0
+    for tabla in tablas:
+        try:
+            with session.begin_nested():
+                total_filas += agregar_tabla_a_libro(
+                    session,
+                    wb,
+                    tabla['tabla'],
+                    tabla['columnas'],
+                    filtro_where=tabla.get('filtro_where'),
+                    filtro_params=tabla.get('filtro_params')
+                )
+            hojas += 1
+            log_step(f"Hoja {tabla['tabla']} agregada a {os.path.basename(xlsx_path)}")
+        except Exception as e:
+            log_fail(f"Error agregando {tabla['tabla']} al libro, no se guarda {os.path.basename(xlsx_path)}: {e}")
+            registrar_tabla_fallida(tabla['tabla'])
+            descartar_workbook_excel(wb)
+            return ""
+    
+    if hojas == 0:
+        return ""
+    if guardar_workbook_excel(wb, xlsx_path):
+        log_ok(f"Archivo generado: {xlsx_path} ({hojas} hoja(s), {total_filas} filas)")
+        return xlsx_path
+    return ""
+
+# ================================
+# MÓDULO: EXPORTACIÓN EXCEL GENÉRICA
+# ================================
+def export_analisis_generico(
+    session,
+    model,
+    xlsx_path: str,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    shards: int = EXPORT_SHARDS,
+    motor_xlsx: str = EXPORT_XLSX_ENGINE
+) -> str:
+    """
+    Exporta otros análisis con formato genérico.
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        model: Modelo de la tabla
+        xlsx_path: Ruta del archivo Excel a generar
+        filtro_where: Cláusula WHERE adicional (opcional)
+        filtro_params: Parámetros para la cláusula WHERE (opcional)
+        chunk_size: Cantidad de filas por lote leído desde el servidor
+        shards: Cantidad de rangos a leer en paralelo en tablas grandes (1 = lectura única)
+        motor_xlsx: 'openpyxl' (modo write-only) o 'directo' (LibroXlsxDirecto, mismo contenido y estilos)
+    
+    Returns:
+        Ruta del archivo generado o cadena vacía si falla. Si la tabla supera el límite
+        de filas de Excel, es la ruta de la primera parte (ver obtener_partes_archivo).
+    """
+    try:
+        if motor_xlsx != "directo" and not OPENPYXL_AVAILABLE:
+            log_fail("openpyxl no está instalado")
+            return ""
+        
+        # Obtener y validar columnas
+        columnas_validas, columnas_analisis = obtener_columnas_validas(session, model)
+        if not columnas_analisis:
+            return ""
+        
+        # Obtener nombre de tabla
+        tabla_nombre = obtener_nombre_tabla(model)
+        
+        # Leer (streaming por lotes, particionado si corresponde) y escribir
+        partes, total_filas = escribir_tabla_xlsx(
+            session, tabla_nombre, columnas_analisis, xlsx_path,
+            filtro_where, filtro_params, chunk_size, shards, motor_xlsx
+        )
+        if partes:
+            log_ok(f"Archivo generado: {', '.join(partes)} ({total_filas} filas)")
+            return partes[0]
+        return ""
+    except Exception as e:
+        tabla_nombre = obtener_nombre_tabla(model)
+        log_fail(f"No se pudo exportar {tabla_nombre} a Excel: {e}")
+        return ""
+
+def export_table_xlsx(session, model, output_dir: str, motor_xlsx: str = EXPORT_XLSX_ENGINE) -> str:
+    """Exporta una tabla a formato Excel."""
+    table = obtener_nombre_tabla(model)
+    # Normalizar nombre de archivo: siempre lowercase para evitar problemas con alias
+    table_normalized = table.lower()
+    xlsx_path = os.path.join(output_dir, f"{table_normalized}.xlsx")
+    log_step(f"➡️ Exportando {table} a Excel...")
+    
+    try:
+        if motor_xlsx != "directo" and not OPENPYXL_AVAILABLE:
+            log_fail("openpyxl no está instalado")
+            return ""
+        
+        # Usar formato genérico para todos los análisis
+        return export_analisis_generico(session, model, xlsx_path, motor_xlsx=motor_xlsx)
+    except Exception as e:
+        log_fail(f"No se pudo exportar {table} a Excel: {e}")
+        return ""
+
+# ================================
+# MÓDULO: EXPORTACIÓN CSV (COPY)
+# ================================
+def renderizar_consulta_sql(session, query_str: str, params: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Renderiza una consulta con parámetros `:nombre` como SQL literal (bytes).
+    COPY no acepta parámetros enlazados, así que los valores se escapan con psycopg2 (mogrify).
+    """
+    compiled = text(query_str).bindparams(**(params or {})).compile(dialect=session.bind.dialect)
+    cursor = session.connection().connection.cursor()
+    try:
+        return cursor.mogrify(str(compiled), compiled.params)
+    finally:
+        cursor.close()
+
+def export_tabla_csv(
+    session,
+    tabla_nombre: str,
+    columnas: list,
+    csv_path: str,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Exporta una tabla a CSV usando `COPY (SELECT ...) TO STDOUT WITH CSV HEADER`.
+    Los datos pasan del servidor al archivo sin crear objetos Python por fila.
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        tabla_nombre: Nombre de la tabla
+        columnas: Columnas a exportar (ya filtradas)
+        csv_path: Ruta del archivo CSV a generar
+        filtro_where: Cláusula WHERE adicional (opcional)
+        filtro_params: Parámetros para la cláusula WHERE (opcional)
+    
+    Returns:
+        Cantidad de filas exportadas
+    """
+    query_str = f"SELECT {', '.join(columnas)} FROM {tabla_nombre}"
+    if filtro_where:
+        query_str += f" WHERE {filtro_where}"
+    select_sql = renderizar_consulta_sql(session, query_str, filtro_params)
+    
+    # Usar la conexión psycopg2 de la sesión (misma transacción)
+    cursor = session.connection().connection.cursor()
+    try:
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            cursor.copy_expert(b"COPY (" + select_sql + b") TO STDOUT WITH CSV HEADER", f)
+        filas = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount > 0 else 0
+        sumar_filas_exportadas(filas)
+        return filas
+    finally:
+        cursor.close()
+
+def export_analisis_csv(
+    session,
+    model,
+    csv_path: str,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Exporta un análisis a CSV con las mismas columnas que export_analisis_generico.
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        model: Modelo de la tabla
+        csv_path: Ruta del archivo CSV a generar
+        filtro_where: Cláusula WHERE adicional (opcional)
+        filtro_params: Parámetros para la cláusula WHERE (opcional)
+    
+    Returns:
+        Ruta del archivo generado o cadena vacía si falla
+    """
+    try:
+        # Obtener y validar columnas
+        columnas_validas, columnas_analisis = obtener_columnas_validas(session, model)
+        if not columnas_analisis:
+            return ""
+        
+        tabla_nombre = obtener_nombre_tabla(model)
+        total_filas = export_tabla_csv(session, tabla_nombre, columnas_analisis, csv_path, filtro_where, filtro_params)
+        log_ok(f"Archivo generado: {csv_path} ({total_filas} filas)")
+        return csv_path
+    except Exception as e:
+        log_fail(f"Error exportando CSV: {e}")
+        return ""
+
+def export_table_csv(session, model, output_dir: str) -> str:
+    """Exporta una tabla a formato CSV."""
+    table = obtener_nombre_tabla(model)
+    csv_path = os.path.join(output_dir, f"{table.lower()}.csv")
+    log_step(f"➡️ Exportando {table} a CSV...")
+    return export_analisis_csv(session, model, csv_path)
+
+# ================================
+# MÓDULO: EXPORTACIÓN COLUMNAR (PARQUET / ARROW)
+# ================================
+def _texto_o_none(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+def _float_o_none(value):
+    return None if value is None else float(value)
+
+def _decimal_o_none(value):
+    # numeric(p, s) admite NaN, que Arrow no representa en decimales
+    return None if value is None or not value.is_finite() else value
+
+def tipo_arrow_columna(data_type: str, precision: Optional[int] = None, escala: Optional[int] = None) -> tuple:
+    """
+    Retorna (tipo de Arrow, conversor por valor o None) para un tipo de PostgreSQL
+    (information_schema.columns.data_type). Los tipos sin equivalente se exportan como texto.
+    
+    numeric con precisión se exporta como decimal exacto (decimal128 o decimal256 según la
+    precisión); numeric sin restricción, o con más precisión de la que admite Arrow, como texto.
+    """
+    if data_type == 'numeric':
+        if precision is None or precision > 76:
+            return pa.string(), _texto_o_none
+        tipo_decimal = pa.decimal128 if precision <= 38 else pa.decimal256
+        return tipo_decimal(precision, escala or 0), _decimal_o_none
+    
+    tipos = {
+        'smallint': (pa.int16(), None),
+        'integer': (pa.int32(), None),
+        'bigint': (pa.int64(), None),
+        'boolean': (pa.bool_(), None),
+        'real': (pa.float32(), _float_o_none),
+        'double precision': (pa.float64(), _float_o_none),
+        'date': (pa.date32(), None),
+        'timestamp without time zone': (pa.timestamp('us'), None),
+        'timestamp with time zone': (pa.timestamp('us', tz='UTC'), None),
+        'time without time zone': (pa.time64('us'), None),
+    }
+    return tipos.get(data_type, (pa.string(), _texto_o_none))
+
+def obtener_esquema_arrow(session, tabla_nombre: str, columnas: list) -> tuple:
+    """Retorna (schema de Arrow, conversores por columna) según los tipos reales de la tabla."""
+    tipos_pg = obtener_tipos_columnas(session, tabla_nombre)
+    precisiones = obtener_precision_numericas(session, tabla_nombre) if 'numeric' in tipos_pg.values() else {}
+    campos = []
+    conversores = []
+    for columna in columnas:
+        tipo, conversor = tipo_arrow_columna(tipos_pg.get(columna, 'text'), *precisiones.get(columna, (None, None)))
+        campos.append(pa.field(columna, tipo))
+        conversores.append(conversor)
+    return pa.schema(campos), conversores
+
+def export_tabla_columnar(
+    session,
+    tabla_nombre: str,
+    columnas: list,
+    ruta: str,
+    fmt: str,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    shards: int = EXPORT_SHARDS
+) -> int:
+    """
+    Exporta una tabla a parquet o Arrow IPC (stream) escribiendo un record batch por lote del cursor.
+    Los valores conservan su tipo (fechas, booleanos, números) en lugar de serializarse a texto.
+    
+    Returns:
+        Cantidad de filas exportadas
+    """
+    schema, conversores = obtener_esquema_arrow(session, tabla_nombre, columnas)
+    with ExitStack() as pila_contextos:
+        rows = abrir_lectura_tabla(
+            session, pila_contextos, tabla_nombre, columnas, filtro_where, filtro_params, chunk_size, shards
+        )
+        return escribir_filas_columnar(rows, schema, conversores, ruta, fmt, chunk_size)
+
+def escribir_filas_columnar(
+    rows: Iterable,
+    schema,
+    conversores: list,
+    ruta: str,
+    fmt: str,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> int:
+    """Escribe filas ya leídas en un archivo parquet o Arrow IPC, un record batch por lote."""
+    rows = iter(rows)
+    total_filas = 0
+    with ExitStack() as pila_contextos:
+        if fmt == "parquet":
+            writer = pila_contextos.enter_context(
+                pq.ParquetWriter(ruta, schema, compression=EXPORT_PARQUET_COMPRESSION)
+            )
+        else:
+            sink = pila_contextos.enter_context(pa.OSFile(ruta, "wb"))
+            writer = pila_contextos.enter_context(pa.ipc.new_stream(sink, schema))
+        
+        for lote in iter(lambda: list(itertools.islice(rows, chunk_size)), []):
+            columnas_lote = list(zip(*lote))
+            arrays = []
+            for idx, campo in enumerate(schema):
+                valores = columnas_lote[idx]
+                if conversores[idx] is not None:
+                    valores = [conversores[idx](v) for v in valores]
+                arrays.append(pa.array(valores, type=campo.type))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            total_filas += len(lote)
+            sumar_filas_exportadas(len(lote))
+    return total_filas
+
+def export_analisis_columnar(
+    session,
+    model,
+    ruta: str,
+    fmt: str,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    shards: int = EXPORT_SHARDS
+) -> str:
+    """
+    Exporta un análisis a parquet/arrow con las mismas columnas que export_analisis_generico.
+    Retorna la ruta del archivo generado o cadena vacía si falla.
+    """
+    if not PYARROW_AVAILABLE:
+        log_fail("pyarrow no está instalado (requerido para formato parquet/arrow)")
+        return ""
+    try:
+        columnas_validas, columnas_analisis = obtener_columnas_validas(session, model)
+        if not columnas_analisis:
+            return ""
+        
+        tabla_nombre = obtener_nombre_tabla(model)
+        total_filas = export_tabla_columnar(
+            session, tabla_nombre, columnas_analisis, ruta, fmt, filtro_where, filtro_params, shards=shards
+        )
+        log_ok(f"Archivo generado: {ruta} ({total_filas} filas)")
+        return ruta
+    except Exception as e:
+        log_fail(f"Error exportando {fmt}: {e}")
+        return ""
+
+def export_analisis_formato(
+    session,
+    model,
+    tabla_nombre: str,
+    output_dir: str,
+    fmt: str,
+    filtro_where: Optional[str] = None,
+    filtro_params: Optional[Dict[str, Any]] = None,
+    shards: int = EXPORT_SHARDS,
+    motor_xlsx: str = EXPORT_XLSX_ENGINE
+) -> str:
+    """
+    Exporta un análisis filtrado en el formato pedido ('xlsx', 'csv', 'parquet' o 'arrow'). Retorna la ruta generada.
+    `shards` limita la lectura particionada (xlsx y columnares; csv siempre es una lectura única).
+    `motor_xlsx` elige el motor de escritura de xlsx ('openpyxl' o 'directo').
+    """
+    tabla_normalized = tabla_nombre.lower()
+    if fmt == "csv":
+        csv_path = os.path.join(output_dir, f"{tabla_normalized}.csv")
+        return export_analisis_csv(session, model, csv_path, filtro_where=filtro_where, filtro_params=filtro_params)
+    if fmt in FORMATOS_COLUMNARES:
+        ruta = os.path.join(output_dir, f"{tabla_normalized}{FORMATOS_COLUMNARES[fmt]}")
+        return export_analisis_columnar(session, model, ruta, fmt, filtro_where=filtro_where, filtro_params=filtro_params,
+                                        shards=shards)
+    
+    if motor_xlsx != "directo" and not OPENPYXL_AVAILABLE:
+        log_fail("openpyxl no está instalado")
+        return ""
+    xlsx_path = os.path.join(output_dir, f"{tabla_normalized}.xlsx")
+    return export_analisis_generico(session, model, xlsx_path, filtro_where=filtro_where, filtro_params=filtro_params,
+                                    shards=shards, motor_xlsx=motor_xlsx)
+
+# ================================
+# MÓDULO: EXPORTACIÓN EN PARALELO
+# ================================
+_engine_paralelo = None
+_engine_paralelo_lock = threading.Lock()
+
+def obtener_engine_paralelo():
+    """Retorna (creándolo una sola vez) el engine con pool de conexiones usado por los workers."""
+    global _engine_paralelo
+    with _engine_paralelo_lock:
+        if _engine_paralelo is None:
+            _engine_paralelo = obtener_engine(use_pool=True)
+        return _engine_paralelo
+
+@contextmanager
+def snapshot_exportacion(engine=None) -> Iterator[str]:
+    """
+    Abre una transacción coordinadora REPEATABLE READ READ ONLY y exporta su snapshot.
+    
+    Mientras el bloque `with` está activo, otras transacciones pueden adoptar el mismo
+    snapshot con importar_snapshot y ver exactamente el mismo corte de los datos.
+    
+    Yields:
+        Identificador del snapshot (resultado de pg_export_snapshot())
+    """
+    engine = engine or obtener_engine_paralelo()
+    conn = engine.connect()
+    trans = conn.begin()
+    try:
+        conn.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+        snapshot_id = conn.execute(text("SELECT pg_export_snapshot()")).scalar()
+        log_step(f"Snapshot de exportación: {snapshot_id}")
+        yield snapshot_id
+    finally:
+        try:
+            trans.rollback()
+        finally:
+            conn.close()
+
+def importar_snapshot(session, snapshot_id: str, solo_lectura: bool = True):
+    """
+    Hace que la transacción de la sesión lea el snapshot exportado por el coordinador.
+    Debe ejecutarse antes de cualquier otra consulta de la transacción. Con solo_lectura=False
+    la transacción puede crear tablas temporales (p. ej. crear_tabla_temporal_ids).
+    """
+    modo = "READ ONLY" if solo_lectura else "READ WRITE"
+    session.execute(text(f"SET TRANSACTION ISOLATION LEVEL REPEATABLE READ {modo}"))
+    session.execute(text("SET TRANSACTION SNAPSHOT :snapshot_id"), {"snapshot_id": snapshot_id})
+    # Permite que lecturas derivadas (p. ej. rangos en paralelo) reusen el mismo snapshot
+    session.info['snapshot_id'] = snapshot_id
+
+def ejecutar_exportaciones_en_paralelo(
+    tareas: List[tuple],
+    max_workers: int = EXPORT_PARALLEL_WORKERS,
+    al_generar_archivo: Optional[Callable[[str], None]] = None,
+    snapshot_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Ejecuta exportaciones de tablas en un pool acotado de threads.
+    
+    Cada worker abre su propia sesión sobre el engine con pool (una conexión por tabla)
+    y escribe su propio archivo. Los resultados se recolectan a medida que terminan.
+    
+    Args:
+        tareas: Lista de (nombre_tabla, funcion) donde funcion(session) retorna la ruta generada
+        max_workers: Cantidad máxima de tablas exportándose a la vez
+        al_generar_archivo: Callback invocado con la ruta de cada archivo terminado (opcional)
+        snapshot_id: Snapshot a importar en cada worker para leer un corte consistente (opcional)
+    
+    Returns:
+        Lista de resultados {'tabla', 'archivo', 'archivos', 'segundos', 'error'} en el orden
+        de las tareas ('archivos' incluye todas las partes si la tabla se dividió)
+    """
+    engine = obtener_engine_paralelo()
+    Session = sessionmaker(bind=engine)
+    
+    def _ejecutar(nombre, funcion):
+        inicio = time.perf_counter()
+        session = Session()
+        try:
+            if snapshot_id:
+                importar_snapshot(session, snapshot_id)
+            archivo = funcion(session)
+            error = None
+        except Exception as e:
+            archivo = ""
+            error = str(e)
+        finally:
+            session.close()
+        archivos = obtener_partes_archivo(archivo) if archivo else []
+        return {
+            'tabla': nombre,
+            'archivo': archivo,
+            'archivos': archivos,
+            'segundos': time.perf_counter() - inicio,
+            'error': error
+        }
+    
+    inicio_total = time.perf_counter()
+    resultados = {}
+    workers = max(1, min(max_workers, len(tareas)))
+    log_step(f"Exportando {len(tareas)} tabla(s) en paralelo con {workers} worker(s)...")
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inia-export") as pool:
+        # Cada worker corre en una copia del contexto para conservar el progreso de la exportación
+        futuros = {
+            pool.submit(contextvars.copy_context().run, _ejecutar, nombre, funcion): nombre
+            for nombre, funcion in tareas
+        }
+        try:
+            for futuro in as_completed(futuros):
+                resultado = futuro.result()
+                resultados[resultado['tabla']] = resultado
+                if resultado['archivo']:
+                    log_ok(f"{resultado['tabla']}: {resultado['segundos']:.2f}s")
+                    if al_generar_archivo:
+                        for archivo in resultado['archivos']:
+                            al_generar_archivo(archivo)
+                elif resultado['error']:
+                    log_fail(f"{resultado['tabla']}: {resultado['error']} ({resultado['segundos']:.2f}s)")
+                else:
+                    log_step(f"{resultado['tabla']}: sin archivo ({resultado['segundos']:.2f}s)")
+        except BaseException:
+            # El callback cortó la exportación (p. ej. el cliente se desconectó): no empezar más tablas
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    
+    log_ok(f"Exportación en paralelo completada en {time.perf_counter() - inicio_total:.2f}s")
+    return [resultados[nombre] for nombre, _ in tareas]
+
+# ================================
+# MÓDULO: EXPORTACIÓN CON FILTROS
+# ================================
+# Mapeo de tipos a nombres de columna ID
+COLUMNA_ID_POR_TIPO = {
+    'dosn': 'dosn_id',
+    'pureza': 'pureza_id',
+    'germinacion': 'germinacion_id',
+    'pms': 'pms_id',
+    'sanitario': 'sanitario_id',
+    'tetrazolio': 'tetrazolio_id',
+    'pureza_pnotatum': 'pureza_pnotatum_id'
+}
+
+def crear_tabla_temporal_ids(session, nombre: str, ids: List[int]) -> str:
+    """
+    Carga los IDs en una tabla temporal de la sesión (se elimina al terminar la transacción)
+    con una sola sentencia, y la analiza para que el planificador estime bien el join.
+    """
+    session.execute(text(f"DROP TABLE IF EXISTS {nombre}"))
+    session.execute(text(f"CREATE TEMP TABLE {nombre} (id bigint PRIMARY KEY) ON COMMIT DROP"))
+    session.execute(
+        text(f"INSERT INTO {nombre} (id) SELECT DISTINCT unnest(CAST(:ids AS bigint[]))"),
+        {"ids": list(ids)}
+    )
+    session.execute(text(f"ANALYZE {nombre}"))
+    return nombre
+
+def construir_filtro_analisis(
+    session,
+    tipo_lower: str,
+    model,
+    analisis_ids: Optional[Dict[str, List[int]]] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    campo_fecha: Optional[str] = None,
+    watermark: Optional[tuple] = None,
+    tabla_temporal_ids: bool = False
+) -> tuple:
+    """
+    Arma la cláusula WHERE de export_analisis_filtrados para un tipo de análisis
+    (IDs, rango de fechas, watermark y solo activos).
+    
+    Los IDs se pasan como un único parámetro array (`id_col = ANY(:ids)`), así el texto
+    de la consulta no cambia con la cantidad de IDs. Con tabla_temporal_ids se cargan en
+    una tabla temporal y se filtra con un join contra ella; esa tabla solo es visible
+    en la conexión de `session`, por lo que la lectura no puede ir a otra conexión.
+    
+    Returns:
+        (filtro_where, filtro_params), o (None, None) si no hay condiciones
+    """
+    columnas_validas, _ = obtener_columnas_validas(session, model)
+    condiciones_where = []
+    params = {}
+    
+    # Filtro por IDs si se proporciona
+    if analisis_ids and tipo_lower in analisis_ids:
+        ids = analisis_ids[tipo_lower]
+        if ids:
+            id_col = COLUMNA_ID_POR_TIPO.get(tipo_lower, f"{tipo_lower}_id")
+            if id_col in columnas_validas:
+                if tabla_temporal_ids:
+                    tabla_ids = crear_tabla_temporal_ids(session, f"tmp_export_ids_{tipo_lower}", ids)
+                    condiciones_where.append(f"{id_col} IN (SELECT id FROM {tabla_ids})")
+                else:
+                    condiciones_where.append(f"{id_col} = ANY(:ids)")
+                    params['ids'] = list(ids)
+    
+    # Filtro por fechas si se proporciona
+    campo_fecha_analisis = obtener_campo_fecha_analisis(tipo_lower, campo_fecha)
+    if campo_fecha_analisis and (fecha_desde or fecha_hasta):
+        if campo_fecha_analisis in columnas_validas:
+            if fecha_desde:
+                condiciones_where.append(f"{campo_fecha_analisis} >= :fecha_desde")
+                params['fecha_desde'] = fecha_desde
+            if fecha_hasta:
+                condiciones_where.append(f"{campo_fecha_analisis} <= :fecha_hasta")
+                params['fecha_hasta'] = fecha_hasta
+    
+    # Filtro incremental: solo filas posteriores al watermark
+    if watermark:
+        condicion, params_watermark = condicion_watermark(tipo_lower, watermark, columnas_validas, campo_fecha)
+        if condicion:
+            condiciones_where.append(condicion)
+            params.update(params_watermark)
+    
+    # Filtro por active = true (solo exportar análisis activos)
+    activo_col = COLUMNA_ACTIVO_POR_TIPO.get(tipo_lower)
+    if activo_col and activo_col in columnas_validas:
+        condiciones_where.append(f"{activo_col} = true")
+    
+    if not condiciones_where:
+        return None, None
+    return " AND ".join(condiciones_where), params
+
+def export_analisis_filtrados(
+    session,
+    tipos_analisis: List[str],
+    analisis_ids: Optional[Dict[str, List[int]]] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    campo_fecha: Optional[str] = None,
+    output_dir: str = "exports",
+    fmt: str = "xlsx",
+    al_generar_archivo: Optional[Callable[[str], None]] = None,
+    paralelo: bool = EXPORT_PARALLEL,
+    max_workers: int = EXPORT_PARALLEL_WORKERS,
+    consistente: bool = EXPORT_CONSISTENT,
+    desde_watermark: Optional[str] = None
+) -> List[str]:
+    """
+    Exporta análisis con filtros avanzados (IDs y fechas).
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        tipos_analisis: Lista de tipos de análisis a exportar (ej: ['dosn', 'pureza'])
+        analisis_ids: Diccionario mapeando tipo de análisis a lista de IDs
+                     (ej: {'dosn': [1, 2, 3], 'pureza': [5, 6]})
+        fecha_desde: Fecha de inicio del rango (opcional)
+        fecha_hasta: Fecha de fin del rango (opcional)
+        campo_fecha: Campo de fecha específico a usar ('auto' para detección automática)
+        output_dir: Directorio de salida
+        fmt: Formato de exportación ('xlsx' o 'csv')
+        al_generar_archivo: Callback invocado con la ruta de cada archivo apenas se termina (opcional)
+        paralelo: Si es True, cada tipo de análisis se exporta en un worker con su propia conexión
+        max_workers: Cantidad máxima de tablas exportándose a la vez en modo paralelo
+        consistente: En modo paralelo, la sesión y todos los workers leen el mismo snapshot
+        desde_watermark: Exportar solo lo insertado o actualizado desde este watermark
+                         (ver parsear_watermark; el siguiente se obtiene con obtener_watermark_actual)
+    
+    Returns:
+        Lista de rutas de archivos generados
     """
     archivos_generados = []
+    tareas_paralelas = []
+    watermark = parsear_watermark(desde_watermark) if desde_watermark else None
+    pila_contextos = ExitStack()
     
     try:
-        if not OPENPYXL_AVAILABLE:
+        if fmt == "xlsx" and not OPENPYXL_AVAILABLE:
             log_fail("openpyxl no está instalado")
             return archivos_generados
         
+        snapshot_id = None
+        if paralelo and consistente:
+            # Los tipos que se leen en esta sesión (tabla temporal de IDs) ven el mismo
+            # corte que los workers; la tabla temporal requiere una transacción READ WRITE
+            snapshot_id = pila_contextos.enter_context(snapshot_exportacion())
+            session.rollback()
+            usa_tabla_temporal = any(
+                len(ids or []) >= EXPORT_IDS_TEMP_TABLE_MIN for ids in (analisis_ids or {}).values()
+            )
+            importar_snapshot(session, snapshot_id, solo_lectura=not usa_tabla_temporal)
+        
         # Mapeo de nombres de tipos a nombres de tablas
         tipo_a_tabla = {
             'dosn': 'dosn',
@@ -749,28 +2391,6 @@ def export_analisis_filtrados(
             'pureza_pnotatum': 'pureza_pnotatum'
         }
         
-        # Mapeo de tipos a nombres de columna ID
-        tipo_a_id_col = {
-            'dosn': 'dosn_id',
-            'pureza': 'pureza_id',
-            'germinacion': 'germinacion_id',
-            'pms': 'pms_id',
-            'sanitario': 'sanitario_id',
-            'tetrazolio': 'tetrazolio_id',
-            'pureza_pnotatum': 'pureza_pnotatum_id'
-        }
-        
-        # Mapeo de tipos a nombres de columna active
-        tipo_a_activo_col = {
-            'dosn': 'dosn_activo',
-            'pureza': 'pureza_activo',
-            'germinacion': 'germinacion_activo',
-            'pms': 'pms_activo',
-            'sanitario': 'sanitario_activo',
-            'tetrazolio': 'tetrazolio_activo',
-            'pureza_pnotatum': 'pureza_activo'
-        }
-        
         for tipo_analisis in tipos_analisis:
             tipo_lower = tipo_analisis.lower()
             
@@ -778,6 +2398,7 @@ def export_analisis_filtrados(
             tabla_nombre = tipo_a_tabla.get(tipo_lower)
             if not tabla_nombre:
                 log_fail(f"Tipo de análisis desconocido: {tipo_analisis}")
+                registrar_tabla_fallida(tipo_lower)
                 continue
             
             # Intentar obtener el modelo
@@ -785,81 +2406,113 @@ def export_analisis_filtrados(
                 model = obtener_modelo(tabla_nombre)
             except (AttributeError, KeyError) as e:
                 log_fail(f"No se pudo obtener modelo para {tabla_nombre}: {e}")
+                registrar_tabla_fallida(tabla_nombre)
                 continue
             
-            # Construir filtros WHERE
-            condiciones_where = []
-            params = {}
-            
-            # Filtro por IDs si se proporciona
-            if analisis_ids and tipo_lower in analisis_ids:
-                ids = analisis_ids[tipo_lower]
-                if ids:
-                    id_col = tipo_a_id_col.get(tipo_lower, f"{tipo_lower}_id")
-                    # Verificar que la columna existe
-                    columnas_validas, _ = obtener_columnas_validas(session, model)
-                    if id_col in columnas_validas:
-                        placeholders = ','.join([f':id_{i}' for i in range(len(ids))])
-                        condiciones_where.append(f"{id_col} IN ({placeholders})")
-                        for i, id_val in enumerate(ids):
-                            params[f'id_{i}'] = id_val
-            
-            # Filtro por fechas si se proporciona
-            campo_fecha_analisis = obtener_campo_fecha_analisis(tipo_lower, campo_fecha)
-            if campo_fecha_analisis and (fecha_desde or fecha_hasta):
-                # Verificar que el campo existe
-                columnas_validas, _ = obtener_columnas_validas(session, model)
-                if campo_fecha_analisis in columnas_validas:
-                    if fecha_desde:
-                        condiciones_where.append(f"{campo_fecha_analisis} >= :fecha_desde")
-                        params['fecha_desde'] = fecha_desde
-                    if fecha_hasta:
-                        condiciones_where.append(f"{campo_fecha_analisis} <= :fecha_hasta")
-                        params['fecha_hasta'] = fecha_hasta
-            
-            # Filtro por active = true (solo exportar análisis activos)
-            activo_col = tipo_a_activo_col.get(tipo_lower)
-            if activo_col:
-                # Verificar que la columna existe
-                columnas_validas, _ = obtener_columnas_validas(session, model)
-                if activo_col in columnas_validas:
-                    condiciones_where.append(f"{activo_col} = true")
-            
-            # Construir cláusula WHERE completa
-            filtro_where = None
-            filtro_params = None
-            if condiciones_where:
-                filtro_where = " AND ".join(condiciones_where)
-                filtro_params = params
+            # Listas muy grandes de IDs: join contra una tabla temporal de esta sesión
+            ids_tipo = (analisis_ids or {}).get(tipo_lower) or []
+            tabla_temporal_ids = len(ids_tipo) >= EXPORT_IDS_TEMP_TABLE_MIN
+            filtro_where, filtro_params = construir_filtro_analisis(
+                session, tipo_lower, model, analisis_ids, fecha_desde, fecha_hasta, campo_fecha, watermark,
+                tabla_temporal_ids=tabla_temporal_ids
+            )
             
-            # Generar nombre de archivo
-            tabla_normalized = tabla_nombre.lower()
-            xlsx_path = os.path.join(output_dir, f"{tabla_normalized}.xlsx")
+            if paralelo and not tabla_temporal_ids:
+                # Los filtros ya están resueltos: la lectura y escritura se hacen en el worker
+                tareas_paralelas.append((tabla_nombre, functools.partial(
+                    export_analisis_formato,
+                    model=model,
+                    tabla_nombre=tabla_nombre,
+                    output_dir=output_dir,
+                    fmt=fmt,
+                    filtro_where=filtro_where,
+                    filtro_params=filtro_params
+                )))
+                continue
             
-            # Exportar con filtros
+            # Exportar con filtros (con tabla temporal, en una sola lectura sobre esta sesión)
             log_step(f"Exportando {tabla_nombre} con filtros...")
-            archivo_generado = export_analisis_generico(
-                session, 
-                model, 
-                xlsx_path, 
+            archivo_generado = export_analisis_formato(
+                session,
+                model,
+                tabla_nombre,
+                output_dir,
+                fmt,
                 filtro_where=filtro_where,
-                filtro_params=filtro_params
+                filtro_params=filtro_params,
+                shards=1 if tabla_temporal_ids else EXPORT_SHARDS
             )
             
             if archivo_generado:
-                archivos_generados.append(archivo_generado)
+                for archivo in obtener_partes_archivo(archivo_generado):
+                    archivos_generados.append(archivo)
+                    if al_generar_archivo:
+                        al_generar_archivo(archivo)
+            else:
+                registrar_tabla_fallida(tabla_nombre)
+        
+        if tareas_paralelas:
+            resultados = ejecutar_exportaciones_en_paralelo(
+                tareas_paralelas,
+                max_workers=max_workers,
+                al_generar_archivo=al_generar_archivo,
+                snapshot_id=snapshot_id
+            )
+            for resultado in resultados:
+                archivos_generados.extend(resultado['archivos'])
+                if not resultado['archivo']:
+                    registrar_tabla_fallida(resultado['tabla'])
         
         return archivos_generados
         
     except Exception as e:
         log_fail(f"Error en export_analisis_filtrados: {e}")
+        for tipo_analisis in tipos_analisis:
+            registrar_tabla_fallida(tipo_analisis.lower())
         return archivos_generados
+    finally:
+        pila_contextos.close()
+
+# Recibo activo de un lote (export_analisis_por_lote)
+SQL_RECIBO_POR_LOTE = """
+    SELECT RECIBO_ID 
+    FROM RECIBO 
+    WHERE LOTE_ID = :lote_id 
+    AND RECIBO_ACTIVO = true
+    LIMIT 1
+"""
+
+# Recibo activo de varios lotes en una consulta (export_analisis_por_lotes)
+SQL_RECIBOS_POR_LOTES = """
+    SELECT DISTINCT ON (LOTE_ID) LOTE_ID, RECIBO_ID
+    FROM RECIBO
+    WHERE LOTE_ID = ANY(:lote_ids)
+    AND RECIBO_ACTIVO = true
+    ORDER BY LOTE_ID, RECIBO_ID
+"""
+
+def construir_filtro_recibo(config: Dict[str, str], columnas_validas: list, varios: bool = False) -> str:
+    """
+    Cláusula WHERE de los análisis de un recibo (`:recibo_id`) o de varios (`:recibo_ids`),
+    solo activos si la tabla tiene la columna. `config` es una entrada de TABLAS_ANALISIS_POR_RECIBO.
+    """
+    recibo_col = config['recibo_col']
+    condiciones_where = [f"{recibo_col} = ANY(:recibo_ids)" if varios else f"{recibo_col} = :recibo_id"]
+    activo_col = config.get('activo_col')
+    if activo_col and activo_col in columnas_validas:
+        condiciones_where.append(f"{activo_col} = true")
+    return " AND ".join(condiciones_where)
 
 def export_analisis_por_lote(
     session,
     lote_id: int,
     output_dir: str = "exports",
-    fmt: str = "xlsx"
+    fmt: str = "xlsx",
+    al_generar_archivo: Optional[Callable[[str], None]] = None,
+    paralelo: bool = EXPORT_PARALLEL,
+    max_workers: int = EXPORT_PARALLEL_WORKERS,
+    consistente: bool = EXPORT_CONSISTENT,
+    libro_unico: bool = EXPORT_SINGLE_WORKBOOK
 ) -> List[str]:
     """
     Exporta todos los análisis asociados a un lote específico.
@@ -869,26 +2522,34 @@ def export_analisis_por_lote(
         lote_id: ID del lote del cual exportar análisis
         output_dir: Directorio de salida
         fmt: Formato de exportación ('xlsx' o 'csv')
+        al_generar_archivo: Callback invocado con la ruta de cada archivo apenas se termina (opcional)
+        paralelo: Si es True, cada tipo de análisis se exporta en un worker con su propia conexión
+        max_workers: Cantidad máxima de tablas exportándose a la vez en modo paralelo
+        consistente: En modo paralelo, la sesión y todos los workers leen el mismo snapshot
+        libro_unico: Si es True (y fmt es xlsx), todos los análisis van como hojas de lote_<id>.xlsx
     
     Returns:
         Lista de rutas de archivos generados
     """
     archivos_generados = []
+    tareas_paralelas = []
+    tablas_libro = []
+    pila_contextos = ExitStack()
     
     try:
-        if not OPENPYXL_AVAILABLE:
+        if fmt == "xlsx" and not OPENPYXL_AVAILABLE:
             log_fail("openpyxl no está instalado")
             return archivos_generados
         
+        snapshot_id = None
+        if paralelo and consistente:
+            # El recibo, los conteos y los workers leen el mismo corte de los datos
+            snapshot_id = pila_contextos.enter_context(snapshot_exportacion())
+            session.rollback()
+            importar_snapshot(session, snapshot_id)
+        
         # Obtener recibo_id asociado al lote_id
-        query_recibo = text("""
-            SELECT RECIBO_ID 
-            FROM RECIBO 
-            WHERE LOTE_ID = :lote_id 
-            AND RECIBO_ACTIVO = true
-            LIMIT 1
-        """)
-        result_recibo = session.execute(query_recibo, {"lote_id": lote_id}).fetchone()
+        result_recibo = session.execute(text(SQL_RECIBO_POR_LOTE), {"lote_id": lote_id}).fetchone()
         
         if not result_recibo or not result_recibo[0]:
             log_fail(f"No se encontró recibo activo asociado al lote {lote_id}")
@@ -897,19 +2558,8 @@ def export_analisis_por_lote(
         recibo_id = result_recibo[0]
         log_step(f"Recibo encontrado para lote {lote_id}: RECIBO_ID = {recibo_id}")
         
-        # Mapeo de tipos de análisis a nombres de tablas y columnas
-        tipos_analisis = {
-            'dosn': {'tabla': 'dosn', 'id_col': 'dosn_id', 'recibo_col': 'recibo_id', 'activo_col': 'dosn_activo'},
-            'pureza': {'tabla': 'pureza', 'id_col': 'pureza_id', 'recibo_col': 'recibo_id', 'activo_col': 'pureza_activo'},
-            'germinacion': {'tabla': 'germinacion', 'id_col': 'germinacion_id', 'recibo_col': 'recibo_id', 'activo_col': 'germinacion_activo'},
-            'pms': {'tabla': 'pms', 'id_col': 'pms_id', 'recibo_col': 'recibo_id', 'activo_col': 'pms_activo'},
-            'sanitario': {'tabla': 'sanitario', 'id_col': 'sanitario_id', 'recibo_col': 'sanitario_reciboid', 'activo_col': 'sanitario_activo'},
-            'tetrazolio': {'tabla': 'tetrazolio', 'id_col': 'tetrazolio_id', 'recibo_col': 'recibo_id', 'activo_col': 'tetrazolio_activo'},
-            'pureza_pnotatum': {'tabla': 'pureza_pnotatum', 'id_col': 'pureza_pnotatum_id', 'recibo_col': 'recibo_id', 'activo_col': 'pureza_activo'}
-        }
-        
         # Exportar cada tipo de análisis asociado al recibo
-        for tipo, config in tipos_analisis.items():
+        for tipo, config in TABLAS_ANALISIS_POR_RECIBO.items():
             tabla_nombre = config['tabla']
             recibo_col = config['recibo_col']
             
@@ -921,22 +2571,15 @@ def export_analisis_por_lote(
                 continue
             
             # Verificar que existe la columna recibo_id
-            columnas_validas, _ = obtener_columnas_validas(session, model)
+            columnas_validas, columnas_analisis = obtener_columnas_validas(session, model)
             if recibo_col not in columnas_validas:
                 log_step(f"Tabla {tabla_nombre} no tiene columna {recibo_col}, omitiendo...")
                 continue
             
-            # Construir filtro WHERE para filtrar por recibo_id y active = true
-            condiciones_where = [f"{recibo_col} = :recibo_id"]
+            # Filtrar por recibo_id y active = true
+            filtro_where = construir_filtro_recibo(config, columnas_validas)
             filtro_params = {'recibo_id': recibo_id}
             
-            # Agregar filtro de active = true si la columna existe
-            activo_col = config.get('activo_col')
-            if activo_col and activo_col in columnas_validas:
-                condiciones_where.append(f"{activo_col} = true")
-            
-            filtro_where = " AND ".join(condiciones_where)
-            
             # Verificar si hay datos antes de exportar
             query_count = text(f"SELECT COUNT(*) FROM {tabla_nombre} WHERE {filtro_where}")
             count_result = session.execute(query_count, filtro_params).fetchone()
@@ -944,22 +2587,63 @@ def export_analisis_por_lote(
                 log_step(f"No hay análisis de tipo {tipo} para el recibo {recibo_id}, omitiendo...")
                 continue
             
-            # Generar nombre de archivo
-            tabla_normalized = tabla_nombre.lower()
-            xlsx_path = os.path.join(output_dir, f"{tabla_normalized}.xlsx")
+            if libro_unico and fmt == "xlsx":
+                if columnas_analisis:
+                    tablas_libro.append({
+                        'tabla': tabla_nombre,
+                        'columnas': columnas_analisis,
+                        'filtro_where': filtro_where,
+                        'filtro_params': filtro_params
+                    })
+                continue
+            
+            if paralelo:
+                tareas_paralelas.append((tabla_nombre, functools.partial(
+                    export_analisis_formato,
+                    model=model,
+                    tabla_nombre=tabla_nombre,
+                    output_dir=output_dir,
+                    fmt=fmt,
+                    filtro_where=filtro_where,
+                    filtro_params=filtro_params
+                )))
+                continue
             
             # Exportar con filtro de recibo
             log_step(f"Exportando {tabla_nombre} para lote {lote_id} (recibo {recibo_id})...")
-            archivo_generado = export_analisis_generico(
-                session, 
-                model, 
-                xlsx_path, 
+            archivo_generado = export_analisis_formato(
+                session,
+                model,
+                tabla_nombre,
+                output_dir,
+                fmt,
                 filtro_where=filtro_where,
                 filtro_params=filtro_params
             )
             
             if archivo_generado:
-                archivos_generados.append(archivo_generado)
+                for archivo in obtener_partes_archivo(archivo_generado):
+                    archivos_generados.append(archivo)
+                    if al_generar_archivo:
+                        al_generar_archivo(archivo)
+        
+        if tareas_paralelas:
+            resultados = ejecutar_exportaciones_en_paralelo(
+                tareas_paralelas,
+                max_workers=max_workers,
+                al_generar_archivo=al_generar_archivo,
+                snapshot_id=snapshot_id
+            )
+            for resultado in resultados:
+                archivos_generados.extend(resultado['archivos'])
+        
+        if tablas_libro:
+            log_step(f"Exportando {len(tablas_libro)} análisis del lote {lote_id} en un solo libro...")
+            xlsx_path = export_tablas_libro_unico(session, tablas_libro, os.path.join(output_dir, f"lote_{lote_id}.xlsx"))
+            if xlsx_path:
+                archivos_generados.append(xlsx_path)
+                if al_generar_archivo:
+                    al_generar_archivo(xlsx_path)
         
         if archivos_generados:
             log_ok(f"Exportación completada para lote {lote_id}: {len(archivos_generados)} archivo(s) generado(s)")
@@ -971,18 +2655,321 @@ def export_analisis_por_lote(
     except Exception as e:
         log_fail(f"Error en export_analisis_por_lote: {e}")
         return archivos_generados
+    finally:
+        pila_contextos.close()
+
+def formatear_valor_csv(value):
+    """Formatea un valor como lo hace COPY ... WITH CSV (booleanos t/f, NULL vacío)."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def escribir_filas_csv(rows: Iterable, columnas: list, csv_path: str) -> int:
+    """Escribe filas ya leídas en un CSV con encabezado, con el mismo formato que export_tabla_csv."""
+    total_filas = 0
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columnas)
+        for row in rows:
+            writer.writerow([formatear_valor_csv(v) for v in row])
+            total_filas += 1
+    sumar_filas_exportadas(total_filas)
+    return total_filas
+
+def resolver_recibos_lotes(session, lote_ids: List[int]) -> Dict[Any, int]:
+    """
+    Resuelve en una sola consulta el recibo activo de cada lote.
+    Retorna {recibo_id: lote_id}; si un lote tiene varios recibos activos se usa el de menor id.
+    """
+    filas = session.execute(text(SQL_RECIBOS_POR_LOTES), {"lote_ids": list(lote_ids)}).fetchall()
+    return {recibo_id: lote_id for lote_id, recibo_id in filas if recibo_id is not None}
+
+def export_analisis_por_lotes(
+    session,
+    lote_ids: List[int],
+    output_dir: str = "exports",
+    fmt: str = "xlsx",
+    al_generar_archivo: Optional[Callable[[str], None]] = None,
+    agrupar: str = "carpetas"
+) -> List[str]:
+    """
+    Exporta los análisis de varios lotes con una consulta por tipo de análisis.
+    
+    Los recibos activos de todos los lotes se resuelven en una consulta y cada tipo de
+    análisis se lee una sola vez (`recibo_col = ANY(:recibo_ids)`, ordenado por recibo),
+    repartiendo las filas por lote mientras se leen.
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        lote_ids: IDs de los lotes a exportar
+        output_dir: Directorio de salida
+        fmt: Formato de exportación ('xlsx', 'csv', 'parquet' o 'arrow')
+        al_generar_archivo: Callback invocado con la ruta de cada archivo apenas se termina (opcional)
+        agrupar: 'carpetas' genera lote_<id>/<tabla>.<ext>; 'hojas' (solo xlsx) genera
+            <tabla>.xlsx con una hoja lote_<id> por lote
+    
+    Returns:
+        Lista de rutas de archivos generados
+    
+    Raises:
+        Exception: Si falla la lectura o escritura de un tipo de análisis; la tabla queda
+            registrada como fallida y el error se relanza para cortar el ZIP en streaming
+    """
+    archivos_generados = []
+    tabla_nombre = None
+    
+    def _registrar(archivo: str):
+        archivos_generados.append(archivo)
+        if al_generar_archivo:
+            al_generar_archivo(archivo)
+    
+    try:
+        if fmt == "xlsx" and not OPENPYXL_AVAILABLE:
+            log_fail("openpyxl no está instalado")
+            return archivos_generados
+        if fmt in FORMATOS_COLUMNARES and not PYARROW_AVAILABLE:
+            log_fail("pyarrow no está instalado (requerido para exportar en formato parquet/arrow)")
+            return archivos_generados
+        if agrupar == "hojas" and fmt != "xlsx":
+            log_step(f"El agrupamiento por hojas solo aplica a xlsx, se usan carpetas para {fmt}")
+            agrupar = "carpetas"
+        
+        lote_por_recibo = resolver_recibos_lotes(session, lote_ids)
+        sin_recibo = set(lote_ids) - set(lote_por_recibo.values())
+        if sin_recibo:
+            log_step(f"Lotes sin recibo activo, omitidos: {sorted(sin_recibo)}")
+        if not lote_por_recibo:
+            log_fail("No se encontró recibo activo para ninguno de los lotes")
+            return archivos_generados
+        log_step(f"{len(lote_por_recibo)} recibo(s) encontrados para {len(lote_ids)} lote(s)")
+        recibo_ids = list(lote_por_recibo)
+        
+        for tipo, config in TABLAS_ANALISIS_POR_RECIBO.items():
+            tabla_nombre = config['tabla']
+            recibo_col = config['recibo_col']
+            
+            try:
+                model = obtener_modelo(tabla_nombre)
+            except (AttributeError, KeyError):
+                log_step(f"Tabla {tabla_nombre} no encontrada o sin modelo, omitiendo...")
+                continue
+            
+            columnas_validas, columnas_analisis = obtener_columnas_validas(session, model)
+            if recibo_col not in columnas_validas:
+                log_step(f"Tabla {tabla_nombre} no tiene columna {recibo_col}, omitiendo...")
+                continue
+            if not columnas_analisis:
+                continue
+            
+            filtro_where = construir_filtro_recibo(config, columnas_validas, varios=True)
+            orden = recibo_col
+            if config['id_col'] in columnas_validas:
+                orden += f", {config['id_col']}"
+            
+            # La columna del recibo va primero para agrupar; no se escribe en la salida
+            if fmt == "xlsx":
+                escritores = obtener_escritores_columnas(session, tabla_nombre, columnas_analisis)
+            rows = iterar_datos_tabla(
+                session, tabla_nombre, [recibo_col] + columnas_analisis,
+                filtro_where, {'recibo_ids': recibo_ids}, orden=orden
+            )
+            grupos = (
+                (lote_por_recibo[recibo_id], (row[1:] for row in filas))
+                for recibo_id, filas in itertools.groupby(rows, key=lambda row: row[0])
+            )
+            
+            if agrupar == "hojas":
+                wb = crear_libro_excel()
+                total_filas = 0
+                for lote_id, filas in grupos:
+                    total_filas += agregar_filas_a_libro(wb, f"lote_{lote_id}", columnas_analisis, filas, escritores)
+                if not total_filas:
+                    log_step(f"No hay análisis de tipo {tipo} para los lotes indicados, omitiendo...")
+                    continue
+                xlsx_path = os.path.join(output_dir, f"{tabla_nombre}.xlsx")
+                if not guardar_workbook_excel(wb, xlsx_path):
+                    raise RuntimeError(f"No se pudo guardar {xlsx_path}")
+                log_ok(f"Archivo generado: {xlsx_path} ({total_filas} filas)")
+                _registrar(xlsx_path)
+                continue
+            
+            if fmt in FORMATOS_COLUMNARES:
+                schema, conversores = obtener_esquema_arrow(session, tabla_nombre, columnas_analisis)
+            for lote_id, filas in grupos:
+                lote_dir = ensure_output_dir(os.path.join(output_dir, f"lote_{lote_id}"))
+                if fmt == "xlsx":
+                    partes, total_filas = escribir_filas_xlsx(
+                        filas, tabla_nombre, columnas_analisis, os.path.join(lote_dir, f"{tabla_nombre}.xlsx"),
+                        escritores=escritores
+                    )
+                    for parte in partes:
+                        _registrar(parte)
+                    continue
+                if fmt in FORMATOS_COLUMNARES:
+                    ruta = os.path.join(lote_dir, f"{tabla_nombre}{FORMATOS_COLUMNARES[fmt]}")
+                    total_filas = escribir_filas_columnar(filas, schema, conversores, ruta, fmt)
+                else:
+                    ruta = os.path.join(lote_dir, f"{tabla_nombre}.csv")
+                    total_filas = escribir_filas_csv(filas, columnas_analisis, ruta)
+                log_ok(f"Archivo generado: {ruta} ({total_filas} filas)")
+                _registrar(ruta)
+        
+        if archivos_generados:
+            log_ok(f"Exportación completada para {len(lote_ids)} lote(s): {len(archivos_generados)} archivo(s) generado(s)")
+        else:
+            log_fail(f"No se generaron archivos para los lotes {lote_ids}")
+        
+        return archivos_generados
+        
+    except Exception as e:
+        log_fail(f"Error en export_analisis_por_lotes: {e}")
+        if tabla_nombre:
+            registrar_tabla_fallida(tabla_nombre)
+        raise
 
 # ================================
 # MÓDULO: EXPORTACIÓN PRINCIPAL
 # ================================
-def export_selected_tables(tables: list, output_dir: str, fmt: str, incluir_sin_pk: bool = True) -> None:
-    """Exporta las tablas seleccionadas a Excel.
+def resolver_columnas_tabla(session, name: str) -> list:
+    """Retorna las columnas exportables de una tabla, tenga o no modelo de automap."""
+    model = None
+    try:
+        model = obtener_modelo(name)
+    except (AttributeError, KeyError):
+        model = MODELS.get(name)
+    if model is not None:
+        _, columnas_analisis = obtener_columnas_validas(session, model)
+        return columnas_analisis
+    columnas = verificar_estructura_tabla(session, name)
+    return filtrar_columnas_analisis(columnas, name) if columnas else []
+
+def exportar_tabla_por_nombre(session, name: str, out_dir: str, fmt: str,
+                              motor_xlsx: str = EXPORT_XLSX_ENGINE) -> str:
+    """
+    Exporta una tabla por nombre, con o sin modelo de automap.
+    Retorna la ruta del archivo generado o cadena vacía si no se exportó.
+    """
+    try:
+        # Intentar obtener el modelo
+        model = None
+        try:
+            model = obtener_modelo(name)
+        except (AttributeError, KeyError):
+            # Si no se encuentra el modelo, intentar exportar directamente
+            log_step(f"Tabla {name} no encontrada en modelos, intentando exportación directa...")
+            # Verificar que la tabla existe en la BD
+            query_check = text("""
+                SELECT EXISTS (
+                    SELECT 1
+                    FROM information_schema.tables
+                    WHERE table_schema = 'public'
+                        AND table_name = :tabla
+                )
+            """)
+            exists = session.execute(query_check, {"tabla": name}).fetchone()[0]
+            if not exists:
+                log_fail(f"Tabla {name} no existe en la base de datos")
+                return ""
+            
+            # Crear un modelo temporal para la exportación
+            # Usar el modelo genérico si es posible
+            if name in MODELS:
+                model = MODELS[name]
+            else:
+                # Exportar directamente sin modelo
+                log_step(f"Exportando tabla {name} directamente (sin modelo)...")
+                try:
+                    # Obtener columnas de la tabla
+                    columnas = verificar_estructura_tabla(session, name)
+                    if not columnas:
+                        log_fail(f"No se pudieron obtener columnas de {name}")
+                        return ""
+                    
+                    # Filtrar columnas de análisis
+                    columnas_analisis = filtrar_columnas_analisis(columnas, name)
+                    if not columnas_analisis:
+                        log_step(f"Tabla {name} no tiene columnas de análisis después del filtrado")
+                        return ""
+                    
+                    name_normalized = name.lower()
+                    if fmt == "csv":
+                        csv_path = os.path.join(out_dir, f"{name_normalized}.csv")
+                        total_filas = export_tabla_csv(session, name, columnas_analisis, csv_path)
+                        log_ok(f"Archivo generado: {csv_path} ({total_filas} filas)")
+                        return csv_path
+                    
+                    if fmt in FORMATOS_COLUMNARES:
+                        if not PYARROW_AVAILABLE:
+                            log_fail("pyarrow no está instalado (requerido para formato parquet/arrow)")
+                            return ""
+                        ruta = os.path.join(out_dir, f"{name_normalized}{FORMATOS_COLUMNARES[fmt]}")
+                        total_filas = export_tabla_columnar(session, name, columnas_analisis, ruta, fmt)
+                        log_ok(f"Archivo generado: {ruta} ({total_filas} filas)")
+                        return ruta
+                    
+                    if motor_xlsx != "directo" and not OPENPYXL_AVAILABLE:
+                        log_fail("openpyxl no está instalado")
+                        return ""
+                    
+                    # Leer y escribir (nombre normalizado a lowercase)
+                    xlsx_path = os.path.join(out_dir, f"{name_normalized}.xlsx")
+                    partes, total_filas = escribir_tabla_xlsx(
+                        session, name, columnas_analisis, xlsx_path, motor_xlsx=motor_xlsx
+                    )
+                    if partes:
+                        log_ok(f"Archivo generado: {', '.join(partes)} ({total_filas} filas)")
+                        return partes[0]
+                    return ""
+                except Exception as e:
+                    log_fail(f"Error exportando tabla {name} directamente: {e}")
+                    return ""
+        
+        if not model:
+            log_fail(f"No se pudo obtener modelo para tabla: {name}")
+            return ""
+        
+        if fmt == "xlsx":
+            return export_table_xlsx(session, model, out_dir, motor_xlsx)
+        if fmt == "csv":
+            return export_table_csv(session, model, out_dir)
+        if fmt in FORMATOS_COLUMNARES:
+            table = obtener_nombre_tabla(model)
+            log_step(f"➡️ Exportando {table} a {fmt}...")
+            return export_analisis_columnar(
+                session, model, os.path.join(out_dir, f"{table.lower()}{FORMATOS_COLUMNARES[fmt]}"), fmt
+            )
+        log_fail(f"Formato {fmt} no soportado. Solo se soporta xlsx, csv, parquet y arrow.")
+        return ""
+    except Exception as e:
+        log_fail(f"Error exportando tabla {name}: {e}")
+        return ""
+
+def export_selected_tables(tables: list, output_dir: str, fmt: str, incluir_sin_pk: bool = True,
+                           al_generar_archivo: Optional[Callable[[str], None]] = None,
+                           paralelo: bool = EXPORT_PARALLEL,
+                           max_workers: int = EXPORT_PARALLEL_WORKERS,
+                           consistente: bool = EXPORT_CONSISTENT,
+                           libro_unico: bool = EXPORT_SINGLE_WORKBOOK,
+                           motor_xlsx: str = EXPORT_XLSX_ENGINE) -> None:
+    """Exporta las tablas seleccionadas a Excel o CSV.
     
     Args:
         tables: Lista de nombres de tablas a exportar. Si está vacía, exporta todas.
         output_dir: Directorio de salida para los archivos
         fmt: Formato de exportación ('xlsx' o 'csv')
         incluir_sin_pk: Si es True, incluye también tablas sin Primary Key
+        al_generar_archivo: Callback invocado con la ruta de cada archivo apenas se termina (opcional)
+        paralelo: Si es True, exporta cada tabla en un worker con su propia conexión
+        max_workers: Cantidad máxima de tablas exportándose a la vez en modo paralelo
+        consistente: En modo paralelo, todos los workers leen el mismo snapshot de la base
+        libro_unico: Si es True (y fmt es xlsx), todas las tablas van como hojas de export.xlsx
+        motor_xlsx: Motor de escritura de xlsx ('openpyxl' o 'directo')
     """
     try:
         engine = obtener_engine()
@@ -1024,6 +3011,7 @@ def export_selected_tables(tables: list, output_dir: str, fmt: str, incluir_sin_
                                 tablas_a_exportar.add(tabla_rel_lower)
                     except Exception as e:
                         log_fail(f"Error obteniendo tablas relacionadas con {tabla_principal}: {e}")
+                        registrar_tabla_fallida(f"{tabla_principal} (tablas relacionadas)")
                         # Hacer rollback para continuar
                         try:
                             session.rollback()
@@ -1047,6 +3035,7 @@ def export_selected_tables(tables: list, output_dir: str, fmt: str, incluir_sin_
                                 tablas_a_exportar.add(tabla_lower)
                 except Exception as e:
                     log_fail(f"Error obteniendo tablas sin PK: {e}")
+                    registrar_tabla_fallida("(tablas sin PK)")
                     # Hacer rollback para continuar
                     try:
                         session.rollback()
@@ -1058,92 +3047,53 @@ def export_selected_tables(tables: list, output_dir: str, fmt: str, incluir_sin_
             
             log_step(f"Total de tablas a exportar: {len(tablas_a_exportar)}")
             
-            for name in tablas_a_exportar:
-                try:
-                    # Intentar obtener el modelo
-                    model = None
-                    try:
-                        model = obtener_modelo(name)
-                    except (AttributeError, KeyError):
-                        # Si no se encuentra el modelo, intentar exportar directamente
-                        log_step(f"Tabla {name} no encontrada en modelos, intentando exportación directa...")
-                        # Verificar que la tabla existe en la BD
-                        query_check = text("""
-                            SELECT EXISTS (
-                                SELECT 1
-                                FROM information_schema.tables
-                                WHERE table_schema = 'public'
-                                    AND table_name = :tabla
-                            )
-                        """)
-                        exists = session.execute(query_check, {"tabla": name}).fetchone()[0]
-                        if not exists:
-                            log_fail(f"Tabla {name} no existe en la base de datos")
-                            continue
-                        
-                        # Crear un modelo temporal para la exportación
-                        # Usar el modelo genérico si es posible
-                        if name in MODELS:
-                            model = MODELS[name]
-                        else:
-                            # Exportar directamente sin modelo
-                            log_step(f"Exportando tabla {name} directamente (sin modelo)...")
-                            try:
-                                # Obtener columnas de la tabla
-                                columnas = verificar_estructura_tabla(session, name)
-                                if not columnas:
-                                    log_fail(f"No se pudieron obtener columnas de {name}")
-                                    continue
-                                
-                                # Filtrar columnas de análisis
-                                columnas_analisis = filtrar_columnas_analisis(columnas, name)
-                                if not columnas_analisis:
-                                    log_step(f"Tabla {name} no tiene columnas de análisis después del filtrado")
-                                    continue
-                                
-                                # Obtener datos
-                                rows = obtener_datos_tabla(session, name, columnas_analisis)
-                                
-                                # Crear workbook
-                                if not OPENPYXL_AVAILABLE:
-                                    log_fail("openpyxl no está instalado")
-                                    continue
-                                
-                                wb, ws = crear_workbook_excel(name)
-                                
-                                # Escribir datos
-                                escribir_encabezados_excel(ws, columnas_analisis)
-                                escribir_filas_excel(ws, rows)
-                                
-                                # Ajustar columnas
-                                ajustar_ancho_columnas_excel(ws, columnas_analisis)
-                                
-                                # Guardar (normalizar nombre a lowercase)
-                                name_normalized = name.lower()
-                                xlsx_path = os.path.join(out_dir, f"{name_normalized}.xlsx")
-                                if guardar_workbook_excel(wb, xlsx_path):
-                                    log_ok(f"Archivo generado: {xlsx_path} ({len(rows)} filas)")
-                                    exported += 1
-                                continue
-                            except Exception as e:
-                                log_fail(f"Error exportando tabla {name} directamente: {e}")
-                                continue
-                    
-                    if not model:
-                        log_fail(f"No se pudo obtener modelo para tabla: {name}")
-                        continue
-                    
-                    if fmt == "xlsx":
-                        path = export_table_xlsx(session, model, out_dir)
+            if libro_unico and fmt == "xlsx":
+                # Un solo Workbook: las tablas se escriben en secuencia, una hoja por tabla
+                tablas_libro = []
+                for name in sorted(tablas_a_exportar):
+                    columnas_analisis = resolver_columnas_tabla(session, name)
+                    if columnas_analisis:
+                        tablas_libro.append({'tabla': name, 'columnas': columnas_analisis})
                     else:
-                        log_fail(f"Formato {fmt} no soportado. Solo se soporta xlsx.")
-                        continue
-                    
+                        log_step(f"Tabla {name} no tiene columnas para exportar, omitiendo...")
+                        registrar_tabla_fallida(name)
+                xlsx_path = export_tablas_libro_unico(
+                    session, tablas_libro, os.path.join(out_dir, "export.xlsx"), motor_xlsx
+                )
+                if xlsx_path:
+                    exported = len(tablas_libro)
+                    if al_generar_archivo:
+                        al_generar_archivo(xlsx_path)
+                else:
+                    for tabla in tablas_libro:
+                        registrar_tabla_fallida(tabla['tabla'])
+            elif paralelo:
+                tareas = [
+                    (name, functools.partial(exportar_tabla_por_nombre, name=name, out_dir=out_dir, fmt=fmt,
+                                             motor_xlsx=motor_xlsx))
+                    for name in sorted(tablas_a_exportar)
+                ]
+                with (snapshot_exportacion() if consistente else nullcontext()) as snapshot_id:
+                    resultados = ejecutar_exportaciones_en_paralelo(
+                        tareas,
+                        max_workers=max_workers,
+                        al_generar_archivo=al_generar_archivo,
+                        snapshot_id=snapshot_id
+                    )
+                exported = sum(1 for resultado in resultados if resultado['archivo'])
+                for resultado in resultados:
+                    if not resultado['archivo']:
+                        registrar_tabla_fallida(resultado['tabla'])
+            else:
+                for name in tablas_a_exportar:
+                    path = exportar_tabla_por_nombre(session, name, out_dir, fmt, motor_xlsx)
                     if path:
                         exported += 1
-                except Exception as e:
-                    log_fail(f"Error exportando tabla {name}: {e}")
-                    continue
+                        if al_generar_archivo:
+                            for archivo in obtener_partes_archivo(path):
+                                al_generar_archivo(archivo)
+                    else:
+                        registrar_tabla_fallida(name)
             
             log_ok(f"Tablas exportadas correctamente: {exported}/{len(tablas_a_exportar)}")
             
@@ -1175,9 +3125,33 @@ def main():
     )
     parser.add_argument(
         "--format",
-        choices=["xlsx"],
+        choices=["xlsx", "csv", "parquet", "arrow"],
         default="xlsx",
-        help="Formato de salida (xlsx por defecto)"
+        help="Formato de salida (xlsx por defecto, csv usa COPY de PostgreSQL, parquet/arrow requieren pyarrow)"
+    )
+    parser.add_argument(
+        "--paralelo",
+        action="store_true",
+        default=EXPORT_PARALLEL,
+        help="Exportar las tablas en paralelo (una conexión del pool por tabla)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=EXPORT_PARALLEL_WORKERS,
+        help=f"Cantidad máxima de tablas en paralelo (default: {EXPORT_PARALLEL_WORKERS})"
+    )
+    parser.add_argument(
+        "--libro-unico",
+        action="store_true",
+        default=EXPORT_SINGLE_WORKBOOK,
+        help="Escribir todas las tablas como hojas de un solo export.xlsx (solo xlsx)"
+    )
+    parser.add_argument(
+        "--motor-xlsx",
+        choices=MOTORES_XLSX,
+        default=EXPORT_XLSX_ENGINE,
+        help=f"Motor de escritura de xlsx: openpyxl o directo (XML sin objetos celda) (default: {EXPORT_XLSX_ENGINE})"
     )
     args = parser.parse_args()
 
@@ -1194,7 +3168,9 @@ def main():
     log_step("Se exportarán datos de análisis (excluyendo IDs, estados activos, fechas de control)")
     if incluir_sin_pk:
         log_step("Incluyendo tablas sin Primary Key (tablas vinculadas)")
-    export_selected_tables(args.tables, args.out, args.format, incluir_sin_pk=incluir_sin_pk)
+    export_selected_tables(args.tables, args.out, args.format, incluir_sin_pk=incluir_sin_pk,
+                           paralelo=args.paralelo, max_workers=args.workers,
+                           libro_unico=args.libro_unico, motor_xlsx=args.motor_xlsx)
 
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
@@ -4,8 +4,9 @@ import argparse
 import logging
 import re
 import unicodedata
+import itertools
 import traceback
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime, date
 from urllib.parse import quote_plus
 
@@ -40,7 +41,7 @@ except ImportError:
     HEADER_SYNONYMS = {}
 
 # Importar dependencias usando módulo común
-from dependencies_common import importar_sqlalchemy, importar_openpyxl
+from dependencies_common import importar_sqlalchemy, importar_openpyxl, importar_pandas
 
 # Importar SQLAlchemy
 create_engine, text, inspect, Table, sessionmaker, automap_base = importar_sqlalchemy()
@@ -55,6 +56,13 @@ from sequence_common import asegurar_autoincrementos as asegurar_autoincrementos
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Filas por lote del pipeline de importación (cada lote se valida, escribe y confirma por separado)
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+
+# Motor de conversión de valores: 'python' (plan de conversión fila a fila) o 'pandas' (columnas completas por lote)
+IMPORT_CONVERSION_ENGINE = os.getenv("IMPORT_CONVERSION_ENGINE", "python").lower()
+MOTORES_CONVERSION = ("python", "pandas")
+
 # Importar funciones comunes de base de datos
 from db_common import (
     obtener_engine as _obtener_engine_common,
@@ -63,7 +71,9 @@ from db_common import (
     obtener_nombre_tabla_seguro,
     Base,
     MODELS,
-    _TABLES_CACHE
+    _TABLES_CACHE,
+    _FOREIGN_KEYS_CACHE,
+    _PLANES_CONVERSION
 )
 
 # Importar utilidades de strings
@@ -93,102 +103,146 @@ def detect_format_from_path(ruta_archivo: str) -> Optional[str]:
         return 'csv'
     return None
 
-def read_rows_from_xlsx(ruta_archivo: str, max_rows: Optional[int] = None) -> Tuple[List[str], List[List[Any]]]:
-    """Lee las filas de un archivo Excel. Retorna (headers, rows)."""
+def dimensiones_hoja_xlsx(ws, max_filas: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Retorna (última fila, última columna) de una hoja abierta en modo read-only, como las
+    calcula openpyxl al cargar el libro completo: según las celdas presentes en el XML (mínimo 1).
+    
+    La dimensión declarada en la hoja no sirve: puede faltar o incluir filas sin celdas
+    (openpyxl la declara con las filas accedidas). Se mide con una pasada de lectura: sin
+    dimensión, iter_rows entrega () para las filas sin celdas y, para el resto, una tupla
+    hasta la última celda presente. Con max_filas solo se miden las primeras max_filas filas.
+    """
+    ws.reset_dimensions()
+    max_fila = max_columna = 1
+    filas = itertools.islice(ws.iter_rows(values_only=True), max_filas)
+    for numero_fila, fila in enumerate(filas, start=1):
+        if fila:
+            max_fila = numero_fila
+            if len(fila) > max_columna:
+                max_columna = len(fila)
+    return max_fila, max_columna
+
+def _generar_filas_xlsx(wb, filas: Iterator[tuple], avisar_sin_datos: bool) -> Iterator[List[Any]]:
+    """Entrega las filas de datos como listas y cierra el libro al terminar."""
+    hay_datos = False
+    try:
+        for fila in filas:
+            if not hay_datos and any(v is not None and str(v).strip() for v in fila):
+                hay_datos = True
+            yield list(fila)
+        if avisar_sin_datos and not hay_datos:
+            logger.warning("El archivo Excel tiene encabezados pero no tiene filas con datos")
+    except Exception as e:
+        logger.error(f"Error leyendo archivo Excel: {e}")
+        raise
+    finally:
+        wb.close()
+
+def iterar_filas_xlsx(ruta_archivo: str, max_rows: Optional[int] = None) -> Tuple[List[str], Iterator[List[Any]]]:
+    """
+    Lee un archivo Excel en modo read-only. Retorna (headers, iterador de filas).
+    
+    Las filas se leen del XML a medida que se consumen (memoria proporcional a una fila),
+    con los mismos valores y largo que read_rows_from_xlsx. El libro se cierra al agotar
+    el iterador. Con max_rows el ancho se mide solo en el encabezado y esas filas, así
+    leer los encabezados no recorre el archivo completo.
+    """
     if not OPENPYXL_AVAILABLE:
         raise RuntimeError("openpyxl no está instalado")
     
-    headers = []
-    rows = []
+    try:
+        wb = load_workbook(ruta_archivo, read_only=True, data_only=True)
+    except Exception as e:
+        logger.error(f"Error leyendo archivo Excel: {e}")
+        raise
     
     try:
-        wb = load_workbook(ruta_archivo, data_only=True)
         ws = wb.active
-        
-        # Validar que el archivo tiene contenido
-        if ws.max_row == 0 or ws.max_column == 0:
-            wb.close()
-            raise ValueError("El archivo Excel está vacío o no tiene datos")
+        max_fila, max_columna = dimensiones_hoja_xlsx(ws, 1 + max_rows if max_rows else None)
+        filas = ws.iter_rows(min_row=1, max_row=max_fila, max_col=max_columna, values_only=True)
         
         # Leer encabezados (primera fila)
-        if ws.max_row > 0:
-            for col in range(1, ws.max_column + 1):
-                celda = ws.cell(row=1, column=col)
-                valor = celda.value
-                headers.append(str(valor).strip() if valor is not None else f"Columna_{col}")
+        primera_fila = next(filas, None) or (None,) * max_columna
+        headers = [
+            str(valor).strip() if valor is not None else f"Columna_{col}"
+            for col, valor in enumerate(primera_fila, start=1)
+        ]
         
         # Validar que hay headers válidos
         headers_validos = [h for h in headers if h and h.strip() and not h.startswith("Columna_")]
         if len(headers_validos) < 3:
-            wb.close()
             raise ValueError(f"El archivo Excel no tiene suficientes encabezados válidos. Encontrados: {len(headers_validos)}, mínimo requerido: 3")
-        
-        # Leer filas de datos
-        start_row = 2
-        end_row = ws.max_row + 1
-        if max_rows:
-            end_row = min(start_row + max_rows, end_row)
-        
-        for row_num in range(start_row, end_row):
-            fila = []
-            for col in range(1, ws.max_column + 1):
-                celda = ws.cell(row=row_num, column=col)
-                fila.append(celda.value)
-            rows.append(fila)
-        
-        wb.close()
-        
-        # Validar que hay datos (solo si no es max_rows limitado)
-        if not max_rows:
-            filas_con_datos = [f for f in rows if any(v is not None and str(v).strip() for v in f)]
-            if not filas_con_datos:
-                logger.warning("El archivo Excel tiene encabezados pero no tiene filas con datos")
     except ValueError:
+        wb.close()
         raise
     except Exception as e:
+        wb.close()
         logger.error(f"Error leyendo archivo Excel: {e}")
         raise
     
-    return headers, rows
+    # Validar que hay datos (solo si no es max_rows limitado) al terminar de leer
+    return headers, _generar_filas_xlsx(wb, filas, avisar_sin_datos=not max_rows)
 
-def read_rows_from_csv(ruta_archivo: str, max_rows: Optional[int] = None) -> Tuple[List[str], List[List[Any]]]:
-    """Lee las filas de un archivo CSV. Retorna (headers, rows)."""
-    headers = []
-    rows = []
+def read_rows_from_xlsx(ruta_archivo: str, max_rows: Optional[int] = None) -> Tuple[List[str], List[List[Any]]]:
+    """Lee las filas de un archivo Excel. Retorna (headers, rows)."""
+    headers, filas = iterar_filas_xlsx(ruta_archivo, max_rows)
+    return headers, list(filas)
+
+def _generar_filas_csv(f, reader, max_rows: Optional[int]) -> Iterator[List[str]]:
+    """Entrega las filas de datos del CSV y cierra el archivo al terminar."""
+    hay_datos = False
+    try:
+        for i, fila in enumerate(reader):
+            if max_rows and i >= max_rows:
+                break
+            if not hay_datos and any(v is not None and str(v).strip() for v in fila):
+                hay_datos = True
+            yield fila
+        if not hay_datos:
+            logger.warning("El archivo CSV tiene encabezados pero no tiene filas con datos")
+    except Exception as e:
+        logger.error(f"Error leyendo archivo CSV: {e}")
+        raise
+    finally:
+        f.close()
+
+def iterar_filas_csv(ruta_archivo: str, max_rows: Optional[int] = None) -> Tuple[List[str], Iterator[List[str]]]:
+    """Lee un archivo CSV. Retorna (headers, iterador de filas); el archivo se cierra al agotarlo."""
+    try:
+        f = open(ruta_archivo, 'r', encoding='utf-8-sig')
+    except Exception as e:
+        logger.error(f"Error leyendo archivo CSV: {e}")
+        raise
     
     try:
-        with open(ruta_archivo, 'r', encoding='utf-8-sig') as f:
-            reader = csv.reader(f)
-            
-            # Leer encabezados (primera fila)
-            try:
-                headers = next(reader)
-                headers = [h.strip() if h else f"Columna_{i+1}" for i, h in enumerate(headers)]
-            except StopIteration:
-                raise ValueError("El archivo CSV está vacío")
-            
-            # Validar que hay headers válidos
-            headers_validos = [h for h in headers if h and h.strip() and not h.startswith("Columna_")]
-            if len(headers_validos) < 3:
-                raise ValueError(f"El archivo CSV no tiene suficientes encabezados válidos. Encontrados: {len(headers_validos)}, mínimo requerido: 3")
-            
-            # Leer filas de datos
-            for i, fila in enumerate(reader):
-                if max_rows and i >= max_rows:
-                    break
-                rows.append(fila)
-            
-            # Validar que hay datos
-            filas_con_datos = [f for f in rows if any(v is not None and str(v).strip() for v in f)]
-            if not filas_con_datos:
-                logger.warning("El archivo CSV tiene encabezados pero no tiene filas con datos")
+        reader = csv.reader(f)
+        
+        # Leer encabezados (primera fila)
+        try:
+            headers = next(reader)
+            headers = [h.strip() if h else f"Columna_{i+1}" for i, h in enumerate(headers)]
+        except StopIteration:
+            raise ValueError("El archivo CSV está vacío")
+        
+        # Validar que hay headers válidos
+        headers_validos = [h for h in headers if h and h.strip() and not h.startswith("Columna_")]
+        if len(headers_validos) < 3:
+            raise ValueError(f"El archivo CSV no tiene suficientes encabezados válidos. Encontrados: {len(headers_validos)}, mínimo requerido: 3")
     except ValueError:
+        f.close()
         raise
     except Exception as e:
+        f.close()
         logger.error(f"Error leyendo archivo CSV: {e}")
         raise
     
-    return headers, rows
+    return headers, _generar_filas_csv(f, reader, max_rows)
+
+def read_rows_from_csv(ruta_archivo: str, max_rows: Optional[int] = None) -> Tuple[List[str], List[List[Any]]]:
+    """Lee las filas de un archivo CSV. Retorna (headers, rows)."""
+    headers, filas = iterar_filas_csv(ruta_archivo, max_rows)
+    return headers, list(filas)
 
 # normalize_header_names ahora se importa de string_utils
 
@@ -369,6 +423,163 @@ def asegurar_autoincrementos(engine, tablas_especificas: Optional[List[str]] = N
 # ================================
 # MÓDULO: IMPORTACIÓN DE ARCHIVOS
 # ================================
+# Foreign keys de una tabla: (columna, tabla referenciada, columna referenciada)
+SQL_FOREIGN_KEYS = """
+    SELECT
+        kcu.column_name AS fk_column,
+        ccu.table_name AS referenced_table,
+        ccu.column_name AS referenced_column
+    FROM information_schema.table_constraints AS tc
+    JOIN information_schema.key_column_usage AS kcu
+        ON tc.constraint_name = kcu.constraint_name
+        AND tc.table_schema = kcu.table_schema
+    JOIN information_schema.constraint_column_usage AS ccu
+        ON ccu.constraint_name = tc.constraint_name
+        AND ccu.table_schema = tc.table_schema
+    WHERE tc.constraint_type = 'FOREIGN KEY'
+        AND tc.table_name = :tabla
+        AND tc.table_schema = 'public'
+"""
+
+
+def obtener_foreign_keys(session, tabla_nombre: str) -> List[Tuple[str, str, str]]:
+    """
+    Retorna las foreign keys de la tabla como (columna, tabla_referenciada, columna_referenciada).
+    Se consultan una vez por tabla y quedan en caché (se limpia con reset_automap).
+    """
+    if tabla_nombre not in _FOREIGN_KEYS_CACHE:
+        result = session.execute(text(SQL_FOREIGN_KEYS), {"tabla": tabla_nombre})
+        _FOREIGN_KEYS_CACHE[tabla_nombre] = [tuple(fila) for fila in result.fetchall()]
+    return _FOREIGN_KEYS_CACHE[tabla_nombre]
+
+
+def consulta_existencia_fk(ref_table: str, ref_col: str) -> str:
+    """Consulta que cuenta las filas de la tabla referenciada con el valor de la FK (`:valor`)."""
+    return f"""
+                        SELECT COUNT(*) 
+                        FROM public.{ref_table} 
+                        WHERE {ref_col} = :valor
+                    """
+
+
+def consulta_existencia_fk_lote(ref_table: str, ref_col: str) -> str:
+    """Consulta que retorna cuáles de los valores de la FK (`:valores`, un array) existen en la tabla referenciada."""
+    return f"SELECT DISTINCT {ref_col} FROM public.{ref_table} WHERE {ref_col} = ANY(:valores)"
+
+
+def _valores_existentes_fk(session, ref_table: str, ref_col: str, valores: List[Any]) -> set:
+    """
+    Retorna las claves (tipo, valor) de los `valores` que existen en ref_table.ref_col.
+    
+    Se consulta con un solo array por tipo de Python (el array de psycopg2 debe ser homogéneo).
+    Los valores que la consulta no encuentra, o todos los del grupo si la consulta falla
+    (p. ej. un texto que no convierte al tipo de la columna), se verifican uno a uno con
+    consulta_existencia_fk, así el veredicto por valor es el mismo que el de la validación por fila.
+    Las consultas corren dentro de un savepoint para no abortar la transacción si fallan.
+    """
+    grupos: Dict[type, List[Any]] = {}
+    for valor in valores:
+        grupos.setdefault(type(valor), []).append(valor)
+    
+    existentes = set()
+    for grupo in grupos.values():
+        encontrados = set()
+        try:
+            session.execute(text("SAVEPOINT sp_validar_fk"))
+            try:
+                result = session.execute(text(consulta_existencia_fk_lote(ref_table, ref_col)), {"valores": grupo})
+                encontrados = {fila[0] for fila in result.fetchall()}
+                session.execute(text("RELEASE SAVEPOINT sp_validar_fk"))
+            except Exception as e:
+                session.execute(text("ROLLBACK TO SAVEPOINT sp_validar_fk"))
+                logger.debug(f"Validación FK por lote {ref_table}.{ref_col} falló, se valida por valor: {e}")
+        except Exception as e:
+            logger.warning(f"Error validando FK por lote {ref_table}.{ref_col}: {e}")
+        
+        for valor in grupo:
+            if valor in encontrados or _existe_valor_fk(session, ref_table, ref_col, valor):
+                existentes.add((type(valor), valor))
+    return existentes
+
+
+def _existe_valor_fk(session, ref_table: str, ref_col: str, valor: Any) -> bool:
+    """Verifica un valor de FK con consulta_existencia_fk. Si la consulta falla se considera existente."""
+    try:
+        session.execute(text("SAVEPOINT sp_validar_fk"))
+        try:
+            count = session.execute(text(consulta_existencia_fk(ref_table, ref_col)), {"valor": valor}).scalar()
+            session.execute(text("RELEASE SAVEPOINT sp_validar_fk"))
+        except Exception:
+            session.execute(text("ROLLBACK TO SAVEPOINT sp_validar_fk"))
+            raise
+        return count != 0
+    except Exception as e:
+        logger.warning(f"Error validando FK -> {ref_table}.{ref_col}: {e}")
+        # No agregar error si la validación misma falla (puede ser problema de permisos)
+        return True
+
+
+def validar_foreign_keys_lote(session, tabla_nombre: str, filas: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Valida las foreign keys de un lote de filas con una consulta por FK (`= ANY(:valores)`)
+    en lugar de una por FK y por fila.
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        tabla_nombre: Nombre de la tabla
+        filas: Datos de cada fila del lote
+    
+    Returns:
+        List[List[Dict[str, Any]]]: Errores de cada fila, en el orden de `filas` y con
+        el mismo formato que validar_foreign_keys.
+    """
+    errores = [[] for _ in filas]
+    if not filas:
+        return errores
+    
+    try:
+        fk_constraints = obtener_foreign_keys(session, tabla_nombre)
+    except Exception as e:
+        logger.warning(f"Error obteniendo constraints de foreign key para tabla {tabla_nombre}: {e}")
+        # Si no se pueden obtener los constraints, no validar (no fallar completamente)
+        return errores
+    
+    # Claves de cada fila en minúsculas (la primera que coincide, como en validar_foreign_keys)
+    claves_filas = []
+    for datos in filas:
+        claves = {}
+        for key in datos:
+            claves.setdefault(key.lower(), key)
+        claves_filas.append(claves)
+    
+    for fk_col, ref_table, ref_col in fk_constraints:
+        fk_col_lower = fk_col.lower()
+        valores_filas = []
+        distintos = {}
+        for datos, claves in zip(filas, claves_filas):
+            key = claves.get(fk_col_lower)
+            valor_fk = datos[key] if key is not None else None
+            valores_filas.append(valor_fk)
+            if valor_fk is not None:
+                # Distintos por (tipo, valor): 1, 1.0 y True no deben agruparse
+                distintos.setdefault((type(valor_fk), valor_fk), valor_fk)
+        if not distintos:
+            continue
+        
+        existentes = _valores_existentes_fk(session, ref_table, ref_col, list(distintos.values()))
+        for i, valor_fk in enumerate(valores_filas):
+            if valor_fk is not None and (type(valor_fk), valor_fk) not in existentes:
+                errores[i].append({
+                    'columna': fk_col,
+                    'valor': valor_fk,
+                    'tabla_referenciada': ref_table,
+                    'columna_referenciada': ref_col,
+                    'mensaje': f"Foreign key '{fk_col}' con valor '{valor_fk}' no existe en tabla '{ref_table}.{ref_col}'"
+                })
+    
+    return errores
+
+
 def validar_foreign_keys(session, tabla_nombre: str, datos: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Valida que los valores de foreign keys existen en las tablas referenciadas.
@@ -388,28 +599,8 @@ def validar_foreign_keys(session, tabla_nombre: str, datos: Dict[str, Any]) -> L
     errores = []
     
     try:
-        from sqlalchemy import text, MetaData, inspect
-        
         # Obtener constraints de foreign key de la tabla
-        query_fk = text("""
-            SELECT
-                kcu.column_name AS fk_column,
-                ccu.table_name AS referenced_table,
-                ccu.column_name AS referenced_column
-            FROM information_schema.table_constraints AS tc
-            JOIN information_schema.key_column_usage AS kcu
-                ON tc.constraint_name = kcu.constraint_name
-                AND tc.table_schema = kcu.table_schema
-            JOIN information_schema.constraint_column_usage AS ccu
-                ON ccu.constraint_name = tc.constraint_name
-                AND ccu.table_schema = tc.table_schema
-            WHERE tc.constraint_type = 'FOREIGN KEY'
-                AND tc.table_name = :tabla
-                AND tc.table_schema = 'public'
-        """)
-        
-        result = session.execute(query_fk, {"tabla": tabla_nombre})
-        fk_constraints = result.fetchall()
+        fk_constraints = obtener_foreign_keys(session, tabla_nombre)
         
         # Validar cada foreign key
         for fk_col, ref_table, ref_col in fk_constraints:
@@ -427,11 +618,7 @@ def validar_foreign_keys(session, tabla_nombre: str, datos: Dict[str, Any]) -> L
             if valor_fk is not None:
                 try:
                     # Verificar que el valor existe en la tabla referenciada
-                    check_query = text(f"""
-                        SELECT COUNT(*) 
-                        FROM public.{ref_table} 
-                        WHERE {ref_col} = :valor
-                    """)
+                    check_query = text(consulta_existencia_fk(ref_table, ref_col))
                     count_result = session.execute(check_query, {"valor": valor_fk})
                     count = count_result.scalar()
                     
@@ -626,10 +813,668 @@ def convertir_valor_segun_tipo(valor: Any, tipo_columna) -> Any:
         logger.warning(f"Error convirtiendo valor '{valor}' a tipo {tipo_python}: {e}")
         return valor
 
-def import_one_file(session, model, ruta_archivo: str, formato: str, upsert: bool = False, keep_ids: bool = False) -> Tuple[int, int, Dict[str, Any]]:
+# ================================
+# MÓDULO: PLAN DE CONVERSIÓN
+# ================================
+# Mismos formatos y en el mismo orden de preferencia que convertir_valor_segun_tipo
+FORMATOS_FECHA = (
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%m/%d/%Y',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f'
+)
+VALORES_BOOLEANOS_VERDADEROS = frozenset(('true', '1', 'yes', 'si', 'sí', 't', 'y', 'verdadero', 'v'))
+VALORES_BOOLEANOS_FALSOS = frozenset(('false', '0', 'no', 'n', 'f', 'falso'))
+
+
+def _orden_formatos_fecha(ganador: str) -> Tuple[str, ...]:
+    """
+    Orden de prueba de FORMATOS_FECHA una vez que `ganador` parseó un valor de la columna.
+    
+    Un texto solo puede coincidir con dos formatos si tienen los mismos separadores
+    (p. ej. '%d/%m/%Y' y '%m/%d/%Y'), así que esos conservan su precedencia original
+    delante del ganador y el resultado es siempre el mismo que probando en orden.
+    """
+    esqueleto = re.sub(r'%.', '', ganador)
+    primeros = [
+        fmt for fmt in FORMATOS_FECHA[:FORMATOS_FECHA.index(ganador)]
+        if re.sub(r'%.', '', fmt) == esqueleto
+    ] + [ganador]
+    return tuple(primeros) + tuple(fmt for fmt in FORMATOS_FECHA if fmt not in primeros)
+
+
+ORDEN_FORMATOS_FECHA = {fmt: _orden_formatos_fecha(fmt) for fmt in FORMATOS_FECHA}
+
+# Paso del plan de conversión por header: (índice en la fila, columna, convertidor, es booleana, clase, tipo Python)
+PlanConversion = Tuple[Tuple[int, str, Optional[Callable[[Any], Any]], bool, str, Optional[type]], ...]
+
+
+def _convertidor_booleano(tipo_python: type) -> Callable[[Any], Any]:
+    def convertir(valor):
+        if valor is None:
+            return None
+        if isinstance(valor, tipo_python):
+            return valor
+        if isinstance(valor, bool):
+            return valor
+        if isinstance(valor, str):
+            valor_str = valor.lower().strip()
+            if valor_str in VALORES_BOOLEANOS_VERDADEROS:
+                return True
+            if valor_str in VALORES_BOOLEANOS_FALSOS:
+                return False
+            # Si no se puede convertir, retornar False por defecto
+            logger.warning(f"No se pudo convertir '{valor}' a booleano, usando False")
+            return False
+        if isinstance(valor, (int, float)):
+            return bool(valor)
+        return False
+    return convertir
+
+
+def _convertidor_numerico(tipo_python: type, nombre_tipo: str) -> Callable[[Any], Any]:
+    """Enteros (int(float(texto)) para aceptar "1.0") y flotantes."""
+    desde_texto = (lambda texto: int(float(texto))) if tipo_python == int else float
+    
+    def convertir(valor):
+        if valor is None:
+            return None
+        if isinstance(valor, tipo_python):
+            return valor
+        try:
+            if isinstance(valor, str):
+                try:
+                    valor_limpio = valor.strip()
+                    if valor_limpio:
+                        return desde_texto(valor_limpio)
+                except (ValueError, TypeError):
+                    logger.warning(f"No se pudo convertir '{valor}' a {nombre_tipo}")
+                    return None
+            return tipo_python(valor)
+        except Exception as e:
+            logger.warning(f"Error convirtiendo valor '{valor}' a tipo {tipo_python}: {e}")
+            return valor
+    return convertir
+
+
+def _convertidor_texto(tipo_python: type) -> Callable[[Any], Any]:
+    def convertir(valor):
+        if valor is None or isinstance(valor, tipo_python):
+            return valor
+        try:
+            return str(valor)
+        except Exception as e:
+            logger.warning(f"Error convirtiendo valor '{valor}' a tipo {tipo_python}: {e}")
+            return valor
+    return convertir
+
+
+def _convertidor_fecha(tipo_python: type) -> Callable[[Any], Any]:
+    """Fechas y timestamps; recuerda el último formato que funcionó en la columna."""
+    orden = [FORMATOS_FECHA]
+    
+    def convertir(valor):
+        if valor is None or isinstance(valor, tipo_python) or not isinstance(valor, str):
+            return valor
+        texto = valor.strip()
+        for fmt in orden[0]:
+            try:
+                resultado = datetime.strptime(texto, fmt)
+            except ValueError:
+                continue
+            orden[0] = ORDEN_FORMATOS_FECHA[fmt]
+            return resultado
+        logger.warning(f"No se pudo parsear fecha '{valor}'")
+        return None
+    return convertir
+
+
+def _sin_conversion(valor: Any) -> Any:
+    return valor
+
+
+def clasificar_tipo_conversion(tipo_columna) -> Tuple[str, Optional[type]]:
+    """
+    Clase de conversión de un tipo de columna, en el orden en que la resuelve
+    convertir_valor_segun_tipo: 'booleano', 'entero', 'flotante', 'texto', 'fecha',
+    'ninguna' (el valor queda igual) o 'generica' (sin tipo Python). Retorna (clase, tipo Python).
+    """
+    try:
+        tipo_python = tipo_columna.python_type
+    except Exception:
+        return 'generica', None
+    
+    from sqlalchemy import Boolean
+    if tipo_python == bool or isinstance(tipo_columna, Boolean) or 'bool' in tipo_columna.__class__.__name__.lower():
+        return 'booleano', tipo_python
+    if tipo_python == int:
+        return 'entero', tipo_python
+    if tipo_python == float:
+        return 'flotante', tipo_python
+    if tipo_python == str:
+        return 'texto', tipo_python
+    if hasattr(tipo_python, '__name__') and 'date' in tipo_python.__name__.lower():
+        return 'fecha', tipo_python
+    return 'ninguna', tipo_python
+
+
+def crear_convertidor(tipo_columna) -> Callable[[Any], Any]:
+    """
+    Retorna una función valor -> valor convertido equivalente a
+    convertir_valor_segun_tipo(valor, tipo_columna), con la inspección del tipo ya resuelta.
+    """
+    clase, tipo_python = clasificar_tipo_conversion(tipo_columna)
+    if clase == 'generica':
+        # Tipos sin tipo Python: se delega en la conversión genérica
+        return lambda valor: convertir_valor_segun_tipo(valor, tipo_columna)
+    if clase == 'booleano':
+        return _convertidor_booleano(tipo_python)
+    if clase == 'entero':
+        return _convertidor_numerico(tipo_python, "entero")
+    if clase == 'flotante':
+        return _convertidor_numerico(tipo_python, "flotante")
+    if clase == 'texto':
+        return _convertidor_texto(tipo_python)
+    if clase == 'fecha':
+        return _convertidor_fecha(tipo_python)
+    return _sin_conversion
+
+
+def compilar_plan_conversion(
+    headers: List[str],
+    mapeo_columnas: Dict[str, str],
+    tipos_columnas: Dict[str, Any]
+) -> PlanConversion:
+    """
+    Plan de conversión de las filas de un archivo. Por cada header mapeado: (índice en la fila,
+    columna del modelo, convertidor o None si la columna no tiene tipo, si es booleana,
+    clase de conversión y tipo Python, ver clasificar_tipo_conversion).
+    """
+    plan = []
+    for i, header in enumerate(headers):
+        if header not in mapeo_columnas:
+            continue
+        columna = mapeo_columnas[header]
+        tipo_columna = tipos_columnas.get(columna)
+        if not tipo_columna:
+            plan.append((i, columna, None, False, 'ninguna', None))
+            continue
+        try:
+            es_booleano = tipo_columna.python_type == bool
+        except Exception:
+            es_booleano = False
+        clase, tipo_python = clasificar_tipo_conversion(tipo_columna)
+        plan.append((i, columna, crear_convertidor(tipo_columna), es_booleano, clase, tipo_python))
+    return tuple(plan)
+
+
+# Planes de conversión por (modelo, headers del archivo) en _PLANES_CONVERSION (db_common,
+# se vacía con reset_automap); como máximo esta cantidad, se descartan los más antiguos
+MAX_PLANES_CONVERSION = 256
+
+
+def obtener_plan_conversion(
+    model,
+    headers: List[str],
+    mapeo_columnas: Dict[str, str],
+    tipos_columnas: Dict[str, Any]
+) -> PlanConversion:
+    """Plan de conversión compilado una vez por modelo y lista de headers."""
+    clave = (model, tuple(headers))
+    plan = _PLANES_CONVERSION.get(clave)
+    if plan is None:
+        while len(_PLANES_CONVERSION) >= MAX_PLANES_CONVERSION:
+            _PLANES_CONVERSION.pop(next(iter(_PLANES_CONVERSION)), None)
+        plan = _PLANES_CONVERSION[clave] = compilar_plan_conversion(headers, mapeo_columnas, tipos_columnas)
+    return plan
+
+
+def _datos_sanitizados(datos: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia de los datos de una fila para logs, sin valores de columnas de contraseñas."""
+    return {k: ('***' if 'password' in k.lower() or 'pass' in k.lower() else v) for k, v in datos.items()}
+
+
+def mapear_filas_importacion(
+    rows: Iterable[List[Any]],
+    plan: PlanConversion,
+    errores_detalle: Dict[str, int]
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Etapa de mapeo y conversión del pipeline de importación.
+    Aplica el plan de conversión y entrega (número de fila, datos por columna del modelo)
+    a medida que se leen las filas.
+    """
+    depurar = logger.isEnabledFor(logging.DEBUG)
+    numero_fila = 0
+    for fila in rows:
+        try:
+            largo = len(fila)
+            datos = {}
+            for i, columna, convertir, es_booleano, _, _ in plan:
+                if i >= largo:
+                    break
+                valor = fila[i]
+                if convertir is None:
+                    datos[columna] = valor
+                    continue
+                try:
+                    valor_convertido = convertir(valor)
+                    # Log de depuración para booleanos
+                    if depurar and es_booleano:
+                        logger.debug(f"Columna '{columna}': '{valor}' ({type(valor).__name__}) -> {valor_convertido} ({type(valor_convertido).__name__})")
+                except Exception as e:
+                    logger.warning(f"Error convirtiendo valor '{valor}' para columna '{columna}': {e}")
+                    valor_convertido = valor
+                datos[columna] = valor_convertido
+        except Exception as e:
+            logger.warning(f"Error procesando fila: {e}")
+            errores_detalle['errores_otros'] += 1
+            continue
+        
+        if datos:
+            numero_fila += 1
+            yield numero_fila, datos
+
+
+# ================================
+# MÓDULO: CONVERSIÓN VECTORIZADA (PANDAS)
+# ================================
+# Forma canónica de cada formato de fecha (dígitos ASCII con ceros a la izquierda). Fuera de
+# esta forma pandas acepta textos que strptime rechaza (p. ej. '%f' vacío o con nanosegundos)
+PATRONES_FORMATOS_FECHA = {
+    fmt: re.compile(patron) for fmt, patron in (
+        ('%Y-%m-%d', r'[0-9]{4}-[0-9]{2}-[0-9]{2}'),
+        ('%d/%m/%Y', r'[0-9]{2}/[0-9]{2}/[0-9]{4}'),
+        ('%m/%d/%Y', r'[0-9]{2}/[0-9]{2}/[0-9]{4}'),
+        ('%Y-%m-%d %H:%M:%S', r'[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}'),
+        ('%Y-%m-%d %H:%M:%S.%f', r'[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{1,6}'),
+    )
+}
+
+# Marca de celda inexistente (fila más corta que los headers)
+_AUSENTE = object()
+
+_PANDAS = None
+
+
+def _obtener_pandas():
+    """(pandas, numpy), importados la primera vez que se usa el motor."""
+    global _PANDAS
+    if _PANDAS is None:
+        _PANDAS = importar_pandas()
+    return _PANDAS
+
+
+def _mascara(np, funcion, valores):
+    """Máscara booleana con bool(funcion(valor)) de cada valor."""
+    return np.fromiter(map(bool, map(funcion, valores)), dtype=bool, count=len(valores))
+
+
+def _convertir_columna_booleana(valores, tipos, resultado, pendientes, pd, np):
+    posiciones = np.flatnonzero(tipos == str)
+    textos = [texto.lower().strip() for texto in valores[posiciones]]
+    for conjunto, valor in ((VALORES_BOOLEANOS_VERDADEROS, True), (VALORES_BOOLEANOS_FALSOS, False)):
+        encontrados = posiciones[_mascara(np, conjunto.__contains__, textos)]
+        resultado[encontrados] = valor
+        pendientes[encontrados] = False
+    # bool(valor) de enteros y flotantes (NaN es verdadero, como en bool())
+    numeros = (tipos == int) | (tipos == float)
+    resultado[numeros] = [valor != 0 for valor in valores[numeros]]
+    pendientes[numeros] = False
+
+
+def _convertir_columna_numerica(valores, tipos, resultado, pendientes, entero: bool, pd, np):
+    posiciones = np.flatnonzero(tipos == str)
+    # pd.to_numeric solo indica qué textos son números: su redondeo no siempre coincide con float().
+    # Los valores se convierten con astype de numpy, que aplica float() (que ignora los espacios
+    # como strip()) a cada objeto. Si algún texto aceptado no convierte, el bloque queda pendiente.
+    aceptados = pd.to_numeric(pd.Series(valores[posiciones], dtype=object), errors='coerce').notna().to_numpy()
+    posiciones = posiciones[aceptados]
+    try:
+        numeros = valores[posiciones].astype(np.float64)
+    except (ValueError, TypeError, OverflowError):
+        posiciones = posiciones[:0]
+        numeros = np.empty(0, dtype=np.float64)
+    if entero:
+        # int(float(texto)) e int(flotante); si no entra en int64 (o es inf/NaN) queda pendiente
+        otros = np.flatnonzero(tipos == float)
+    else:
+        # float(texto) y float(entero) si el entero es exacto en float64
+        otros = np.flatnonzero((tipos == int) | (tipos == bool))
+        otros = otros[[-2 ** 53 <= valor <= 2 ** 53 for valor in valores[otros]]]
+    posiciones = np.concatenate([posiciones, otros])
+    numeros = np.concatenate([numeros, valores[otros].astype(np.float64)])
+    if entero:
+        validos = np.isfinite(numeros) & (np.abs(numeros) < 2.0 ** 63)
+        posiciones = posiciones[validos]
+        convertidos = np.trunc(numeros[validos]).astype(np.int64).tolist()
+    else:
+        convertidos = numeros.tolist()
+    resultado[posiciones] = convertidos
+    pendientes[posiciones] = False
+
+
+def _convertir_columna_fecha(valores, tipos, resultado, pendientes, pd, np):
+    # Lo que no es texto queda igual
+    pendientes[tipos != str] = False
+    posiciones = np.flatnonzero(tipos == str)
+    textos = np.fromiter(map(str.strip, valores[posiciones]), dtype=object, count=len(posiciones))
+    for fmt in FORMATOS_FECHA:
+        forma = _mascara(np, PATRONES_FORMATOS_FECHA[fmt].fullmatch, textos)
+        if not forma.any():
+            continue
+        candidatos = textos[forma]
+        fechas = pd.to_datetime(pd.Series(candidatos, dtype=object), format=fmt, errors='coerce')
+        parseadas = fechas.notna().to_numpy()
+        ubicacion = posiciones[forma]
+        resultado[ubicacion[parseadas]] = list(fechas[parseadas].dt.to_pydatetime())
+        pendientes[ubicacion[parseadas]] = False
+        # Lo que pandas no parseó se confirma con strptime antes de probar los formatos siguientes
+        for posicion, texto in zip(ubicacion[~parseadas], candidatos[~parseadas]):
+            try:
+                resultado[posicion] = datetime.strptime(texto, fmt)
+                pendientes[posicion] = False
+            except ValueError:
+                continue
+        restantes = pendientes[posiciones]
+        posiciones = posiciones[restantes]
+        textos = textos[restantes]
+
+
+def convertir_columna_pandas(valores: List[Any], clase: str, tipo_python: Optional[type], convertir: Callable[[Any], Any]) -> List[Any]:
+    """
+    Convierte una columna completa con operaciones de pandas/numpy. El resultado es idéntico
+    a aplicar `convertir` (el convertidor del plan) a cada valor: las celdas que no tienen una
+    forma que se pueda convertir igual en bloque (textos inválidos, números fuera de rango,
+    tipos inesperados) quedan en la máscara de pendientes y se convierten con `convertir`,
+    que emite las mismas advertencias que convertir_valor_segun_tipo.
+    """
+    if clase == 'ninguna':
+        return valores
+    if clase == 'generica' or (clase == 'booleano' and tipo_python is not bool):
+        return [convertir(valor) for valor in valores]
+    
+    pd, np = _obtener_pandas()
+    arreglo = np.empty(len(valores), dtype=object)
+    arreglo[:] = valores
+    tipos = np.fromiter(map(type, valores), dtype=object, count=len(valores))
+    resultado = arreglo.copy()
+    # None y los valores que ya son del tipo de la columna quedan igual
+    sin_cambio = tipos == type(None)
+    if clase == 'entero':
+        sin_cambio |= (tipos == int) | (tipos == bool)
+    else:
+        sin_cambio |= tipos == tipo_python
+    pendientes = ~sin_cambio
+    
+    if clase == 'booleano':
+        _convertir_columna_booleana(arreglo, tipos, resultado, pendientes, pd, np)
+    elif clase in ('entero', 'flotante'):
+        _convertir_columna_numerica(arreglo, tipos, resultado, pendientes, clase == 'entero', pd, np)
+    elif clase == 'fecha':
+        _convertir_columna_fecha(arreglo, tipos, resultado, pendientes, pd, np)
+    
+    for posicion in np.flatnonzero(pendientes):
+        resultado[posicion] = convertir(valores[posicion])
+    return resultado.tolist()
+
+
+def mapear_filas_importacion_pandas(
+    rows: Iterable[List[Any]],
+    plan: PlanConversion,
+    errores_detalle: Dict[str, int]
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Etapa de mapeo y conversión con el motor 'pandas': toma lotes de IMPORT_CHUNK_SIZE filas,
+    convierte cada columna del plan en bloque y entrega (número de fila, datos) igual que
+    mapear_filas_importacion.
+    """
+    depurar = logger.isEnabledFor(logging.DEBUG)
+    rows = iter(rows)
+    nombres = [paso[1] for paso in plan]
+    indice_maximo = max((paso[0] for paso in plan), default=-1)
+    numero_fila = 0
+    while True:
+        lote = list(itertools.islice(rows, IMPORT_CHUNK_SIZE))
+        if not lote:
+            break
+        completo = all(len(fila) > indice_maximo for fila in lote)
+        columnas = []
+        for i, columna, convertir, es_booleano, clase, tipo_python in plan:
+            valores = [fila[i] if len(fila) > i else _AUSENTE for fila in lote]
+            presentes = valores if completo else [valor for valor in valores if valor is not _AUSENTE]
+            if convertir is None:
+                convertidos = presentes
+            else:
+                convertidos = convertir_columna_pandas(presentes, clase, tipo_python, convertir)
+                if depurar and es_booleano:
+                    for valor, valor_convertido in zip(presentes, convertidos):
+                        logger.debug(f"Columna '{columna}': '{valor}' ({type(valor).__name__}) -> {valor_convertido} ({type(valor_convertido).__name__})")
+            if not completo:
+                restantes = iter(convertidos)
+                convertidos = [valor if valor is _AUSENTE else next(restantes) for valor in valores]
+            columnas.append(convertidos)
+        
+        for valores_fila in zip(*columnas) if columnas else ([] for _ in lote):
+            if completo:
+                datos = dict(zip(nombres, valores_fila))
+            else:
+                datos = {nombre: valor for nombre, valor in zip(nombres, valores_fila) if valor is not _AUSENTE}
+            if datos:
+                numero_fila += 1
+                yield numero_fila, datos
+
+
+def validar_lote_importacion(
+    session,
+    tabla_nombre: str,
+    table,
+    lote: List[Tuple[int, Dict[str, Any]]],
+    errores_detalle: Dict[str, int]
+) -> List[Dict[str, Any]]:
+    """
+    Etapa de validación: descarta las filas del lote con errores de FK o NOT NULL
+    (reportándolos) y retorna los datos de las filas válidas.
+    """
+    filas_validas = []
+    errores_fk_lote = validar_foreign_keys_lote(session, tabla_nombre, [datos for _, datos in lote])
+    for (fila_idx, datos), errores_fk in zip(lote, errores_fk_lote):
+        errores_nn = validar_not_null(session, tabla_nombre, datos, table)
+        
+        if errores_fk or errores_nn:
+            # Reportar errores y no incluir esta fila
+            for error in errores_fk:
+                logger.warning(f"Fila {fila_idx} - Validación FK fallida: {error['mensaje']}")
+                errores_detalle['errores_foreign_key'] += 1
+            for error in errores_nn:
+                logger.warning(f"Fila {fila_idx} - Validación NOT NULL fallida: {error['mensaje']}")
+                errores_detalle['errores_not_null'] += 1
+            # Log datos de la fila para diagnóstico
+            logger.debug(f"Fila {fila_idx} - Datos con error de validación: {_datos_sanitizados(datos)}")
+            continue
+        
+        filas_validas.append(datos)
+    return filas_validas
+
+
+def insertar_lote_importacion(session, table, filas_validas: List[Dict[str, Any]], errores_detalle: Dict[str, int]) -> int:
+    """
+    Etapa de escritura (modo insert): inserta las filas válidas del lote en una sola sentencia.
+    Si falla, descarta el lote (rollback) y cuenta sus filas como errores. Retorna las filas insertadas.
+    """
+    from sqlalchemy import insert
+    
+    if not filas_validas:
+        return 0
+    
+    # Filtrar None de las claves primarias para evitar SAWarning
+    # Si la PK tiene autoincrement en la BD, no necesita valor explícito
+    pk_autogeneradas = [
+        pk_col.name for pk_col in table.primary_key.columns
+        if pk_col.autoincrement or pk_col.server_default is not None
+    ]
+    batch_clean = []
+    for row in filas_validas:
+        row_clean = row.copy()
+        for pk_col in pk_autogeneradas:
+            if pk_col in row_clean and row_clean[pk_col] is None:
+                # La BD generará el valor automáticamente
+                del row_clean[pk_col]
+        batch_clean.append(row_clean)
+    
+    try:
+        session.execute(insert(table).values(batch_clean))
+        return len(batch_clean)
+    except Exception as batch_error:
+        error_msg = str(batch_error).lower()
+        if 'foreign key' in error_msg or 'violates foreign key' in error_msg:
+            errores_detalle['errores_foreign_key'] += len(batch_clean)
+        elif 'not null' in error_msg or 'null value' in error_msg:
+            errores_detalle['errores_not_null'] += len(batch_clean)
+        elif 'invalid input' in error_msg or 'type' in error_msg:
+            errores_detalle['errores_tipo_dato'] += len(batch_clean)
+        else:
+            errores_detalle['errores_otros'] += len(batch_clean)
+        logger.warning(f"Error insertando batch: {batch_error}")
+        # Los lotes anteriores ya están confirmados: solo se descarta este
+        session.rollback()
+        return 0
+
+
+def upsert_lote_importacion(
+    session,
+    tabla_nombre: str,
+    table,
+    lote: List[Tuple[int, Dict[str, Any]]],
+    errores_detalle: Dict[str, int]
+) -> Tuple[int, int]:
+    """
+    Etapa de validación y escritura (modo upsert): procesa las filas del lote una a una,
+    con un savepoint por fila para aislar errores sin abortar la transacción.
+    Retorna (insertados, actualizados).
+    """
+    from sqlalchemy import insert, select, update
+    
+    inserted = 0
+    updated = 0
+    commit_interval = 100  # Commit cada 100 filas
+    
+    # Validación de FK de todo el lote de una vez; las filas con errores se revalidan
+    # al procesarlas, porque pueden referenciar filas que se insertan antes en el mismo lote
+    errores_fk_lote = validar_foreign_keys_lote(session, tabla_nombre, [datos for _, datos in lote])
+    
+    for (fila_idx, datos), errores_fk in zip(lote, errores_fk_lote):
+        savepoint_name = f"sp_fila_{fila_idx}"
+        try:
+            # Validar foreign keys y NOT NULL antes de procesar
+            if errores_fk:
+                errores_fk = validar_foreign_keys(session, tabla_nombre, datos)
+            errores_nn = validar_not_null(session, tabla_nombre, datos, table)
+            
+            # Si hay errores de validación, reportarlos y saltar esta fila
+            if errores_fk or errores_nn:
+                for error in errores_fk:
+                    logger.warning(f"Fila {fila_idx} - Validación FK fallida: {error['mensaje']}")
+                    errores_detalle['errores_foreign_key'] += 1
+                for error in errores_nn:
+                    logger.warning(f"Fila {fila_idx} - Validación NOT NULL fallida: {error['mensaje']}")
+                    errores_detalle['errores_not_null'] += 1
+                # Log datos de la fila para diagnóstico
+                logger.debug(f"Fila {fila_idx} - Datos con error de validación: {_datos_sanitizados(datos)}")
+                # No procesar esta fila si tiene errores de validación
+                continue
+            
+            # Crear savepoint antes de procesar cada fila
+            # Esto permite hacer rollback solo de esta fila si hay error
+            session.execute(text(f"SAVEPOINT {savepoint_name}"))
+            
+            # Buscar clave primaria
+            pk_column = None
+            for col in table.primary_key.columns:
+                if col.name in datos:
+                    pk_column = col.name
+                    break
+            
+            if pk_column and datos.get(pk_column):
+                # Verificar si existe usando select directo (Core, no ORM)
+                stmt_select = select(table).where(
+                    table.columns[pk_column] == datos[pk_column]
+                )
+                result = session.execute(stmt_select).first()
+                
+                if result:
+                    # Actualizar usando update directo (Core, no ORM)
+                    stmt_update = update(table).where(
+                        table.columns[pk_column] == datos[pk_column]
+                    ).values(**datos)
+                    session.execute(stmt_update)
+                    updated += 1
+                else:
+                    # Insertar usando insert directo (Core, no ORM)
+                    stmt_insert = insert(table).values(**datos)
+                    session.execute(stmt_insert)
+                    inserted += 1
+            else:
+                # No hay PK, insertar directamente
+                stmt_insert = insert(table).values(**datos)
+                session.execute(stmt_insert)
+                inserted += 1
+            
+            # Liberar savepoint si todo salió bien
+            session.execute(text(f"RELEASE SAVEPOINT {savepoint_name}"))
+            
+            # Commit periódico para evitar perder trabajo y mantener transacción válida
+            if fila_idx % commit_interval == 0:
+                session.commit()
+                logger.debug(f"Commit periódico: {fila_idx} filas procesadas")
+                
+        except Exception as e:
+            # Determinar tipo de error
+            error_msg = str(e).lower()
+            tipo_error = "otro"
+            if 'foreign key' in error_msg or 'violates foreign key' in error_msg:
+                errores_detalle['errores_foreign_key'] += 1
+                tipo_error = "foreign_key"
+            elif 'not null' in error_msg or 'null value' in error_msg:
+                errores_detalle['errores_not_null'] += 1
+                tipo_error = "not_null"
+            elif 'invalid input' in error_msg or 'type' in error_msg or 'invalid' in error_msg:
+                errores_detalle['errores_tipo_dato'] += 1
+                tipo_error = "tipo_dato"
+            else:
+                errores_detalle['errores_otros'] += 1
+            
+            # Log detallado del error
+            logger.warning(f"Fila {fila_idx} - Error tipo '{tipo_error}': {e}")
+            # Log datos de la fila (sanitizado, sin valores sensibles)
+            logger.debug(f"Fila {fila_idx} - Datos: {_datos_sanitizados(datos)}")
+            
+            # Hacer rollback al savepoint (solo esta fila)
+            try:
+                session.execute(text(f"ROLLBACK TO SAVEPOINT {savepoint_name}"))
+                logger.debug(f"Fila {fila_idx} - Rollback al savepoint realizado exitosamente")
+            except Exception as rollback_error:
+                # Si el rollback al savepoint falla, hacer rollback completo
+                logger.error(f"Fila {fila_idx} - Error haciendo rollback al savepoint {savepoint_name}: {rollback_error}. Haciendo rollback completo.")
+                try:
+                    session.rollback()
+                except Exception as full_rollback_error:
+                    logger.error(f"Fila {fila_idx} - Error crítico en rollback completo: {full_rollback_error}")
+            continue
+    
+    return inserted, updated
+
+
+def import_one_file(session, model, ruta_archivo: str, formato: str, upsert: bool = False, keep_ids: bool = False,
+                    motor_conversion: str = IMPORT_CONVERSION_ENGINE) -> Tuple[int, int, Dict[str, Any]]:
     """
     Importa un archivo Excel/CSV a una tabla.
     
+    El archivo se procesa en lotes de IMPORT_CHUNK_SIZE filas (leer → mapear/convertir →
+    validar → escribir) y cada lote se confirma al terminarlo: la memoria no depende de la
+    cantidad de filas y las primeras filas quedan guardadas sin esperar al resto del archivo.
+    
     Args:
         session: Sesión de SQLAlchemy
         model: Modelo de la tabla destino
@@ -637,6 +1482,7 @@ def import_one_file(session, model, ruta_archivo: str, formato: str, upsert: boo
         formato: Formato del archivo ('xlsx' o 'csv')
         upsert: Si es True, actualiza registros existentes
         keep_ids: Si es True, mantiene los IDs del archivo
+        motor_conversion: 'python' (plan de conversión fila a fila) o 'pandas' (columnas por lote, mismos valores)
     
     Returns:
         Tuple[int, int, Dict[str, Any]]: (insertados, actualizados, errores_detalle)
@@ -658,15 +1504,17 @@ def import_one_file(session, model, ruta_archivo: str, formato: str, upsert: boo
     }
     
     try:
-        # Leer archivo
+        # Leer archivo (fila a fila, sin cargarlo completo)
         if formato == 'xlsx':
-            headers, rows = read_rows_from_xlsx(ruta_archivo)
+            headers, rows = iterar_filas_xlsx(ruta_archivo)
         else:
-            headers, rows = read_rows_from_csv(ruta_archivo)
+            headers, rows = iterar_filas_csv(ruta_archivo)
         
-        if not headers or not rows:
+        primera_fila = next(rows, None)
+        if not headers or primera_fila is None:
             logger.warning("Archivo vacío o sin datos")
             return 0, 0
+        rows = itertools.chain([primera_fila], rows)
         
         # Normalizar headers
         headers = normalize_header_names(headers)
@@ -708,253 +1556,66 @@ def import_one_file(session, model, ruta_archivo: str, formato: str, upsert: boo
             logger.error("No se encontraron columnas coincidentes")
             return 0, 0
         
-        # Procesar filas y preparar datos para bulk insert
-        filas_datos = []
-        for fila in rows:
-            try:
-                datos = {}
-                for i, valor in enumerate(fila):
-                    if i < len(headers) and headers[i] in mapeo_columnas:
-                        columna = mapeo_columnas[headers[i]]
-                        # Convertir valor según el tipo de columna
-                        tipo_columna = tipos_columnas.get(columna)
-                        if tipo_columna:
-                            try:
-                                valor_convertido = convertir_valor_segun_tipo(valor, tipo_columna)
-                                # Log de depuración para booleanos
-                                if hasattr(tipo_columna, 'python_type') and tipo_columna.python_type == bool:
-                                    logger.debug(f"Columna '{columna}': '{valor}' ({type(valor).__name__}) -> {valor_convertido} ({type(valor_convertido).__name__})")
-                            except Exception as e:
-                                logger.warning(f"Error convirtiendo valor '{valor}' para columna '{columna}': {e}")
-                                valor_convertido = valor
-                        else:
-                            valor_convertido = valor
-                        datos[columna] = valor_convertido
-                
-                if datos:
-                    filas_datos.append((len(filas_datos) + 1, datos))  # Guardar índice de fila junto con datos
-            except Exception as e:
-                logger.warning(f"Error procesando fila: {e}")
-                errores_detalle['errores_otros'] += 1
-                continue
+        # Pipeline por lotes: leer → mapear/convertir → validar → escribir → confirmar.
+        # Solo el lote en curso está en memoria y cada lote queda confirmado al terminarlo.
+        from sqlalchemy import MetaData
         
-        # Usar SQLAlchemy Core directamente pero con el mapper
-        # Obtener la tabla de forma segura usando caché para evitar configurar relaciones
-        from sqlalchemy import insert, select, update, MetaData, text
+        # Obtener nombre de tabla sin acceder al mapper
+        tabla_nombre = obtener_nombre_tabla_seguro(model)
         
-        if filas_datos:
-            try:
-                # Obtener nombre de tabla sin acceder al mapper
-                tabla_nombre = obtener_nombre_tabla_seguro(model)
-                
-                # Usar caché para obtener la tabla sin disparar configuración del mapper
-                if tabla_nombre not in _TABLES_CACHE:
-                    # Obtener tabla directamente desde la metadata reflejada
-                    # Esto evita acceder al mapper que puede disparar configuración de relaciones
-                    metadata = MetaData()
-                    metadata.reflect(bind=session.bind, only=[tabla_nombre])
-                    _TABLES_CACHE[tabla_nombre] = metadata.tables[tabla_nombre]
-                
-                table = _TABLES_CACHE[tabla_nombre]
-                
-                # Contadores de errores por tipo
-                errores_foreign_key = 0
-                errores_not_null = 0
-                errores_tipo_dato = 0
-                errores_otros = 0
-                
+        # Usar caché para obtener la tabla sin disparar configuración del mapper
+        if tabla_nombre not in _TABLES_CACHE:
+            # Obtener tabla directamente desde la metadata reflejada
+            # Esto evita acceder al mapper que puede disparar configuración de relaciones
+            metadata = MetaData()
+            metadata.reflect(bind=session.bind, only=[tabla_nombre])
+            _TABLES_CACHE[tabla_nombre] = metadata.tables[tabla_nombre]
+        
+        table = _TABLES_CACHE[tabla_nombre]
+        plan = obtener_plan_conversion(model, headers, mapeo_columnas, tipos_columnas)
+        if motor_conversion == "pandas":
+            filas = mapear_filas_importacion_pandas(rows, plan, errores_detalle)
+        else:
+            filas = mapear_filas_importacion(rows, plan, errores_detalle)
+        filas_procesadas = 0
+        
+        try:
+            while True:
+                lote = list(itertools.islice(filas, IMPORT_CHUNK_SIZE))
+                if not lote:
+                    break
                 if upsert:
-                    # Para upsert, necesitamos procesar individualmente
-                    # Usar savepoints para aislar errores por fila sin abortar toda la transacción
-                    commit_interval = 100  # Commit cada 100 filas
-                    
-                    for fila_idx, datos in filas_datos:
-                        savepoint_name = f"sp_fila_{fila_idx}"
-                        try:
-                            # Validar foreign keys y NOT NULL antes de procesar
-                            errores_fk = validar_foreign_keys(session, tabla_nombre, datos)
-                            errores_nn = validar_not_null(session, tabla_nombre, datos, table)
-                            
-                            # Si hay errores de validación, reportarlos y saltar esta fila
-                            if errores_fk or errores_nn:
-                                for error in errores_fk:
-                                    logger.warning(f"Fila {fila_idx} - Validación FK fallida: {error['mensaje']}")
-                                    errores_foreign_key += 1
-                                for error in errores_nn:
-                                    logger.warning(f"Fila {fila_idx} - Validación NOT NULL fallida: {error['mensaje']}")
-                                    errores_not_null += 1
-                                # Log datos de la fila para diagnóstico
-                                datos_sanitizados = {k: ('***' if 'password' in k.lower() or 'pass' in k.lower() else v) 
-                                                    for k, v in datos.items()}
-                                logger.debug(f"Fila {fila_idx} - Datos con error de validación: {datos_sanitizados}")
-                                # No procesar esta fila si tiene errores de validación
-                                continue
-                            
-                            # Crear savepoint antes de procesar cada fila
-                            # Esto permite hacer rollback solo de esta fila si hay error
-                            session.execute(text(f"SAVEPOINT {savepoint_name}"))
-                            
-                            # Buscar clave primaria
-                            pk_column = None
-                            for col in table.primary_key.columns:
-                                if col.name in datos:
-                                    pk_column = col.name
-                                    break
-                            
-                            if pk_column and datos.get(pk_column):
-                                # Verificar si existe usando select directo (Core, no ORM)
-                                stmt_select = select(table).where(
-                                    table.columns[pk_column] == datos[pk_column]
-                                )
-                                result = session.execute(stmt_select).first()
-                                
-                                if result:
-                                    # Actualizar usando update directo (Core, no ORM)
-                                    stmt_update = update(table).where(
-                                        table.columns[pk_column] == datos[pk_column]
-                                    ).values(**datos)
-                                    session.execute(stmt_update)
-                                    updated += 1
-                                else:
-                                    # Insertar usando insert directo (Core, no ORM)
-                                    stmt_insert = insert(table).values(**datos)
-                                    session.execute(stmt_insert)
-                                    inserted += 1
-                            else:
-                                # No hay PK, insertar directamente
-                                stmt_insert = insert(table).values(**datos)
-                                session.execute(stmt_insert)
-                                inserted += 1
-                            
-                            # Liberar savepoint si todo salió bien
-                            session.execute(text(f"RELEASE SAVEPOINT {savepoint_name}"))
-                            
-                            # Commit periódico para evitar perder trabajo y mantener transacción válida
-                            if fila_idx % commit_interval == 0:
-                                session.commit()
-                                logger.debug(f"Commit periódico: {fila_idx} filas procesadas")
-                                
-                        except Exception as e:
-                            # Determinar tipo de error
-                            error_msg = str(e).lower()
-                            tipo_error = "otro"
-                            if 'foreign key' in error_msg or 'violates foreign key' in error_msg:
-                                errores_foreign_key += 1
-                                tipo_error = "foreign_key"
-                            elif 'not null' in error_msg or 'null value' in error_msg:
-                                errores_not_null += 1
-                                tipo_error = "not_null"
-                            elif 'invalid input' in error_msg or 'type' in error_msg or 'invalid' in error_msg:
-                                errores_tipo_dato += 1
-                                tipo_error = "tipo_dato"
-                            else:
-                                errores_otros += 1
-                            
-                            # Log detallado del error
-                            logger.warning(f"Fila {fila_idx} - Error tipo '{tipo_error}': {e}")
-                            # Log datos de la fila (sanitizado, sin valores sensibles)
-                            datos_sanitizados = {k: ('***' if 'password' in k.lower() or 'pass' in k.lower() else v) 
-                                                for k, v in datos.items()}
-                            logger.debug(f"Fila {fila_idx} - Datos: {datos_sanitizados}")
-                            
-                            # Hacer rollback al savepoint (solo esta fila)
-                            try:
-                                session.execute(text(f"ROLLBACK TO SAVEPOINT {savepoint_name}"))
-                                logger.debug(f"Fila {fila_idx} - Rollback al savepoint realizado exitosamente")
-                            except Exception as rollback_error:
-                                # Si el rollback al savepoint falla, hacer rollback completo
-                                logger.error(f"Fila {fila_idx} - Error haciendo rollback al savepoint {savepoint_name}: {rollback_error}. Haciendo rollback completo.")
-                                try:
-                                    session.rollback()
-                                except Exception as full_rollback_error:
-                                    logger.error(f"Fila {fila_idx} - Error crítico en rollback completo: {full_rollback_error}")
-                            continue
+                    insertados_lote, actualizados_lote = upsert_lote_importacion(
+                        session, tabla_nombre, table, lote, errores_detalle
+                    )
+                    inserted += insertados_lote
+                    updated += actualizados_lote
                 else:
-                    # Usar insert() statements directamente (Core, no ORM)
-                    # Insertar en lotes para mejor rendimiento
-                    # Primero validar y filtrar filas inválidas
-                    batch_size = 1000
-                    filas_validas = []
-                    
-                    for fila_idx, datos in filas_datos:
-                        # Validar foreign keys y NOT NULL antes de agregar al batch
-                        errores_fk = validar_foreign_keys(session, tabla_nombre, datos)
-                        errores_nn = validar_not_null(session, tabla_nombre, datos, table)
-                        
-                        if errores_fk or errores_nn:
-                            # Reportar errores y no incluir esta fila
-                            for error in errores_fk:
-                                logger.warning(f"Fila {fila_idx} - Validación FK fallida: {error['mensaje']}")
-                                errores_foreign_key += 1
-                            for error in errores_nn:
-                                logger.warning(f"Fila {fila_idx} - Validación NOT NULL fallida: {error['mensaje']}")
-                                errores_not_null += 1
-                            # Log datos de la fila para diagnóstico
-                            datos_sanitizados = {k: ('***' if 'password' in k.lower() or 'pass' in k.lower() else v) 
-                                                for k, v in datos.items()}
-                            logger.debug(f"Fila {fila_idx} - Datos con error de validación: {datos_sanitizados}")
-                            continue
-                        
-                        # Agregar solo los datos (sin el índice) a la lista de filas válidas
-                        filas_validas.append(datos)
-                    
-                    # Insertar filas válidas en lotes
-                    for i in range(0, len(filas_validas), batch_size):
-                        batch = filas_validas[i:i + batch_size]
-                        # Filtrar None de las claves primarias para evitar SAWarning
-                        # Si la PK tiene autoincrement en la BD, no necesita valor explícito
-                        batch_clean = []
-                        for row in batch:
-                            row_clean = row.copy()
-                            # Remover valores None de columnas PK que puedan tener autoincrement
-                            for pk_col in table.primary_key.columns:
-                                if pk_col.name in row_clean and row_clean[pk_col.name] is None:
-                                    # Si la columna PK es None y puede tener autoincrement, removerla
-                                    # La BD generará el valor automáticamente
-                                    if pk_col.autoincrement or pk_col.server_default is not None:
-                                        del row_clean[pk_col.name]
-                            batch_clean.append(row_clean)
-                        
-                        try:
-                            stmt = insert(table).values(batch_clean)
-                            result = session.execute(stmt)
-                            inserted += len(batch_clean)
-                        except Exception as batch_error:
-                            # Si un batch falla, intentar insertar fila por fila para identificar el problema
-                            error_msg = str(batch_error).lower()
-                            if 'foreign key' in error_msg or 'violates foreign key' in error_msg:
-                                errores_foreign_key += len(batch_clean)
-                            elif 'not null' in error_msg or 'null value' in error_msg:
-                                errores_not_null += len(batch_clean)
-                            elif 'invalid input' in error_msg or 'type' in error_msg:
-                                errores_tipo_dato += len(batch_clean)
-                            else:
-                                errores_otros += len(batch_clean)
-                            logger.warning(f"Error insertando batch: {batch_error}")
-                            # Continuar con el siguiente batch
-                            continue
-                
+                    filas_validas = validar_lote_importacion(session, tabla_nombre, table, lote, errores_detalle)
+                    inserted += insertar_lote_importacion(session, table, filas_validas, errores_detalle)
                 session.commit()
-                
-                # Actualizar contadores de errores en el diccionario de retorno
-                errores_detalle['errores_foreign_key'] = errores_foreign_key
-                errores_detalle['errores_not_null'] = errores_not_null
-                errores_detalle['errores_tipo_dato'] = errores_tipo_dato
-                errores_detalle['errores_otros'] = errores_otros
-                errores_detalle['total_errores'] = errores_foreign_key + errores_not_null + errores_tipo_dato + errores_otros
-                
-                # Log resumen de errores
-                if errores_detalle['total_errores'] > 0:
-                    logger.warning(f"Importación completada con errores: {inserted} insertados, {updated} actualizados")
-                    logger.warning(f"Errores encontrados: FK={errores_foreign_key}, NOT NULL={errores_not_null}, Tipo={errores_tipo_dato}, Otros={errores_otros}")
-                else:
-                    logger.info(f"Importación completada: {inserted} insertados, {updated} actualizados")
-            except Exception as e:
-                logger.error(f"Error en insert: {e}")
-                session.rollback()
-                raise
-        else:
+                filas_procesadas += len(lote)
+                logger.debug(f"Lote confirmado: {filas_procesadas} filas procesadas")
+        except Exception as e:
+            logger.error(f"Error en insert: {e}")
+            session.rollback()
+            raise
+        
+        errores_detalle['total_errores'] = (
+            errores_detalle['errores_foreign_key'] + errores_detalle['errores_not_null']
+            + errores_detalle['errores_tipo_dato'] + errores_detalle['errores_otros']
+        )
+        
+        # Log resumen de errores
+        if not filas_procesadas:
             logger.warning("No hay datos para importar")
+        elif errores_detalle['total_errores'] > 0:
+            logger.warning(f"Importación completada con errores: {inserted} insertados, {updated} actualizados")
+            logger.warning(f"Errores encontrados: FK={errores_detalle['errores_foreign_key']}, "
+                           f"NOT NULL={errores_detalle['errores_not_null']}, "
+                           f"Tipo={errores_detalle['errores_tipo_dato']}, Otros={errores_detalle['errores_otros']}")
+        else:
+            logger.info(f"Importación completada: {inserted} insertados, {updated} actualizados")
         
     except Exception as e:
         logger.error(f"Error importando archivo: {e}")
@@ -1102,6 +1763,7 @@ def _procesar_archivo_cli(
     tabla_cli: Optional[str],
     upsert: bool,
     keep_ids: bool,
+    motor_conversion: str = IMPORT_CONVERSION_ENGINE,
 ) -> Dict[str, Any]:
     """Procesa un archivo desde CLI y retorna el resultado."""
     resultado = {
@@ -1136,7 +1798,9 @@ def _procesar_archivo_cli(
 
     session = SessionFactory()
     try:
-        inserted, updated, errores_detalle = import_one_file(session, modelo, ruta_archivo, formato, upsert=upsert, keep_ids=keep_ids)
+        inserted, updated, errores_detalle = import_one_file(
+            session, modelo, ruta_archivo, formato, upsert=upsert, keep_ids=keep_ids, motor_conversion=motor_conversion
+        )
         resultado["insertados"] = inserted
         resultado["actualizados"] = updated
         resultado["errores"] = errores_detalle
@@ -1175,6 +1839,12 @@ def main():
         action="store_true",
         help="Mantiene los IDs provistos en el archivo en lugar de generar nuevos.",
     )
+    parser.add_argument(
+        "--motor-conversion",
+        choices=MOTORES_CONVERSION,
+        default=IMPORT_CONVERSION_ENGINE,
+        help=f"Motor de conversión de valores: python (fila a fila) o pandas (columnas por lote) (default: {IMPORT_CONVERSION_ENGINE})",
+    )
     args = parser.parse_args()
 
     try:
@@ -1189,7 +1859,7 @@ def main():
     resultados: List[Dict[str, Any]] = []
     for ruta in args.files:
         logger.info(f"Procesando archivo '{ruta}'...")
-        resultado = _procesar_archivo_cli(SessionFactory, ruta, args.table, args.upsert, args.keep_ids)
+        resultado = _procesar_archivo_cli(SessionFactory, ruta, args.table, args.upsert, args.keep_ids, args.motor_conversion)
         resultados.append(resultado)
         if resultado["exito"]:
             logger.info(
@@ -0,0 +1,468 @@
+"""
+Asesor de índices para las consultas de exportación e importación.
+
+Ejecuta `EXPLAIN (ANALYZE, BUFFERS)` sobre las mismas consultas que arman
+export_analisis_filtrados, export_analisis_por_lote(s) y validar_foreign_keys,
+reporta los seq scans y propone (y opcionalmente crea) los índices compuestos o
+parciales que faltan, con el tiempo de cada consulta antes y después.
+
+Configuración por variables de entorno:
+- INDEX_ADVISOR_MIN_ROWS: filas estimadas mínimas para proponer un índice (default: 10000)
+- INDEX_ADVISOR_STATEMENT_TIMEOUT: tiempo máximo por consulta analizada, en ms (default: 60000)
+"""
+import os
+import json
+import argparse
+import logging
+from datetime import date, timedelta
+from typing import Optional, Dict, Any, List
+
+# Importar dependencias usando módulo común
+from dependencies_common import importar_sqlalchemy
+
+# Importar SQLAlchemy
+create_engine, text, _, _, sessionmaker, _ = importar_sqlalchemy()
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+from db_common import obtener_engine, inicializar_automap, obtener_modelo
+from ExportExcel import (
+    TABLAS_ANALISIS_POR_RECIBO,
+    COLUMNA_ID_POR_TIPO,
+    COLUMNA_ACTIVO_POR_TIPO,
+    SQL_RECIBO_POR_LOTE,
+    SQL_RECIBOS_POR_LOTES,
+    construir_filtro_analisis,
+    construir_filtro_recibo,
+    obtener_campo_fecha_analisis,
+    obtener_columnas_validas,
+    log_ok,
+    log_fail,
+    log_step
+)
+from ImportExcel import obtener_foreign_keys, consulta_existencia_fk_lote, IMPORT_CHUNK_SIZE
+
+# Filas estimadas mínimas de una tabla para proponer un índice (en tablas chicas el seq scan es lo esperado)
+INDEX_ADVISOR_MIN_ROWS = int(os.getenv("INDEX_ADVISOR_MIN_ROWS", 10000))
+# Tiempo máximo de cada consulta analizada (EXPLAIN ANALYZE la ejecuta de verdad)
+INDEX_ADVISOR_STATEMENT_TIMEOUT = int(os.getenv("INDEX_ADVISOR_STATEMENT_TIMEOUT", 60000))
+
+ORIGENES_CONSULTAS = ("export_analisis_filtrados", "export_analisis_por_lote", "export_analisis_por_lotes",
+                      "validar_foreign_keys")
+
+# Postgres trunca los identificadores a 63 bytes
+MAX_LARGO_IDENTIFICADOR = 63
+
+# ================================
+# MÓDULO: CONSULTAS A ANALIZAR
+# ================================
+def crear_consulta(origen: str, descripcion: str, tabla: str, sql: str, params: Dict[str, Any],
+                   igualdad: List[str], rango: Optional[List[str]] = None,
+                   parcial: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Describe una consulta a analizar y las columnas que determinan su índice:
+    las de igualdad primero, luego las de rango, y la condición parcial (p. ej. `x_activo = true`).
+    """
+    return {
+        'origen': origen,
+        'descripcion': descripcion,
+        'tabla': tabla,
+        'sql': sql,
+        'params': params,
+        'igualdad': igualdad,
+        'rango': rango or [],
+        'parcial': parcial,
+    }
+
+def obtener_valores_muestra(session, tabla: str, columna: str, cantidad: int = 1) -> list:
+    """Toma valores reales de una columna para que EXPLAIN ANALYZE use parámetros representativos."""
+    try:
+        filas = session.execute(
+            text(f"SELECT {columna} FROM {tabla} WHERE {columna} IS NOT NULL LIMIT :cantidad"),
+            {"cantidad": cantidad}
+        ).fetchall()
+    except Exception as e:
+        session.rollback()
+        logger.warning(f"No se pudieron leer valores de muestra de {tabla}.{columna}: {e}")
+        return []
+    return [fila[0] for fila in filas]
+
+def condicion_parcial(activo_col: Optional[str], columnas_validas: list) -> Optional[str]:
+    return f"{activo_col} = true" if activo_col and activo_col in columnas_validas else None
+
+def consultas_export_filtrados(session) -> List[Dict[str, Any]]:
+    """Consultas de export_analisis_filtrados: por rango de fechas y por lista de IDs, solo activos."""
+    consultas = []
+    hasta = date.today()
+    desde = hasta - timedelta(days=365)
+    for tipo in COLUMNA_ACTIVO_POR_TIPO:
+        try:
+            model = obtener_modelo(tipo)
+        except (AttributeError, KeyError):
+            continue
+        columnas_validas, columnas_analisis = obtener_columnas_validas(session, model)
+        if not columnas_analisis:
+            continue
+        select = f"SELECT {', '.join(columnas_analisis)} FROM {tipo}"
+        parcial = condicion_parcial(COLUMNA_ACTIVO_POR_TIPO[tipo], columnas_validas)
+
+        campo_fecha = obtener_campo_fecha_analisis(tipo)
+        if campo_fecha in columnas_validas:
+            filtro_where, filtro_params = construir_filtro_analisis(session, tipo, model, None, desde, hasta)
+            consultas.append(crear_consulta(
+                "export_analisis_filtrados", f"{tipo} por rango de {campo_fecha}", tipo,
+                f"{select} WHERE {filtro_where}", filtro_params, [], [campo_fecha], parcial
+            ))
+
+        id_col = COLUMNA_ID_POR_TIPO[tipo]
+        ids = obtener_valores_muestra(session, tipo, id_col, 10) if id_col in columnas_validas else []
+        if ids:
+            filtro_where, filtro_params = construir_filtro_analisis(session, tipo, model, {tipo: ids})
+            consultas.append(crear_consulta(
+                "export_analisis_filtrados", f"{tipo} por lista de {id_col}", tipo,
+                f"{select} WHERE {filtro_where}", filtro_params, [id_col], None, parcial
+            ))
+    return consultas
+
+def consultas_export_por_lote(session, varios: bool = False) -> List[Dict[str, Any]]:
+    """
+    Consultas de export_analisis_por_lote (varios=False) o export_analisis_por_lotes (varios=True):
+    recibo activo del lote y análisis activos del recibo.
+    """
+    origen = "export_analisis_por_lotes" if varios else "export_analisis_por_lote"
+    lote_ids = obtener_valores_muestra(session, "recibo", "lote_id", 10 if varios else 1)
+    recibo_ids = obtener_valores_muestra(session, "recibo", "recibo_id", 10 if varios else 1)
+    if not lote_ids or not recibo_ids:
+        log_step(f"Sin recibos con lote para armar las consultas de {origen}")
+        return []
+
+    if varios:
+        consultas = [crear_consulta(origen, "recibos activos de varios lotes", "recibo", SQL_RECIBOS_POR_LOTES,
+                                    {"lote_ids": lote_ids}, ["lote_id"], None, "recibo_activo = true")]
+        params = {"recibo_ids": recibo_ids}
+    else:
+        consultas = [crear_consulta(origen, "recibo activo del lote", "recibo", SQL_RECIBO_POR_LOTE,
+                                    {"lote_id": lote_ids[0]}, ["lote_id"], None, "recibo_activo = true")]
+        params = {"recibo_id": recibo_ids[0]}
+
+    for tipo, config in TABLAS_ANALISIS_POR_RECIBO.items():
+        tabla = config['tabla']
+        try:
+            model = obtener_modelo(tabla)
+        except (AttributeError, KeyError):
+            continue
+        columnas_validas, columnas_analisis = obtener_columnas_validas(session, model)
+        recibo_col = config['recibo_col']
+        if recibo_col not in columnas_validas or not columnas_analisis:
+            continue
+        filtro_where = construir_filtro_recibo(config, columnas_validas, varios=varios)
+        if varios:
+            orden = recibo_col
+            if config['id_col'] in columnas_validas:
+                orden += f", {config['id_col']}"
+            sql = f"SELECT {', '.join([recibo_col] + columnas_analisis)} FROM {tabla} WHERE {filtro_where} ORDER BY {orden}"
+        else:
+            sql = f"SELECT {', '.join(columnas_analisis)} FROM {tabla} WHERE {filtro_where}"
+        consultas.append(crear_consulta(
+            origen, f"{tipo} por {recibo_col}", tabla, sql, params,
+            [recibo_col], None, condicion_parcial(config.get('activo_col'), columnas_validas)
+        ))
+    return consultas
+
+def consultas_foreign_keys(session) -> List[Dict[str, Any]]:
+    """
+    Consultas de validar_foreign_keys_lote: una por cada columna referenciada por alguna FK,
+    con un lote de valores reales como el que arma la importación.
+    """
+    tablas = [fila[0] for fila in session.execute(text(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = 'public' AND table_type = 'BASE TABLE' ORDER BY table_name"
+    )).fetchall()]
+    consultas = []
+    vistas = set()
+    for tabla in tablas:
+        for fk_col, ref_table, ref_col in obtener_foreign_keys(session, tabla):
+            clave = (ref_table.lower(), ref_col.lower())
+            if clave in vistas:
+                continue
+            vistas.add(clave)
+            valores = obtener_valores_muestra(session, ref_table, ref_col, IMPORT_CHUNK_SIZE)
+            if not valores:
+                continue
+            consultas.append(crear_consulta(
+                "validar_foreign_keys", f"{tabla}.{fk_col} -> {ref_table}.{ref_col}", clave[0],
+                consulta_existencia_fk_lote(ref_table, ref_col), {"valores": valores}, [clave[1]]
+            ))
+    return consultas
+
+def construir_consultas(session, origenes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Arma las consultas de los orígenes indicados (todos por defecto)."""
+    origenes = origenes or list(ORIGENES_CONSULTAS)
+    consultas = []
+    if "export_analisis_filtrados" in origenes:
+        consultas.extend(consultas_export_filtrados(session))
+    if "export_analisis_por_lote" in origenes:
+        consultas.extend(consultas_export_por_lote(session))
+    if "export_analisis_por_lotes" in origenes:
+        consultas.extend(consultas_export_por_lote(session, varios=True))
+    if "validar_foreign_keys" in origenes:
+        consultas.extend(consultas_foreign_keys(session))
+    return consultas
+
+# ================================
+# MÓDULO: PLANES DE EJECUCIÓN
+# ================================
+def recolectar_seq_scans(nodo: Dict[str, Any], resultado: List[Dict[str, Any]]):
+    """Recorre el plan y agrega los nodos Seq Scan con su filtro y filas descartadas."""
+    if nodo.get("Node Type") == "Seq Scan":
+        resultado.append({
+            'tabla': nodo.get("Relation Name"),
+            'filtro': nodo.get("Filter"),
+            'filas': nodo.get("Actual Rows", 0) * nodo.get("Actual Loops", 1),
+            'filas_descartadas': nodo.get("Rows Removed by Filter", 0),
+            'bloques': nodo.get("Shared Hit Blocks", 0) + nodo.get("Shared Read Blocks", 0),
+        })
+    for hijo in nodo.get("Plans", []):
+        recolectar_seq_scans(hijo, resultado)
+
+def explicar_consulta(session, sql: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ejecuta EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) y resume el plan:
+    tiempo de ejecución, bloques leídos y seq scans. La transacción se descarta al terminar.
+    """
+    try:
+        session.execute(text(f"SET LOCAL statement_timeout = {int(INDEX_ADVISOR_STATEMENT_TIMEOUT)}"))
+        plan = session.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params).scalar()
+    finally:
+        session.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]
+    raiz = plan["Plan"]
+    seq_scans = []
+    recolectar_seq_scans(raiz, seq_scans)
+    return {
+        'tiempo_ms': round(plan.get("Execution Time", 0.0), 3),
+        'bloques_cache': raiz.get("Shared Hit Blocks", 0),
+        'bloques_disco': raiz.get("Shared Read Blocks", 0),
+        'seq_scans': seq_scans,
+    }
+
+# ================================
+# MÓDULO: PROPUESTA DE ÍNDICES
+# ================================
+def obtener_indices_existentes(session) -> Dict[str, List[List[str]]]:
+    """Retorna {tabla: [columnas de cada índice, en orden]} del esquema public."""
+    filas = session.execute(text("""
+        SELECT t.relname, i.relname, array_agg(a.attname ORDER BY k.ord)
+        FROM pg_index ix
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE n.nspname = 'public' AND ix.indisvalid
+        GROUP BY t.relname, i.relname
+    """)).fetchall()
+    indices = {}
+    for tabla, _, columnas in filas:
+        indices.setdefault(tabla, []).append(list(columnas))
+    return indices
+
+def obtener_filas_estimadas(session) -> Dict[str, int]:
+    """Filas estimadas (pg_class.reltuples) de cada tabla del esquema public."""
+    filas = session.execute(text("""
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    """)).fetchall()
+    return {tabla: max(int(estimadas), 0) for tabla, estimadas in filas}
+
+def nombre_indice(tabla: str, columnas: List[str], parcial: bool) -> str:
+    nombre = f"idx_{tabla}_{'_'.join(columnas)}" + ("_activos" if parcial else "")
+    return nombre[:MAX_LARGO_IDENTIFICADOR]
+
+def proponer_indice(consulta: Dict[str, Any], plan: Dict[str, Any], indices: Dict[str, List[List[str]]],
+                    filas_estimadas: Dict[str, int], min_filas: int) -> Optional[Dict[str, Any]]:
+    """
+    Propone un índice si la consulta hizo seq scan sobre su tabla y ningún índice
+    existente empieza por la primera columna de filtro. Retorna None si no hace falta.
+    """
+    tabla = consulta['tabla']
+    columnas = consulta['igualdad'] + consulta['rango']
+    if not columnas or not any(scan['tabla'] == tabla for scan in plan['seq_scans']):
+        return None
+    if filas_estimadas.get(tabla, 0) < min_filas:
+        consulta['nota'] = f"Seq scan esperado: {tabla} tiene ~{filas_estimadas.get(tabla, 0)} filas"
+        return None
+    if any(existente and existente[0] == columnas[0] for existente in indices.get(tabla, [])):
+        consulta['nota'] = f"Ya existe un índice por {columnas[0]}; el planificador eligió seq scan (baja selectividad)"
+        return None
+
+    parcial = consulta['parcial']
+    nombre = nombre_indice(tabla, columnas, bool(parcial))
+    sql = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON public.{tabla} ({', '.join(columnas)})"
+    if parcial:
+        sql += f" WHERE {parcial}"
+    return {
+        'nombre': nombre,
+        'tabla': tabla,
+        'columnas': columnas,
+        'parcial': parcial,
+        'sql': sql,
+        'motivo': f"{consulta['origen']}: {consulta['descripcion']}",
+        'aplicado': False,
+    }
+
+def aplicar_indice(engine, propuesta: Dict[str, Any]) -> bool:
+    """
+    Crea el índice con CREATE INDEX CONCURRENTLY (sin bloquear escrituras) y actualiza
+    las estadísticas de la tabla. CONCURRENTLY no puede correr dentro de una transacción.
+    """
+    try:
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            conn.execute(text(propuesta['sql']))
+            conn.execute(text(f"ANALYZE public.{propuesta['tabla']}"))
+        propuesta['aplicado'] = True
+        log_ok(f"Índice creado: {propuesta['nombre']}")
+        return True
+    except Exception as e:
+        # Un CREATE INDEX CONCURRENTLY fallido puede dejar un índice inválido que hay que eliminar a mano
+        propuesta['error'] = str(e)
+        log_fail(f"No se pudo crear {propuesta['nombre']}: {e}")
+        return False
+
+# ================================
+# MÓDULO: ANÁLISIS COMPLETO
+# ================================
+def analizar_indices(origenes: Optional[List[str]] = None, aplicar: bool = False,
+                     min_filas: int = INDEX_ADVISOR_MIN_ROWS, engine=None) -> Dict[str, Any]:
+    """
+    Analiza las consultas de exportación e importación y propone índices.
+
+    Args:
+        origenes: Orígenes a analizar (ver ORIGENES_CONSULTAS); todos por defecto
+        aplicar: Si es True, crea los índices propuestos y vuelve a medir las consultas afectadas
+        min_filas: Filas estimadas mínimas de una tabla para proponer un índice
+        engine: Engine de SQLAlchemy (por defecto obtener_engine())
+
+    Returns:
+        {'consultas': [...], 'propuestas': [...]} con tiempos antes/después y seq scans
+    """
+    engine = engine or obtener_engine()
+    inicializar_automap(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    try:
+        consultas = construir_consultas(session, origenes)
+        log_step(f"Analizando {len(consultas)} consulta(s)...")
+        indices = obtener_indices_existentes(session)
+        filas_estimadas = obtener_filas_estimadas(session)
+        session.rollback()
+
+        propuestas = {}
+        for consulta in consultas:
+            try:
+                plan = explicar_consulta(session, consulta['sql'], consulta['params'])
+            except Exception as e:
+                consulta['error'] = str(e)
+                log_fail(f"No se pudo analizar {consulta['descripcion']}: {e}")
+                continue
+            consulta['tiempo_ms'] = plan['tiempo_ms']
+            consulta['bloques_cache'] = plan['bloques_cache']
+            consulta['bloques_disco'] = plan['bloques_disco']
+            consulta['seq_scans'] = plan['seq_scans']
+            propuesta = proponer_indice(consulta, plan, indices, filas_estimadas, min_filas)
+            if propuesta:
+                propuestas.setdefault(propuesta['nombre'], propuesta)
+                consulta['indice_propuesto'] = propuesta['nombre']
+
+        if aplicar and propuestas:
+            aplicados = {p['nombre'] for p in propuestas.values() if aplicar_indice(engine, p)}
+            for consulta in consultas:
+                if consulta.get('indice_propuesto') not in aplicados:
+                    continue
+                try:
+                    plan = explicar_consulta(session, consulta['sql'], consulta['params'])
+                    consulta['tiempo_despues_ms'] = plan['tiempo_ms']
+                    consulta['seq_scans_despues'] = plan['seq_scans']
+                except Exception as e:
+                    consulta['error'] = str(e)
+
+        for consulta in consultas:
+            consulta.pop('params', None)
+        return {'consultas': consultas, 'propuestas': list(propuestas.values())}
+    finally:
+        session.close()
+
+def imprimir_reporte(reporte: Dict[str, Any]):
+    """Imprime el reporte en texto."""
+    print("\nCONSULTAS")
+    for consulta in reporte['consultas']:
+        print(f"- [{consulta['origen']}] {consulta['descripcion']}")
+        if 'error' in consulta:
+            print(f"    error: {consulta['error']}")
+            continue
+        tiempo = f"{consulta.get('tiempo_ms', 0):.3f} ms"
+        if 'tiempo_despues_ms' in consulta:
+            tiempo += f" -> {consulta['tiempo_despues_ms']:.3f} ms"
+        print(f"    tiempo: {tiempo}, bloques cache/disco: {consulta.get('bloques_cache', 0)}/{consulta.get('bloques_disco', 0)}")
+        for scan in consulta.get('seq_scans', []):
+            print(f"    seq scan en {scan['tabla']}: {scan['filas']} fila(s), {scan['filas_descartadas']} descartada(s)"
+                  f" por filtro {scan['filtro'] or '-'}")
+        if 'nota' in consulta:
+            print(f"    nota: {consulta['nota']}")
+    print("\nÍNDICES PROPUESTOS")
+    if not reporte['propuestas']:
+        print("- Ninguno")
+    for propuesta in reporte['propuestas']:
+        estado = "aplicado" if propuesta['aplicado'] else ("error: " + propuesta['error'] if 'error' in propuesta else "pendiente")
+        print(f"- {propuesta['sql']};  ({estado})")
+        print(f"    motivo: {propuesta['motivo']}")
+
+# ================================
+# MÓDULO: FUNCIÓN PRINCIPAL
+# ================================
+def main():
+    """Función principal del script."""
+    parser = argparse.ArgumentParser(
+        description="Analiza con EXPLAIN (ANALYZE, BUFFERS) las consultas de exportación e importación y propone índices"
+    )
+    parser.add_argument(
+        "--origen",
+        nargs="*",
+        choices=ORIGENES_CONSULTAS,
+        default=[],
+        help="Consultas a analizar. Por defecto todas"
+    )
+    parser.add_argument(
+        "--aplicar",
+        action="store_true",
+        help="Crear los índices propuestos (CREATE INDEX CONCURRENTLY) y volver a medir"
+    )
+    parser.add_argument(
+        "--min-filas",
+        type=int,
+        default=INDEX_ADVISOR_MIN_ROWS,
+        help=f"Filas estimadas mínimas de una tabla para proponer un índice (default: {INDEX_ADVISOR_MIN_ROWS})"
+    )
+    parser.add_argument(
+        "--formato",
+        choices=["texto", "json"],
+        default="texto",
+        help="Formato de salida del reporte"
+    )
+    args = parser.parse_args()
+
+    reporte = analizar_indices(args.origen or None, aplicar=args.aplicar, min_filas=args.min_filas)
+    if args.formato == "json":
+        print(json.dumps(reporte, ensure_ascii=False, indent=2, default=str))
+    else:
+        imprimir_reporte(reporte)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Endpoint de lectura de datos por streaming (NDJSON).
+"""
+import logging
+from fastapi import Request, APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from app.config import DATOS_PAGE_SIZE, DATOS_MAX_PAGE_SIZE
+from app.services.export_service import validar_conexion_bd
+from app.services.data_service import preparar_consulta_datos, generar_filas_ndjson
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/datos/{tabla}", tags=["Datos"], summary="Leer filas de una tabla",
+         description="Entrega las filas de una tabla como NDJSON (una fila JSON por línea) "
+                     "paginando por la PK, sin archivos temporales ni ZIP")
+async def leer_datos_tabla(
+    request: Request,
+    tabla: str,
+    desde_id: Optional[int] = Query(
+        default=None,
+        description="Entregar solo filas con PK mayor a este valor (para retomar desde el último id recibido)"
+    ),
+    tamano_pagina: int = Query(
+        default=DATOS_PAGE_SIZE, ge=1, le=DATOS_MAX_PAGE_SIZE,
+        description="Filas por consulta a la base de datos"
+    ),
+    max_filas: Optional[int] = Query(default=None, ge=1, description="Máximo de filas a entregar"),
+    solo_activos: bool = Query(default=True, description="Entregar solo análisis activos"),
+    fecha_desde: Optional[str] = Query(
+        default=None,
+        description="Fecha de inicio del rango (formato: YYYY-MM-DD)"
+    ),
+    fecha_hasta: Optional[str] = Query(
+        default=None,
+        description="Fecha de fin del rango (formato: YYYY-MM-DD)"
+    ),
+    campo_fecha: Optional[str] = Query(
+        default="auto",
+        description="Campo de fecha a usar para filtrado"
+    ),
+):
+    """Streaming NDJSON de una tabla con paginación keyset sobre la PK."""
+    request_id = getattr(request.state, "request_id", "unknown")
+    try:
+        validar_conexion_bd(request_id)
+        consulta = await run_in_threadpool(
+            preparar_consulta_datos, request_id, tabla, solo_activos, fecha_desde, fecha_hasta, campo_fecha
+        )
+        return StreamingResponse(
+            generar_filas_ndjson(request_id, consulta, desde_id, tamano_pagina, max_filas),
+            media_type="application/x-ndjson",
+            headers={"X-Keyset-Column": consulta['pk']}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[{request_id}] Error inesperado leyendo datos de {tabla}: {e}", exc_info=True)
+        raise
@@ -1,33 +1,117 @@
 """
 Endpoint de exportación de datos.
 """
-import os
 import shutil
 import tempfile
 import logging
 from fastapi import Request, APIRouter, Query, HTTPException
-from fastapi.responses import Response
-from typing import Optional
-from app.core.responses import crear_respuesta_error
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, Callable
+from app.core.responses import crear_respuesta_error, crear_respuesta_exito
 from app.services.export_service import (
     validar_fechas,
     validar_conexion_bd,
     exportar_con_filtros,
     exportar_tradicional,
     exportar_por_lote,
-    crear_zip_exportacion
+    exportar_por_lotes,
+    parsear_lote_ids,
+    iniciar_exportacion_streaming,
+    calcular_watermark_exportacion
+)
+from app.services.export_cache_service import (
+    resolver_clave_cache,
+    obtener_de_cache,
+    iniciar_escritura_cache
+)
+from app.services.export_jobs_service import (
+    crear_trabajo_exportacion,
+    obtener_estado_trabajo,
+    obtener_archivo_trabajo
 )
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def crear_exportador_tablas(
+    request_id: str,
+    tablas: str,
+    formato: str,
+    incluir_sin_pk: bool,
+    analisis_ids: Optional[str],
+    fecha_desde: Optional[str],
+    fecha_hasta: Optional[str],
+    campo_fecha: Optional[str],
+    libro_unico: bool,
+    desde_watermark: Optional[str] = None
+) -> Callable[[str, Callable[[str], None]], None]:
+    """
+    Retorna la función exportar(tmp_dir, al_generar_archivo) para los parámetros de /exportar.
+    Usa la exportación con filtros si hay IDs, fechas o watermark; si no, la exportación tradicional.
+    """
+    usar_filtros = analisis_ids or fecha_desde or fecha_hasta or desde_watermark
+    
+    def _exportar(tmp_dir: str, al_generar_archivo: Callable[[str], None]):
+        if usar_filtros:
+            # Exportación con filtros (análisis individuales)
+            files_generated = exportar_con_filtros(
+                request_id=request_id,
+                tmp_dir=tmp_dir,
+                analisis_ids=analisis_ids,
+                fecha_desde=fecha_desde,
+                fecha_hasta=fecha_hasta,
+                campo_fecha=campo_fecha,
+                formato=formato,
+                tablas=tablas,
+                al_generar_archivo=al_generar_archivo,
+                desde_watermark=desde_watermark
+            )
+            logger.info(f"[{request_id}] Se generaron {len(files_generated)} archivo(s) con filtros")
+        else:
+            # Exportación tradicional (sin filtros)
+            files_generated = exportar_tradicional(
+                request_id=request_id,
+                tmp_dir=tmp_dir,
+                tablas=tablas,
+                formato=formato,
+                incluir_sin_pk=incluir_sin_pk,
+                al_generar_archivo=al_generar_archivo,
+                libro_unico=libro_unico
+            )
+            logger.info(f"[{request_id}] Se generaron {len(files_generated)} archivo(s) de exportación")
+    
+    return _exportar
+
+
+def crear_exportador_lote(
+    request_id: str,
+    lote_id: int,
+    formato: str,
+    libro_unico: bool
+) -> Callable[[str, Callable[[str], None]], None]:
+    """Retorna la función exportar(tmp_dir, al_generar_archivo) para /exportar-lote/{lote_id}."""
+    def _exportar(tmp_dir: str, al_generar_archivo: Callable[[str], None]):
+        files_generated = exportar_por_lote(
+            request_id=request_id,
+            tmp_dir=tmp_dir,
+            lote_id=lote_id,
+            formato=formato,
+            al_generar_archivo=al_generar_archivo,
+            libro_unico=libro_unico
+        )
+        logger.info(f"[{request_id}] Se generaron {len(files_generated)} archivo(s) para lote {lote_id}")
+    
+    return _exportar
+
+
 @router.post("/exportar", tags=["Exportación"], summary="Exportar tablas",
          description="Endpoint para exportar tablas a Excel. Retorna archivo ZIP")
 async def exportar(
     request: Request,
     tablas: str = Query(default="", description="Lista separada por comas de tablas a exportar"),
-    formato: str = Query(default="xlsx", pattern="^(xlsx|csv)$"),
+    formato: str = Query(default="xlsx", pattern="^(xlsx|csv|parquet|arrow)$"),
     incluir_sin_pk: bool = Query(default=True, description="Incluir tablas sin Primary Key"),
     analisis_ids: Optional[str] = Query(
         default=None,
@@ -45,6 +129,15 @@ async def exportar(
         default="auto",
         description="Campo de fecha a usar para filtrado"
     ),
+    libro_unico: bool = Query(
+        default=False,
+        description="Exportar todas las tablas como hojas de un solo export.xlsx (solo xlsx, sin filtros)"
+    ),
+    desde_watermark: Optional[str] = Query(
+        default=None,
+        description="Exportar solo análisis insertados/actualizados desde este watermark ('txid:<n>' o fecha ISO). "
+                    "El siguiente watermark se retorna en el header X-Export-Watermark"
+    ),
 ):
     """Endpoint para exportar tablas a Excel. Retorna archivo ZIP con validaciones y mensajes estructurados."""
     request_id = getattr(request.state, "request_id", "unknown")
@@ -62,6 +155,40 @@ async def exportar(
         # Validar conexión a base de datos con circuit breaker
         validar_conexion_bd(request_id)
         
+        # Exportación incremental: validar el watermark y calcular el siguiente antes de leer datos
+        nuevo_watermark = None
+        if desde_watermark:
+            nuevo_watermark = await run_in_threadpool(
+                calcular_watermark_exportacion, request_id, desde_watermark, analisis_ids, tablas, campo_fecha
+            )
+        
+        # Servir desde la caché si ya se exportó lo mismo y los datos no cambiaron. Las
+        # incrementales no usan caché: el ZIP guardado puede no tener filas anteriores al
+        # watermark recién calculado, y el cliente las salta para siempre
+        parametros_cache = {
+            "tablas": sorted(t.strip() for t in tablas.split(",") if t.strip()),
+            "formato": formato,
+            "incluir_sin_pk": incluir_sin_pk,
+            "analisis_ids": analisis_ids,
+            "fecha_desde": fecha_desde,
+            "fecha_hasta": fecha_hasta,
+            "campo_fecha": campo_fecha,
+            "libro_unico": libro_unico,
+            "desde_watermark": desde_watermark,
+        }
+        clave_cache = None if desde_watermark else await run_in_threadpool(resolver_clave_cache, parametros_cache)
+        headers_extra = {"X-Export-Watermark": nuevo_watermark} if nuevo_watermark else {}
+        if clave_cache:
+            ruta_cache = obtener_de_cache(clave_cache)
+            if ruta_cache:
+                logger.info(f"[{request_id}] Exportación servida desde caché ({clave_cache[:12]})")
+                return FileResponse(
+                    ruta_cache,
+                    media_type="application/zip",
+                    filename="export.zip",
+                    headers={"X-Export-Cache": "HIT", **headers_extra}
+                )
+        
         # Crear directorio temporal
         try:
             tmp_dir = tempfile.mkdtemp(prefix="inia_export_")
@@ -74,67 +201,31 @@ async def exportar(
             )
             raise HTTPException(status_code=500, detail=respuesta_error)
         
-        # Determinar si usar exportación con filtros o exportación tradicional
-        usar_filtros = analisis_ids or fecha_desde or fecha_hasta
-        
-        if usar_filtros:
-            # Exportación con filtros (análisis individuales)
-            try:
-                files_generated = exportar_con_filtros(
-                    request_id=request_id,
-                    tmp_dir=tmp_dir,
-                    analisis_ids=analisis_ids,
-                    fecha_desde=fecha_desde,
-                    fecha_hasta=fecha_hasta,
-                    campo_fecha=campo_fecha,
-                    formato=formato,
-                    tablas=tablas
-                )
-                logger.info(f"[{request_id}] Se generaron {len(files_generated)} archivo(s) con filtros")
-            except HTTPException:
-                if tmp_dir:
-                    shutil.rmtree(tmp_dir, ignore_errors=True)
-                raise
-        else:
-            # Exportación tradicional (sin filtros)
-            try:
-                files_generated = exportar_tradicional(
-                    request_id=request_id,
-                    tmp_dir=tmp_dir,
-                    tablas=tablas,
-                    formato=formato,
-                    incluir_sin_pk=incluir_sin_pk
-                )
-                logger.info(f"[{request_id}] Se generaron {len(files_generated)} archivo(s) de exportación")
-            except HTTPException:
-                if tmp_dir:
-                    shutil.rmtree(tmp_dir, ignore_errors=True)
-                raise
-        
-        # Verificar que se generaron archivos
-        files_generated = [f for f in os.listdir(tmp_dir) if f.endswith(('.xlsx', '.csv'))]
-        if not files_generated:
-            respuesta_error = crear_respuesta_error(
-                mensaje="No se generaron archivos de exportación",
-                codigo=500,
-                detalles=f"No se generaron archivos en el directorio temporal"
-            )
-            shutil.rmtree(tmp_dir, ignore_errors=True)
-            raise HTTPException(status_code=500, detail=respuesta_error)
-        
-        # Crear ZIP y obtener bytes
-        zip_bytes = crear_zip_exportacion(tmp_dir, request_id)
+        # Exportación con filtros (análisis individuales) o tradicional (sin filtros)
+        exportador = crear_exportador_tablas(
+            request_id, tablas, formato, incluir_sin_pk,
+            analisis_ids, fecha_desde, fecha_hasta, campo_fecha, libro_unico, desde_watermark
+        )
         
-        logger.info(f"[{request_id}] Exportación completada exitosamente. Tamaño del ZIP: {len(zip_bytes)} bytes, {len(files_generated)} archivo(s)")
+        def _exportar(al_generar_archivo):
+            exportador(tmp_dir, al_generar_archivo)
         
-        # Limpiar archivos temporales
-        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Esperar el primer archivo y armar el ZIP a medida que terminan los demás
+        # (si hay clave, el ZIP también se guarda en la caché al terminar sin errores)
+        copia_cache = iniciar_escritura_cache(clave_cache) if clave_cache else None
+        contenido_zip = await run_in_threadpool(
+            iniciar_exportacion_streaming, request_id, tmp_dir, _exportar, copia_cache
+        )
         
-        # Devolver el archivo ZIP como respuesta binaria
-        return Response(
-            content=zip_bytes,
+        # tmp_dir se elimina cuando terminan el generador y la exportación
+        return StreamingResponse(
+            contenido_zip,
             media_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=export.zip"}
+            headers={
+                "Content-Disposition": "attachment; filename=export.zip",
+                "X-Export-Cache": "MISS" if clave_cache else "BYPASS",
+                **headers_extra
+            }
         )
         
     except HTTPException:
@@ -159,7 +250,8 @@ async def exportar(
 async def exportar_por_lote_id(
     request: Request,
     lote_id: int,
-    formato: str = Query(default="xlsx", pattern="^(xlsx|csv)$"),
+    formato: str = Query(default="xlsx", pattern="^(xlsx|csv|parquet|arrow)$"),
+    libro_unico: bool = Query(default=False, description="Exportar todos los análisis como hojas de un solo lote_<id>.xlsx"),
 ):
     """Endpoint para exportar todos los análisis asociados a un lote específico. Retorna archivo ZIP."""
     request_id = getattr(request.state, "request_id", "unknown")
@@ -183,41 +275,18 @@ async def exportar_por_lote_id(
             raise HTTPException(status_code=500, detail=respuesta_error)
         
         # Exportar análisis del lote
-        try:
-            files_generated = exportar_por_lote(
-                request_id=request_id,
-                tmp_dir=tmp_dir,
-                lote_id=lote_id,
-                formato=formato
-            )
-            logger.info(f"[{request_id}] Se generaron {len(files_generated)} archivo(s) para lote {lote_id}")
-        except HTTPException:
-            if tmp_dir:
-                shutil.rmtree(tmp_dir, ignore_errors=True)
-            raise
-        
-        # Verificar que se generaron archivos
-        files_generated = [f for f in os.listdir(tmp_dir) if f.endswith(('.xlsx', '.csv'))]
-        if not files_generated:
-            respuesta_error = crear_respuesta_error(
-                mensaje="No se generaron archivos de exportación",
-                codigo=404,
-                detalles=f"No se encontraron análisis asociados al lote {lote_id}"
-            )
-            shutil.rmtree(tmp_dir, ignore_errors=True)
-            raise HTTPException(status_code=404, detail=respuesta_error)
+        exportador = crear_exportador_lote(request_id, lote_id, formato, libro_unico)
         
-        # Crear ZIP y obtener bytes
-        zip_bytes = crear_zip_exportacion(tmp_dir, request_id)
+        def _exportar(al_generar_archivo):
+            exportador(tmp_dir, al_generar_archivo)
         
-        logger.info(f"[{request_id}] Quick export completado exitosamente para lote {lote_id}. Tamaño del ZIP: {len(zip_bytes)} bytes, {len(files_generated)} archivo(s)")
+        # Esperar el primer archivo y armar el ZIP a medida que terminan los demás
+        # (exportar_por_lote responde 404 si el lote no tiene análisis)
+        contenido_zip = await run_in_threadpool(iniciar_exportacion_streaming, request_id, tmp_dir, _exportar)
         
-        # Limpiar archivos temporales
-        shutil.rmtree(tmp_dir, ignore_errors=True)
-        
-        # Devolver el archivo ZIP como respuesta binaria
-        return Response(
-            content=zip_bytes,
+        # tmp_dir se elimina cuando terminan el generador y la exportación
+        return StreamingResponse(
+            contenido_zip,
             media_type="application/zip",
             headers={"Content-Disposition": f"attachment; filename=lote_{lote_id}_export.zip"}
         )
@@ -238,3 +307,143 @@ async def exportar_por_lote_id(
         )
         raise HTTPException(status_code=500, detail=respuesta_error)
 
+
+@router.post("/exportar/lotes", tags=["Exportación"], summary="Exportar varios lotes",
+         description="Exporta los análisis de varios lotes en un solo ZIP, agrupados por carpeta o por hoja")
+async def exportar_lotes(
+    request: Request,
+    lote_ids: str = Query(description="Lista separada por comas de IDs de lote"),
+    formato: str = Query(default="xlsx", pattern="^(xlsx|csv|parquet|arrow)$"),
+    agrupar: str = Query(
+        default="carpetas", pattern="^(carpetas|hojas)$",
+        description="'carpetas': lote_<id>/<tabla>.<ext>; 'hojas' (solo xlsx): <tabla>.xlsx con una hoja por lote"
+    ),
+):
+    """Exporta los análisis de varios lotes con una consulta por tipo de análisis. Retorna archivo ZIP."""
+    request_id = getattr(request.state, "request_id", "unknown")
+    tmp_dir = None
+    try:
+        ids = parsear_lote_ids(lote_ids)
+        logger.info(f"[{request_id}] Iniciando exportación de {len(ids)} lote(s). Formato: {formato}, Agrupar: {agrupar}")
+        
+        validar_conexion_bd(request_id)
+        
+        try:
+            tmp_dir = tempfile.mkdtemp(prefix="inia_export_lotes_")
+        except Exception as dir_error:
+            respuesta_error = crear_respuesta_error(
+                mensaje="No se pudo crear directorio temporal",
+                codigo=500,
+                detalles=f"Error al crear directorio temporal: {str(dir_error)}"
+            )
+            raise HTTPException(status_code=500, detail=respuesta_error)
+        
+        def _exportar(al_generar_archivo):
+            files_generated = exportar_por_lotes(request_id, tmp_dir, ids, formato, agrupar, al_generar_archivo)
+            logger.info(f"[{request_id}] Se generaron {len(files_generated)} archivo(s) para {len(ids)} lote(s)")
+        
+        # Los archivos se agregan al ZIP con su carpeta relativa (lote_<id>/...)
+        contenido_zip = await run_in_threadpool(iniciar_exportacion_streaming, request_id, tmp_dir, _exportar)
+        
+        return StreamingResponse(
+            contenido_zip,
+            media_type="application/zip",
+            headers={"Content-Disposition": "attachment; filename=lotes_export.zip"}
+        )
+        
+    except HTTPException:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    except Exception as e:
+        logger.error(f"[{request_id}] Error inesperado durante exportación de lotes: {e}", exc_info=True)
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        respuesta_error = crear_respuesta_error(
+            mensaje="Error inesperado durante la exportación",
+            codigo=500,
+            detalles=str(e)
+        )
+        raise HTTPException(status_code=500, detail=respuesta_error)
+
+
+@router.post("/exportar/jobs", tags=["Exportación"], summary="Crear trabajo de exportación",
+         description="Encola una exportación de tablas (mismos parámetros que /exportar) y retorna el id del trabajo",
+         status_code=202)
+async def crear_trabajo_exportar(
+    request: Request,
+    tablas: str = Query(default="", description="Lista separada por comas de tablas a exportar"),
+    formato: str = Query(default="xlsx", pattern="^(xlsx|csv|parquet|arrow)$"),
+    incluir_sin_pk: bool = Query(default=True, description="Incluir tablas sin Primary Key"),
+    analisis_ids: Optional[str] = Query(
+        default=None,
+        description="IDs de análisis a exportar. Formato: 'tipo:id1,id2;tipo2:id3,id4'"
+    ),
+    fecha_desde: Optional[str] = Query(
+        default=None,
+        description="Fecha de inicio del rango (formato: YYYY-MM-DD)"
+    ),
+    fecha_hasta: Optional[str] = Query(
+        default=None,
+        description="Fecha de fin del rango (formato: YYYY-MM-DD)"
+    ),
+    campo_fecha: Optional[str] = Query(
+        default="auto",
+        description="Campo de fecha a usar para filtrado"
+    ),
+    libro_unico: bool = Query(
+        default=False,
+        description="Exportar todas las tablas como hojas de un solo export.xlsx (solo xlsx, sin filtros)"
+    ),
+):
+    """Crea un trabajo de exportación en segundo plano. Retorna su id para consultar el progreso."""
+    request_id = getattr(request.state, "request_id", "unknown")
+    if fecha_desde or fecha_hasta:
+        validar_fechas(fecha_desde, fecha_hasta)
+    validar_conexion_bd(request_id)
+    
+    exportador = crear_exportador_tablas(
+        request_id, tablas, formato, incluir_sin_pk,
+        analisis_ids, fecha_desde, fecha_hasta, campo_fecha, libro_unico
+    )
+    trabajo = crear_trabajo_exportacion(request_id, "export.zip", exportador)
+    return JSONResponse(
+        content=crear_respuesta_exito("Trabajo de exportación creado", trabajo),
+        status_code=202
+    )
+
+
+@router.post("/exportar-lote/{lote_id}/jobs", tags=["Exportación"], summary="Crear trabajo de exportación por lote",
+         description="Encola la exportación de todos los análisis de un lote y retorna el id del trabajo",
+         status_code=202)
+async def crear_trabajo_exportar_lote(
+    request: Request,
+    lote_id: int,
+    formato: str = Query(default="xlsx", pattern="^(xlsx|csv|parquet|arrow)$"),
+    libro_unico: bool = Query(default=False, description="Exportar todos los análisis como hojas de un solo lote_<id>.xlsx"),
+):
+    """Crea un trabajo de exportación por lote en segundo plano. Retorna su id para consultar el progreso."""
+    request_id = getattr(request.state, "request_id", "unknown")
+    validar_conexion_bd(request_id)
+    
+    exportador = crear_exportador_lote(request_id, lote_id, formato, libro_unico)
+    trabajo = crear_trabajo_exportacion(request_id, f"lote_{lote_id}_export.zip", exportador)
+    return JSONResponse(
+        content=crear_respuesta_exito("Trabajo de exportación creado", trabajo),
+        status_code=202
+    )
+
+
+@router.get("/exportar/jobs/{job_id}", tags=["Exportación"], summary="Estado de trabajo de exportación",
+         description="Retorna el estado y progreso (tablas completadas, filas escritas) de un trabajo de exportación")
+async def estado_trabajo_exportar(job_id: str):
+    """Retorna el progreso de un trabajo de exportación."""
+    return crear_respuesta_exito("Estado del trabajo de exportación", obtener_estado_trabajo(job_id))
+
+
+@router.get("/exportar/jobs/{job_id}/descarga", tags=["Exportación"], summary="Descargar resultado de exportación",
+         description="Descarga el ZIP de un trabajo de exportación completado (disponible hasta que expira)")
+async def descargar_trabajo_exportar(job_id: str):
+    """Descarga el ZIP generado por un trabajo de exportación completado."""
+    trabajo = obtener_archivo_trabajo(job_id)
+    return FileResponse(trabajo.zip_path, media_type="application/zip", filename=trabajo.nombre_zip)
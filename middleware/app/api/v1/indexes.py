@@ -0,0 +1,34 @@
+"""
+Endpoint del asesor de índices.
+"""
+import logging
+from fastapi import Request, APIRouter, Query
+from starlette.concurrency import run_in_threadpool
+from app.core.responses import crear_respuesta_exito
+from app.services.export_service import validar_conexion_bd
+from app.services.index_service import analizar_indices_bd
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.post("/indices/analizar", tags=["Índices"], summary="Analizar índices",
+          description="Ejecuta EXPLAIN (ANALYZE, BUFFERS) sobre las consultas de exportación e importación, "
+                      "reporta los seq scans y propone (u opcionalmente crea) los índices faltantes")
+async def analizar_indices(
+    request: Request,
+    origenes: str = Query(
+        default="",
+        description="Lista separada por comas: export_analisis_filtrados, export_analisis_por_lote, "
+                    "export_analisis_por_lotes, validar_foreign_keys (vacío = todas)"
+    ),
+    aplicar: bool = Query(
+        default=False,
+        description="Crear los índices propuestos y volver a medir (requiere INDEX_ADVISOR_ALLOW_APPLY)"
+    ),
+):
+    """Reporta tiempos, seq scans e índices propuestos para las consultas de exportación e importación."""
+    request_id = getattr(request.state, "request_id", "unknown")
+    validar_conexion_bd(request_id)
+    reporte = await run_in_threadpool(analizar_indices_bd, request_id, origenes, aplicar)
+    return crear_respuesta_exito("Análisis de índices completado", reporte)
@@ -3,7 +3,7 @@ Router principal de la API v1.
 Incluye todos los endpoints de la versión 1.
 """
 from fastapi import APIRouter
-from app.api.v1 import health, insert, export, analyze
+from app.api.v1 import health, insert, export, analyze, data, indexes
 import importlib
 
 # Importar el módulo 'import' usando importlib porque 'import' es palabra reservada
@@ -17,4 +17,6 @@ api_router.include_router(insert.router, tags=["Inserción"])
 api_router.include_router(export.router, tags=["Exportación"])
 api_router.include_router(import_module.router, tags=["Importación"])
 api_router.include_router(analyze.router, tags=["Análisis"])
+api_router.include_router(data.router, tags=["Datos"])
+api_router.include_router(indexes.router, tags=["Índices"])
 
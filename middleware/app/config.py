@@ -3,6 +3,7 @@ Configuración centralizada del middleware.
 Contiene todas las constantes y configuraciones del servidor.
 """
 import os
+import tempfile
 
 # Límites de recursos para prevenir colapso
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 100 * 1024 * 1024))  # 100 MB por defecto
@@ -23,6 +24,31 @@ DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))  # 10 conexiones en el pool
 DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))  # 20 conexiones adicionales si se necesitan
 DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))  # Reciclar conexiones cada hora
 
+# Configuración de exportación en streaming
+EXPORT_ZIP_CHUNK_SIZE = int(os.getenv("EXPORT_ZIP_CHUNK_SIZE", 1024 * 1024))  # Bloques de 1 MB hacia el ZIP
+
+# Configuración de trabajos de exportación asíncronos
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", 2))  # Exportaciones en segundo plano simultáneas
+EXPORT_JOB_TTL = int(os.getenv("EXPORT_JOB_TTL", 3600))  # Segundos que se conserva el resultado tras terminar
+EXPORT_JOB_MAX_DURATION = int(os.getenv("EXPORT_JOB_MAX_DURATION", 21600))  # Sin terminar tras esto, el trabajo se da por perdido
+EXPORT_JOB_DIR = os.getenv("EXPORT_JOB_DIR", os.path.join(tempfile.gettempdir(), "inia_export_jobs"))  # Compartido por los workers
+
+# Configuración de exportación de varios lotes (/exportar/lotes)
+EXPORT_MAX_LOTES = int(os.getenv("EXPORT_MAX_LOTES", 500))  # Máximo de lotes por pedido
+
+# Configuración de caché de exportaciones (ZIP por parámetros + versión de los datos)
+EXPORT_CACHE_ENABLED = os.getenv("EXPORT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "inia_export_cache"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", 1024 * 1024 * 1024))  # 1 GB en disco
+EXPORT_CACHE_TTL = int(os.getenv("EXPORT_CACHE_TTL", 300))  # Segundos que se sirve un ZIP desde que se generó
+
+# Configuración de lectura de datos por streaming (/datos/{tabla})
+DATOS_PAGE_SIZE = int(os.getenv("DATOS_PAGE_SIZE", 1000))  # Filas por página keyset
+DATOS_MAX_PAGE_SIZE = int(os.getenv("DATOS_MAX_PAGE_SIZE", 10000))  # Máximo permitido por request
+
+# Asesor de índices (/indices/analizar)
+INDEX_ADVISOR_ALLOW_APPLY = os.getenv("INDEX_ADVISOR_ALLOW_APPLY", "false").lower() in ("1", "true", "yes")  # Permitir crear índices desde la API
+
 # Límites para mensajes de error (prevenir respuestas gigantes)
 MAX_ERROR_MESSAGE_LENGTH = 500  # Máximo 500 caracteres para mensajes
 MAX_ERROR_DETAILS_LENGTH = 1000  # Máximo 1000 caracteres para detalles
@@ -2,7 +2,7 @@
 Dependencias compartidas para inyección de dependencias.
 """
 from concurrent.futures import ThreadPoolExecutor
-from app.config import THREAD_POOL_WORKERS
+from app.config import THREAD_POOL_WORKERS, EXPORT_JOB_WORKERS
 
 # ThreadPoolExecutor global para operaciones pesadas
 GLOBAL_THREAD_POOL = ThreadPoolExecutor(
@@ -10,3 +10,10 @@ GLOBAL_THREAD_POOL = ThreadPoolExecutor(
     thread_name_prefix="inia-worker"
 )
 
+
+# ThreadPoolExecutor dedicado a trabajos de exportación asíncronos
+# (exportaciones largas no ocupan los workers de importación/análisis)
+EXPORT_JOBS_POOL = ThreadPoolExecutor(
+    max_workers=EXPORT_JOB_WORKERS,
+    thread_name_prefix="inia-export-job"
+)
@@ -48,7 +48,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["X-Request-ID", "X-Process-Time"]
+    expose_headers=["X-Request-ID", "X-Process-Time", "X-Export-Watermark", "X-Export-Cache", "X-Keyset-Column"]
 )
 
 # Middleware de compresión GZip
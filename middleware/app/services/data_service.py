@@ -0,0 +1,184 @@
+"""
+Servicio de lectura de datos por streaming.
+Entrega las filas de una tabla como NDJSON usando paginación keyset sobre la PK,
+con los mismos filtros de activos y fechas que la exportación de análisis.
+Solo se exponen las tablas que exporta /exportar por defecto (análisis, lote y recibo).
+"""
+import re
+import json
+import uuid
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Optional, Dict, Any, Iterator
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from ExportExcel import (
+    obtener_engine_paralelo,
+    obtener_pk_numerica,
+    verificar_estructura_tabla,
+    obtener_campo_fecha_analisis,
+    COLUMNA_ACTIVO_POR_TIPO
+)
+from app.core.responses import crear_respuesta_error
+from app.services.export_service import validar_fechas
+
+logger = logging.getLogger(__name__)
+
+# Tablas legibles por /datos: las que exportar_tradicional exporta por defecto
+TABLAS_DATOS = frozenset(COLUMNA_ACTIVO_POR_TIPO) | {'lote', 'recibo'}
+
+# Columnas que nunca se entregan aunque la tabla esté permitida
+PATRON_COLUMNA_SENSIBLE = re.compile(r"pass|contrase|secret|token", re.IGNORECASE)
+
+
+def serializar_valor_json(value):
+    """
+    Convierte los tipos que devuelve psycopg2 a valores JSON (fechas en ISO 8601).
+    numeric se entrega como texto exacto ("12.50") para leerlo como BigDecimal sin redondeo.
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return str(value)
+
+
+def preparar_consulta_datos(
+    request_id: str,
+    tabla: str,
+    solo_activos: bool,
+    fecha_desde: Optional[str],
+    fecha_hasta: Optional[str],
+    campo_fecha: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Valida la tabla y arma la consulta keyset (columnas, PK y filtros).
+    Lanza HTTPException 404 si la tabla no está en TABLAS_DATOS o no existe, y 400 si
+    no tiene una PK entera simple. Las columnas sensibles (contraseñas, tokens) se omiten.
+    """
+    tabla = tabla.lower()
+    if tabla not in TABLAS_DATOS:
+        respuesta_error = crear_respuesta_error(
+            mensaje="Tabla no encontrada",
+            codigo=404,
+            detalles=f"La tabla '{tabla}' no está disponible para lectura"
+        )
+        raise HTTPException(status_code=404, detail=respuesta_error)
+
+    fecha_desde_obj, fecha_hasta_obj = validar_fechas(fecha_desde, fecha_hasta)
+
+    Session = sessionmaker(bind=obtener_engine_paralelo())
+    session = Session()
+    try:
+        columnas = verificar_estructura_tabla(session, tabla)
+        if not columnas:
+            respuesta_error = crear_respuesta_error(
+                mensaje="Tabla no encontrada",
+                codigo=404,
+                detalles=f"La tabla '{tabla}' no existe"
+            )
+            raise HTTPException(status_code=404, detail=respuesta_error)
+
+        pk = obtener_pk_numerica(session, tabla)
+        if not pk:
+            respuesta_error = crear_respuesta_error(
+                mensaje="Tabla sin PK compatible",
+                codigo=400,
+                detalles=f"La tabla '{tabla}' no tiene una PK entera de una sola columna para paginar"
+            )
+            raise HTTPException(status_code=400, detail=respuesta_error)
+    finally:
+        session.close()
+
+    columnas = [columna for columna in columnas if columna == pk or not PATRON_COLUMNA_SENSIBLE.search(columna)]
+
+    condiciones = []
+    params = {}
+
+    # Mismos filtros que export_analisis_filtrados: activos y rango de fechas del análisis
+    activo_col = COLUMNA_ACTIVO_POR_TIPO.get(tabla)
+    if solo_activos and activo_col and activo_col in columnas:
+        condiciones.append(f"{activo_col} = true")
+
+    campo_fecha_analisis = obtener_campo_fecha_analisis(tabla, campo_fecha if campo_fecha != "auto" else None)
+    if campo_fecha_analisis and campo_fecha_analisis in columnas:
+        if fecha_desde_obj:
+            condiciones.append(f"{campo_fecha_analisis} >= :fecha_desde")
+            params['fecha_desde'] = fecha_desde_obj
+        if fecha_hasta_obj:
+            condiciones.append(f"{campo_fecha_analisis} <= :fecha_hasta")
+            params['fecha_hasta'] = fecha_hasta_obj
+    elif fecha_desde_obj or fecha_hasta_obj:
+        logger.warning(f"[{request_id}] La tabla {tabla} no tiene campo de fecha de análisis, se ignora el rango")
+
+    logger.info(f"[{request_id}] Streaming de {tabla} por {pk} con filtros: {condiciones or 'ninguno'}")
+    return {
+        'tabla': tabla,
+        'columnas': columnas,
+        'pk': pk,
+        'condiciones': condiciones,
+        'params': params,
+    }
+
+
+def generar_filas_ndjson(
+    request_id: str,
+    consulta: Dict[str, Any],
+    desde_id: Optional[int],
+    tamano_pagina: int,
+    max_filas: Optional[int] = None
+) -> Iterator[bytes]:
+    """
+    Recorre la tabla por páginas `WHERE pk > :ultimo ORDER BY pk LIMIT n` y entrega
+    una línea JSON por fila. Cada página es una consulta corta que usa el índice de la PK,
+    así que el cliente puede cortar y retomar desde el último id recibido.
+    """
+    tabla = consulta['tabla']
+    columnas = consulta['columnas']
+    pk = consulta['pk']
+    idx_pk = columnas.index(pk)
+
+    condiciones = list(consulta['condiciones']) + [f"{pk} > :ultimo_id"]
+    query = text(
+        f"SELECT {', '.join(columnas)} FROM {tabla} "
+        f"WHERE {' AND '.join(condiciones)} "
+        f"ORDER BY {pk} LIMIT :limite"
+    )
+
+    Session = sessionmaker(bind=obtener_engine_paralelo())
+    session = Session()
+    ultimo_id = desde_id
+    total = 0
+    try:
+        while max_filas is None or total < max_filas:
+            limite = tamano_pagina if max_filas is None else min(tamano_pagina, max_filas - total)
+            params = dict(consulta['params'])
+            params['ultimo_id'] = ultimo_id if ultimo_id is not None else -(2 ** 63)
+            params['limite'] = limite
+            filas = session.execute(query, params).fetchall()
+            # Cerrar la transacción entre páginas: no retener snapshot ni conexión ociosa en transacción
+            session.rollback()
+            if not filas:
+                break
+            lineas = [
+                json.dumps(dict(zip(columnas, fila)), ensure_ascii=False, default=serializar_valor_json)
+                for fila in filas
+            ]
+            yield ("\n".join(lineas) + "\n").encode("utf-8")
+            total += len(filas)
+            ultimo_id = filas[-1][idx_pk]
+            if len(filas) < limite:
+                break
+        logger.info(f"[{request_id}] Streaming de {tabla} completado: {total} fila(s), último {pk}: {ultimo_id}")
+    except Exception as e:
+        # La respuesta ya comenzó: informar el corte en una última línea para que el cliente pueda retomar
+        logger.error(f"[{request_id}] Error durante streaming de {tabla}: {e}", exc_info=True)
+        yield (json.dumps({"_error": "Streaming interrumpido", "_ultimo_id": ultimo_id}) + "\n").encode("utf-8")
+    finally:
+        session.close()
@@ -0,0 +1,174 @@
+"""
+Caché en disco de exportaciones.
+Guarda el ZIP de cada exportación bajo una clave formada por los parámetros del pedido
+y una huella de la versión de los datos; los pedidos repetidos sin cambios en la base
+se sirven directamente desde disco. El tamaño total se acota con expulsión LRU y cada
+ZIP se sirve como mucho EXPORT_CACHE_TTL segundos desde que se generó.
+"""
+import os
+import json
+import uuid
+import hashlib
+import logging
+import time
+import threading
+from typing import Optional, List, Dict, Any
+from sqlalchemy import text
+from ExportExcel import obtener_engine_paralelo
+from app.config import EXPORT_CACHE_ENABLED, EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES, EXPORT_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+_CACHE_LOCK = threading.Lock()
+
+
+def obtener_huella_datos(tablas: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Retorna una huella de la versión de los datos según pg_stat_user_tables.
+
+    Los contadores n_tup_ins/n_tup_upd/n_tup_del cambian con cada escritura, así que
+    la huella cambia si se modificó alguna de las tablas (o cualquier tabla, si no se
+    indican). Las estadísticas se publican de forma asíncrona tras cada commit, así que
+    no son una versión transaccional: un pedido justo después de un commit puede calcular
+    la huella anterior. Por eso las entradas vencen a los EXPORT_CACHE_TTL segundos.
+    Retorna None si no se pudo consultar (en ese caso no se usa la caché).
+    """
+    query = (
+        "SELECT relid, relname, n_tup_ins, n_tup_upd, n_tup_del "
+        "FROM pg_stat_user_tables"
+    )
+    params = {}
+    if tablas:
+        query += " WHERE relname = ANY(:tablas)"
+        params["tablas"] = list(tablas)
+    query += " ORDER BY relid"
+    try:
+        with obtener_engine_paralelo().connect() as conn:
+            filas = conn.execute(text(query), params).fetchall()
+    except Exception as e:
+        logger.warning(f"No se pudo calcular la huella de datos para la caché de exportación: {e}")
+        return None
+    huella = hashlib.sha256()
+    for fila in filas:
+        huella.update(("|".join(str(valor) for valor in fila) + "\n").encode("utf-8"))
+    return huella.hexdigest()
+
+
+def calcular_clave_cache(parametros: Dict[str, Any], huella: str) -> str:
+    """Clave de caché para los parámetros de una exportación y la huella de los datos."""
+    contenido = json.dumps({"parametros": parametros, "huella": huella}, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _ruta_cache(clave: str) -> str:
+    return os.path.join(EXPORT_CACHE_DIR, f"{clave}.zip")
+
+
+def obtener_de_cache(clave: str) -> Optional[str]:
+    """
+    Retorna la ruta del ZIP en caché o None si no está o venció.
+    El mtime del archivo es el momento en que se generó (para el TTL) y el atime el
+    último uso (para la expulsión LRU).
+    """
+    ruta = _ruta_cache(clave)
+    ahora = time.time()
+    try:
+        generado = os.stat(ruta).st_mtime
+        if ahora - generado > EXPORT_CACHE_TTL:
+            os.remove(ruta)
+            logger.info(f"Caché de exportación: vencido {os.path.basename(ruta)}")
+            return None
+        os.utime(ruta, (ahora, generado))
+    except FileNotFoundError:
+        return None
+    return ruta
+
+
+def expulsar_cache(max_bytes: int = EXPORT_CACHE_MAX_BYTES):
+    """Elimina los ZIP vencidos y los usados hace más tiempo hasta que la caché entre en max_bytes."""
+    with _CACHE_LOCK:
+        entradas = []
+        total = 0
+        ahora = time.time()
+        for nombre in os.listdir(EXPORT_CACHE_DIR):
+            if not nombre.endswith(".zip"):
+                continue
+            ruta = os.path.join(EXPORT_CACHE_DIR, nombre)
+            try:
+                info = os.stat(ruta)
+                if ahora - info.st_mtime > EXPORT_CACHE_TTL:
+                    os.remove(ruta)
+                    continue
+            except FileNotFoundError:
+                continue
+            entradas.append((info.st_atime, info.st_size, ruta))
+            total += info.st_size
+        entradas.sort()
+        for _, tamano, ruta in entradas:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+                logger.info(f"Caché de exportación: expulsado {os.path.basename(ruta)} ({tamano} bytes)")
+            except FileNotFoundError:
+                pass
+
+
+class EscrituraCache:
+    """
+    Copia en disco de un ZIP que se está enviando en streaming.
+    Solo queda en la caché si se confirma (exportación completa); si no, se descarta.
+    """
+
+    def __init__(self, clave: str):
+        self.clave = clave
+        self.ruta_tmp = os.path.join(EXPORT_CACHE_DIR, f".{clave}.{uuid.uuid4().hex}.tmp")
+        self._archivo = open(self.ruta_tmp, "wb")
+
+    def write(self, datos: bytes):
+        self._archivo.write(datos)
+
+    def confirmar(self):
+        """Publica el ZIP en la caché y aplica el límite de tamaño."""
+        if self._archivo.closed:
+            return
+        self._archivo.close()
+        # mtime y atime quedan en el momento de la publicación (inicio del TTL y del LRU)
+        os.utime(self.ruta_tmp)
+        os.replace(self.ruta_tmp, _ruta_cache(self.clave))
+        expulsar_cache()
+
+    def descartar(self):
+        """Elimina la copia si no se confirmó."""
+        if self._archivo.closed:
+            return
+        self._archivo.close()
+        try:
+            os.remove(self.ruta_tmp)
+        except FileNotFoundError:
+            pass
+
+
+def iniciar_escritura_cache(clave: str) -> Optional[EscrituraCache]:
+    """Abre una copia para guardar en caché el ZIP de la clave; None si no se puede escribir."""
+    try:
+        os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+        return EscrituraCache(clave)
+    except OSError as e:
+        logger.warning(f"No se pudo abrir la caché de exportación en {EXPORT_CACHE_DIR}: {e}")
+        return None
+
+
+def resolver_clave_cache(parametros: Dict[str, Any]) -> Optional[str]:
+    """
+    Clave de caché para un pedido, o None si la caché está deshabilitada o sin huella.
+    La huella cubre todas las tablas: la exportación también incluye tablas vinculadas
+    y tablas sin PK que no figuran en los parámetros.
+    """
+    if not EXPORT_CACHE_ENABLED:
+        return None
+    huella = obtener_huella_datos()
+    if huella is None:
+        return None
+    return calcular_clave_cache(parametros, huella)
@@ -0,0 +1,265 @@
+"""
+Servicio de trabajos de exportación asíncronos.
+El POST crea un trabajo y retorna su id; la exportación corre en un pool dedicado,
+su estado se consulta por id y el ZIP resultante se descarga hasta que expira.
+
+El estado de cada trabajo se guarda en EXPORT_JOB_DIR/<job_id>/trabajo.json junto al ZIP,
+así cualquier worker de Uvicorn puede responder la consulta o la descarga; el proceso que
+ejecuta el trabajo además lo sigue en memoria para informar las filas escritas al instante.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import zipfile
+import logging
+import threading
+from typing import Optional, Callable, Dict, Any
+from fastapi import HTTPException
+from ExportExcel import ProgresoExportacion, PROGRESO_EXPORTACION
+from app.core.responses import crear_respuesta_error, obtener_mensaje_error_seguro
+from app.config import EXPORT_JOB_TTL, EXPORT_JOB_DIR, EXPORT_JOB_MAX_DURATION
+from app.dependencies import EXPORT_JOBS_POOL
+
+logger = logging.getLogger(__name__)
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_EN_PROCESO = "en_proceso"
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+
+ARCHIVO_ESTADO_TRABAJO = "trabajo.json"
+PATRON_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class TrabajoExportacion:
+    """Estado de un trabajo de exportación y ubicación de su resultado."""
+
+    def __init__(self, job_id: str, request_id: str, nombre_zip: str, job_dir: str):
+        self.job_id = job_id
+        self.request_id = request_id
+        self.nombre_zip = nombre_zip
+        self.job_dir = job_dir
+        self.zip_path = os.path.join(job_dir, nombre_zip)
+        self.estado = ESTADO_PENDIENTE
+        self.progreso = ProgresoExportacion()
+        self.archivos = []
+        self.tablas = set()
+        self.error = None
+        self.creado = time.time()
+        self.finalizado = None
+
+    def expirado(self, ahora: float) -> bool:
+        """Los trabajos terminados expiran EXPORT_JOB_TTL segundos después de finalizar."""
+        return self.finalizado is not None and ahora - self.finalizado > EXPORT_JOB_TTL
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "estado": self.estado,
+            "tablas_completadas": len(self.tablas),
+            "archivos_generados": len(self.archivos),
+            "filas_escritas": self.progreso.filas,
+            "creado": self.creado,
+            "finalizado": self.finalizado,
+            "expira": self.finalizado + EXPORT_JOB_TTL if self.finalizado is not None else None,
+            "error": self.error,
+        }
+
+    def guardar(self):
+        """Publica el estado en job_dir/trabajo.json (reemplazo atómico) para todos los workers."""
+        datos = self.a_dict()
+        datos.update({
+            "request_id": self.request_id,
+            "nombre_zip": self.nombre_zip,
+            "archivos": list(self.archivos),
+            "tablas": sorted(self.tablas),
+        })
+        ruta = os.path.join(self.job_dir, ARCHIVO_ESTADO_TRABAJO)
+        ruta_tmp = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, default=str)
+        os.replace(ruta_tmp, ruta)
+
+    @classmethod
+    def cargar(cls, job_dir: str) -> Optional["TrabajoExportacion"]:
+        """
+        Lee el trabajo guardado en job_dir, o None si no existe. Si sigue sin terminar
+        EXPORT_JOB_MAX_DURATION segundos después de creado se informa como error (y expira).
+        """
+        try:
+            with open(os.path.join(job_dir, ARCHIVO_ESTADO_TRABAJO), "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        trabajo = cls(datos["job_id"], datos["request_id"], datos["nombre_zip"], job_dir)
+        trabajo.estado = datos["estado"]
+        trabajo.progreso.sumar_filas(datos["filas_escritas"])
+        trabajo.archivos = datos["archivos"]
+        trabajo.tablas = set(datos["tablas"])
+        trabajo.error = datos["error"]
+        trabajo.creado = datos["creado"]
+        trabajo.finalizado = datos["finalizado"]
+        if trabajo.finalizado is None and time.time() - trabajo.creado > EXPORT_JOB_MAX_DURATION:
+            # El worker que lo ejecutaba se detuvo o reinició: no va a terminar nunca
+            trabajo.estado = ESTADO_ERROR
+            trabajo.error = crear_respuesta_error(
+                mensaje="El trabajo de exportación no terminó",
+                codigo=500,
+                detalles=f"Sin terminar {EXPORT_JOB_MAX_DURATION} segundos después de creado; "
+                         f"el proceso que lo ejecutaba se detuvo"
+            )
+            trabajo.finalizado = trabajo.creado + EXPORT_JOB_MAX_DURATION
+        return trabajo
+
+
+# Trabajos que se están ejecutando en este proceso (progreso en vivo)
+_TRABAJOS: Dict[str, TrabajoExportacion] = {}
+_TRABAJOS_LOCK = threading.Lock()
+
+
+def nombre_tabla_archivo(arcname: str) -> str:
+    """Nombre de la tabla de un archivo exportado (sin extensión ni sufijo _partN)."""
+    base = os.path.splitext(os.path.basename(arcname))[0]
+    prefijo, separador, numero = base.rpartition("_part")
+    return prefijo if separador and numero.isdigit() else base
+
+
+def _directorio_trabajo(job_id: str) -> str:
+    return os.path.join(EXPORT_JOB_DIR, job_id)
+
+
+def limpiar_trabajos_expirados():
+    """Elimina los trabajos vencidos (de cualquier worker) y sus archivos."""
+    ahora = time.time()
+    try:
+        nombres = os.listdir(EXPORT_JOB_DIR)
+    except FileNotFoundError:
+        return
+    for nombre in nombres:
+        if not PATRON_JOB_ID.match(nombre):
+            continue
+        trabajo = TrabajoExportacion.cargar(_directorio_trabajo(nombre))
+        if trabajo is None or not trabajo.expirado(ahora):
+            continue
+        shutil.rmtree(trabajo.job_dir, ignore_errors=True)
+        logger.info(f"[{trabajo.request_id}] Trabajo de exportación {trabajo.job_id} expirado y eliminado")
+
+
+def _ejecutar_trabajo(trabajo: TrabajoExportacion, exportar: Callable[[str, Callable[[str], None]], object]):
+    """Corre la exportación y agrega cada archivo al ZIP del trabajo apenas se genera."""
+    trabajo.estado = ESTADO_EN_PROCESO
+    trabajo.guardar()
+    tmp_dir = os.path.join(trabajo.job_dir, "archivos")
+    os.makedirs(tmp_dir, exist_ok=True)
+    # Los threads del pool se reutilizan: restaurar el contexto al terminar
+    token = PROGRESO_EXPORTACION.set(trabajo.progreso)
+    try:
+        with zipfile.ZipFile(trabajo.zip_path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            def _agregar_archivo(ruta: str):
+                arcname = os.path.relpath(ruta, tmp_dir)
+                zf.write(ruta, arcname)
+                os.remove(ruta)
+                trabajo.archivos.append(arcname)
+                trabajo.tablas.add(nombre_tabla_archivo(arcname))
+                trabajo.guardar()
+
+            exportar(tmp_dir, _agregar_archivo)
+
+        if not trabajo.archivos:
+            raise HTTPException(status_code=500, detail=crear_respuesta_error(
+                mensaje="No se generaron archivos de exportación",
+                codigo=500,
+                detalles="No se generaron archivos en el directorio temporal"
+            ))
+        trabajo.estado = ESTADO_COMPLETADO
+        logger.info(f"[{trabajo.request_id}] Trabajo {trabajo.job_id} completado: "
+                    f"{len(trabajo.archivos)} archivo(s), {trabajo.progreso.filas} filas")
+    except HTTPException as e:
+        trabajo.estado = ESTADO_ERROR
+        trabajo.error = e.detail
+        logger.warning(f"[{trabajo.request_id}] Trabajo {trabajo.job_id} terminó con error: {e.detail}")
+    except Exception as e:
+        trabajo.estado = ESTADO_ERROR
+        trabajo.error = crear_respuesta_error(
+            mensaje="Error durante la exportación",
+            codigo=500,
+            detalles=obtener_mensaje_error_seguro(e, "Error durante la exportación")
+        )
+        logger.error(f"[{trabajo.request_id}] Error en trabajo {trabajo.job_id}: {e}", exc_info=True)
+    finally:
+        PROGRESO_EXPORTACION.reset(token)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if trabajo.estado == ESTADO_ERROR and os.path.exists(trabajo.zip_path):
+            os.remove(trabajo.zip_path)
+        trabajo.finalizado = time.time()
+        trabajo.guardar()
+        with _TRABAJOS_LOCK:
+            _TRABAJOS.pop(trabajo.job_id, None)
+
+
+def crear_trabajo_exportacion(
+    request_id: str,
+    nombre_zip: str,
+    exportar: Callable[[str, Callable[[str], None]], object]
+) -> Dict[str, Any]:
+    """
+    Registra un trabajo y lo encola en el pool de exportaciones.
+
+    `exportar(tmp_dir, al_generar_archivo)` debe escribir los archivos en tmp_dir
+    e invocar el callback con la ruta de cada uno al terminarlo.
+    Retorna el estado inicial del trabajo.
+    """
+    limpiar_trabajos_expirados()
+    job_id = uuid.uuid4().hex
+    job_dir = _directorio_trabajo(job_id)
+    os.makedirs(job_dir)
+    trabajo = TrabajoExportacion(job_id, request_id, nombre_zip, job_dir)
+    trabajo.guardar()
+    with _TRABAJOS_LOCK:
+        _TRABAJOS[job_id] = trabajo
+    EXPORT_JOBS_POOL.submit(_ejecutar_trabajo, trabajo, exportar)
+    logger.info(f"[{request_id}] Trabajo de exportación {job_id} encolado")
+    return trabajo.a_dict()
+
+
+def obtener_trabajo(job_id: str) -> TrabajoExportacion:
+    """
+    Retorna el trabajo o lanza 404 si no existe o ya expiró. Si corre en este proceso se usa
+    el de memoria (filas al instante); si no, el estado guardado por el worker que lo ejecuta.
+    """
+    limpiar_trabajos_expirados()
+    trabajo = None
+    if PATRON_JOB_ID.match(job_id):
+        with _TRABAJOS_LOCK:
+            trabajo = _TRABAJOS.get(job_id)
+        if trabajo is None:
+            trabajo = TrabajoExportacion.cargar(_directorio_trabajo(job_id))
+    if trabajo is None:
+        respuesta_error = crear_respuesta_error(
+            mensaje="Trabajo de exportación no encontrado",
+            codigo=404,
+            detalles=f"El trabajo {job_id} no existe o ya expiró"
+        )
+        raise HTTPException(status_code=404, detail=respuesta_error)
+    return trabajo
+
+
+def obtener_estado_trabajo(job_id: str) -> Dict[str, Any]:
+    """Retorna el progreso del trabajo (tablas completadas, filas escritas, estado)."""
+    return obtener_trabajo(job_id).a_dict()
+
+
+def obtener_archivo_trabajo(job_id: str) -> TrabajoExportacion:
+    """Retorna el trabajo si su ZIP está listo para descargar; si no, lanza 409."""
+    trabajo = obtener_trabajo(job_id)
+    if trabajo.estado != ESTADO_COMPLETADO:
+        respuesta_error = crear_respuesta_error(
+            mensaje="El trabajo de exportación no está listo",
+            codigo=409,
+            detalles=f"Estado actual: {trabajo.estado}"
+        )
+        raise HTTPException(status_code=409, detail=respuesta_error)
+    return trabajo
@@ -2,27 +2,38 @@
 Servicio de exportación de datos.
 Maneja la lógica de exportación de tablas y análisis filtrados.
 """
+import io
 import os
+import queue
 import shutil
 import tempfile
+import threading
 import zipfile
 import logging
+import traceback
 from datetime import datetime as dt
-from typing import Optional, List
+from typing import Optional, List, Callable, Iterator, Any
 from fastapi import HTTPException
 from sqlalchemy.orm import sessionmaker
 from ExportExcel import (
     export_selected_tables,
     export_analisis_filtrados,
     export_analisis_por_lote,
+    export_analisis_por_lotes,
     parsear_analisis_ids,
+    parsear_watermark,
+    obtener_watermark_actual,
     obtener_engine,
     inicializar_automap,
+    TABLAS_FALLIDAS_EXPORTACION,
     MODELS
 )
 from app.core.responses import crear_respuesta_error, obtener_mensaje_error_seguro
 from app.core.security import db_circuit_breaker
+from app.config import EXPORT_ZIP_CHUNK_SIZE, EXPORT_MAX_LOTES
+from app.dependencies import GLOBAL_THREAD_POOL
 from database_config import build_connection_string
+from trace_common import TRAZA
 from sqlalchemy import create_engine, text
 
 logger = logging.getLogger(__name__)
@@ -99,6 +110,57 @@ def validar_conexion_bd(request_id: str):
         raise HTTPException(status_code=500, detail=respuesta_error)
 
 
+def resolver_tipos_analisis(analisis_ids_dict: Optional[dict], tablas: str) -> List[str]:
+    """Determina los tipos de análisis a exportar según los IDs, las tablas o todos los disponibles."""
+    if analisis_ids_dict:
+        return list(analisis_ids_dict.keys())
+    if tablas:
+        return [t.strip().lower() for t in tablas.split(",") if t.strip()]
+    # Si no se especifica, usar todos los tipos disponibles
+    tipos_analisis = ['dosn', 'pureza', 'germinacion', 'pms', 'sanitario', 'tetrazolio', 'pureza_pnotatum']
+    # Filtrar solo los que existen en MODELS
+    return [t for t in tipos_analisis if t in MODELS or f"{t}_id" in str(MODELS)]
+
+
+def calcular_watermark_exportacion(
+    request_id: str,
+    desde_watermark: str,
+    analisis_ids: Optional[str],
+    tablas: str,
+    campo_fecha: str
+) -> str:
+    """
+    Valida el watermark recibido y calcula el de la próxima exportación incremental.
+    Se llama antes de exportar, así ninguna fila escrita durante la exportación queda afuera.
+    Lanza HTTPException 400 si el watermark no es válido.
+    """
+    try:
+        watermark = parsear_watermark(desde_watermark)
+    except ValueError as e:
+        respuesta_error = crear_respuesta_error(
+            mensaje="Watermark inválido",
+            codigo=400,
+            detalles=str(e)
+        )
+        raise HTTPException(status_code=400, detail=respuesta_error)
+    
+    engine = obtener_engine()
+    inicializar_automap(engine)
+    analisis_ids_dict = parsear_analisis_ids(analisis_ids) if analisis_ids else None
+    tipos_analisis = resolver_tipos_analisis(analisis_ids_dict, tablas)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    try:
+        nuevo_watermark = obtener_watermark_actual(
+            session, watermark, tipos_analisis,
+            campo_fecha if campo_fecha != "auto" else None
+        )
+    finally:
+        session.close()
+    logger.info(f"[{request_id}] Exportación incremental desde {desde_watermark}, próximo watermark: {nuevo_watermark}")
+    return nuevo_watermark
+
+
 def exportar_con_filtros(
     request_id: str,
     tmp_dir: str,
@@ -107,10 +169,12 @@ def exportar_con_filtros(
     fecha_hasta: Optional[str],
     campo_fecha: str,
     formato: str,
-    tablas: str
+    tablas: str,
+    al_generar_archivo: Optional[Callable[[str], None]] = None,
+    desde_watermark: Optional[str] = None
 ) -> List[str]:
     """
-    Exporta análisis con filtros (IDs y/o fechas).
+    Exporta análisis con filtros (IDs, fechas y/o watermark incremental).
     Retorna lista de archivos generados.
     """
     # Parsear IDs de análisis si se proporcionan
@@ -123,15 +187,7 @@ def exportar_con_filtros(
     fecha_desde_obj, fecha_hasta_obj = validar_fechas(fecha_desde, fecha_hasta)
     
     # Determinar tipos de análisis a exportar
-    if analisis_ids_dict:
-        tipos_analisis = list(analisis_ids_dict.keys())
-    elif tablas:
-        tipos_analisis = [t.strip().lower() for t in tablas.split(",") if t.strip()]
-    else:
-        # Si no se especifica, usar todos los tipos disponibles
-        tipos_analisis = ['dosn', 'pureza', 'germinacion', 'pms', 'sanitario', 'tetrazolio', 'pureza_pnotatum']
-        # Filtrar solo los que existen en MODELS
-        tipos_analisis = [t for t in tipos_analisis if t in MODELS or f"{t}_id" in str(MODELS)]
+    tipos_analisis = resolver_tipos_analisis(analisis_ids_dict, tablas)
     
     logger.info(f"[{request_id}] Exportando análisis con filtros. Tipos: {tipos_analisis}")
     
@@ -151,7 +207,9 @@ def exportar_con_filtros(
             fecha_hasta=fecha_hasta_obj,
             campo_fecha=campo_fecha if campo_fecha != "auto" else None,
             output_dir=tmp_dir,
-            fmt=formato
+            fmt=formato,
+            al_generar_archivo=al_generar_archivo,
+            desde_watermark=desde_watermark
         )
         
         if not archivos_generados:
@@ -172,7 +230,9 @@ def exportar_tradicional(
     tmp_dir: str,
     tablas: str,
     formato: str,
-    incluir_sin_pk: bool
+    incluir_sin_pk: bool,
+    al_generar_archivo: Optional[Callable[[str], None]] = None,
+    libro_unico: bool = False
 ) -> List[str]:
     """
     Exporta tablas de forma tradicional (sin filtros).
@@ -215,9 +275,20 @@ def exportar_tradicional(
         tablas_list = [t for t in tablas_list if t.lower() != 'certificado']
         logger.info(f"[{request_id}] Exportando {len(tablas_list)} tabla(s) especificada(s): {', '.join(tablas_list)}")
     
+    # Registrar los archivos a medida que se generan (en streaming pueden dejar
+    # tmp_dir apenas se agregan al ZIP, así que no se puede listar el directorio al final)
+    files_generated = []
+    
+    def _registrar_archivo(ruta: str):
+        files_generated.append(os.path.basename(ruta))
+        if al_generar_archivo:
+            al_generar_archivo(ruta)
+    
     # Ejecutar exportación (incluyendo tablas sin PK por defecto)
     try:
-        export_selected_tables(tablas_list, tmp_dir, formato, incluir_sin_pk=incluir_sin_pk)
+        export_selected_tables(tablas_list, tmp_dir, formato, incluir_sin_pk=incluir_sin_pk,
+                               al_generar_archivo=_registrar_archivo,
+                               libro_unico=libro_unico)
     except Exception as export_error:
         logger.error(f"[{request_id}] Error durante la exportación: {export_error}", exc_info=True)
         respuesta_error = crear_respuesta_error(
@@ -228,7 +299,6 @@ def exportar_tradicional(
         raise HTTPException(status_code=500, detail=respuesta_error)
     
     # Verificar que se generaron archivos
-    files_generated = [f for f in os.listdir(tmp_dir) if f.endswith(('.xlsx', '.csv'))]
     if not files_generated:
         respuesta_error = crear_respuesta_error(
             mensaje="No se generaron archivos de exportación",
@@ -240,81 +310,220 @@ def exportar_tradicional(
     return files_generated
 
 
-def crear_zip_exportacion(tmp_dir: str, request_id: str) -> bytes:
+class SalidaZipStreaming(io.RawIOBase):
     """
-    Crea un archivo ZIP con los archivos de exportación.
-    Retorna los bytes del archivo ZIP.
+    Destino no posicionable para zipfile: acumula los bytes escritos hasta que se retiran.
+    Al no poder hacer seek, zipfile escribe cada entrada con data descriptor.
     """
-    zip_path = os.path.join(tmp_dir, "export.zip")
-    try:
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for root, _, files in os.walk(tmp_dir):
-                for f in files:
-                    if f == "export.zip":
-                        continue
-                    full = os.path.join(root, f)
-                    arcname = os.path.relpath(full, tmp_dir)
-                    zf.write(full, arcname)
-    except Exception as zip_error:
-        logger.error(f"[{request_id}] Error creando archivo ZIP: {zip_error}")
-        respuesta_error = crear_respuesta_error(
-            mensaje="No se pudo crear archivo ZIP",
-            codigo=500,
-            detalles=str(zip_error)
-        )
-        raise HTTPException(status_code=500, detail=respuesta_error)
     
-    # Verificar que el zip se creó
-    if not os.path.exists(zip_path):
-        respuesta_error = crear_respuesta_error(
-            mensaje="No se pudo crear archivo ZIP",
-            codigo=500,
-            detalles="El archivo ZIP no se generó correctamente"
-        )
-        raise HTTPException(status_code=500, detail=respuesta_error)
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicion = 0
     
-    # Leer el archivo zip como bytes
-    try:
-        with open(zip_path, "rb") as f:
-            zip_bytes = f.read()
-    except Exception as read_error:
-        logger.error(f"[{request_id}] Error leyendo archivo ZIP: {read_error}")
-        respuesta_error = crear_respuesta_error(
-            mensaje="Error leyendo archivo ZIP generado",
-            codigo=500,
-            detalles=str(read_error)
-        )
-        raise HTTPException(status_code=500, detail=respuesta_error)
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+    
+    def tell(self) -> int:
+        return self._posicion
+    
+    def retirar(self) -> bytes:
+        """Retorna y descarta los bytes pendientes."""
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+_FIN_EXPORTACION = object()
+
+
+class ExportacionCancelada(Exception):
+    """El ZIP en streaming se cortó (cliente desconectado o error): la exportación no debe seguir."""
+
+
+class EstadoExportacionStreaming:
+    """
+    Estado compartido entre la exportación (en el pool de threads) y el generador del ZIP.
+    
+    Si el generador termina antes que la exportación, marca la cancelación y el callback
+    al_generar_archivo la corta en el siguiente archivo. tmp_dir se elimina recién cuando
+    terminaron los dos (la exportación después de encolar _FIN_EXPORTACION), así no se borra
+    un directorio en el que el worker todavía escribe.
+    """
+    
+    def __init__(self, tmp_dir: str):
+        self.tmp_dir = tmp_dir
+        self.cola = queue.Queue()
+        self.cancelada = threading.Event()
+        # Tablas sin archivo; se completa antes de encolar _FIN_EXPORTACION
+        self.tablas_fallidas = set()
+        self._pendientes = 2
+        self._lock = threading.Lock()
+    
+    def al_generar_archivo(self, ruta: str):
+        if self.cancelada.is_set():
+            raise ExportacionCancelada("El ZIP en streaming se cortó, se cancela la exportación")
+        self.cola.put(ruta)
+    
+    def liberar(self):
+        """Lo llaman la exportación y el generador al terminar; el último elimina tmp_dir."""
+        with self._lock:
+            self._pendientes -= 1
+            ultimo = self._pendientes == 0
+        if ultimo:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def iniciar_exportacion_streaming(
+    request_id: str,
+    tmp_dir: str,
+    exportar: Callable[[Callable[[str], None]], object],
+    copia_cache: Optional[Any] = None
+) -> Iterator[bytes]:
+    """
+    Ejecuta la exportación en el pool de threads y retorna un generador con el ZIP en streaming.
+    
+    `exportar` recibe el callback al_generar_archivo y debe invocarlo con la ruta de cada
+    archivo terminado. Se espera al primer archivo antes de retornar, de modo que los errores
+    previos (validaciones, sin archivos) se siguen propagando como HTTPException.
+    Una vez retornado el generador, tmp_dir se elimina cuando terminan el generador y la
+    exportación (ver EstadoExportacionStreaming); si no, lo elimina quien llama.
+    
+    Si se pasa `copia_cache` (ver export_cache_service.EscrituraCache), los bytes del ZIP
+    también se escriben ahí y se confirma solo si la exportación terminó sin errores y
+    todas las tablas generaron su archivo.
+    """
+    estado = EstadoExportacionStreaming(tmp_dir)
+    cola = estado.cola
     
-    # Verificar que el ZIP no esté vacío
-    if len(zip_bytes) == 0:
+    def _tarea():
+        # Los threads del pool se reutilizan: restaurar el contexto al terminar
+        token = TABLAS_FALLIDAS_EXPORTACION.set(estado.tablas_fallidas)
+        try:
+            exportar(estado.al_generar_archivo)
+        except ExportacionCancelada:
+            logger.warning(f"[{request_id}] Exportación cancelada: el ZIP en streaming se cortó")
+        except BaseException as e:
+            cola.put(e)
+        finally:
+            TABLAS_FALLIDAS_EXPORTACION.reset(token)
+            cola.put(_FIN_EXPORTACION)
+            estado.liberar()
+    
+    GLOBAL_THREAD_POOL.submit(_tarea)
+    
+    primero = cola.get()
+    if isinstance(primero, BaseException) or primero is _FIN_EXPORTACION:
+        if copia_cache is not None:
+            copia_cache.descartar()
+    if isinstance(primero, BaseException):
+        raise primero
+    if primero is _FIN_EXPORTACION:
         respuesta_error = crear_respuesta_error(
-            mensaje="Archivo ZIP generado está vacío",
+            mensaje="No se generaron archivos de exportación",
             codigo=500,
-            detalles="El archivo ZIP se creó pero no contiene datos"
+            detalles="No se generaron archivos en el directorio temporal"
         )
         raise HTTPException(status_code=500, detail=respuesta_error)
     
-    return zip_bytes
+    return generar_zip_streaming(request_id, estado, primero, copia_cache)
+
+
+def generar_zip_streaming(
+    request_id: str,
+    estado: EstadoExportacionStreaming,
+    primer_archivo: str,
+    copia_cache: Optional[Any] = None
+) -> Iterator[bytes]:
+    """
+    Arma el ZIP a medida que llegan archivos por la cola y va entregando sus bytes.
+    Cada entrada usa zip64 y data descriptor, así no hace falta conocer tamaños de antemano.
+    Si la exportación falla a mitad de camino se relanza el error sin escribir el directorio
+    central, para que el cliente reciba una respuesta cortada y no un ZIP válido incompleto.
+    """
+    tmp_dir = estado.tmp_dir
+    cola = estado.cola
+    salida = SalidaZipStreaming()
+    total_bytes = 0
+    total_archivos = 0
+    
+    def _retirar() -> bytes:
+        datos = salida.retirar()
+        if datos and copia_cache is not None:
+            copia_cache.write(datos)
+        return datos
+    
+    try:
+        with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            item = primer_archivo
+            while item is not _FIN_EXPORTACION:
+                if isinstance(item, BaseException):
+                    # La respuesta ya comenzó: cortar el stream para que el ZIP quede inválido
+                    logger.error(f"[{request_id}] Error durante la exportación en streaming: {item}")
+                    raise item
+                
+                arcname = os.path.relpath(item, tmp_dir)
+                with open(item, "rb") as origen, zf.open(arcname, "w", force_zip64=True) as destino:
+                    while True:
+                        bloque = origen.read(EXPORT_ZIP_CHUNK_SIZE)
+                        if not bloque:
+                            break
+                        destino.write(bloque)
+                        datos = _retirar()
+                        if datos:
+                            total_bytes += len(datos)
+                            yield datos
+                
+                # El archivo ya está en el ZIP: liberar disco
+                os.remove(item)
+                total_archivos += 1
+                datos = _retirar()
+                if datos:
+                    total_bytes += len(datos)
+                    yield datos
+                
+                item = cola.get()
+        
+        # Directorio central del ZIP
+        datos = _retirar()
+        total_bytes += len(datos)
+        yield datos
+        logger.info(f"[{request_id}] ZIP enviado en streaming: {total_bytes} bytes, {total_archivos} archivo(s)")
+        if copia_cache is not None:
+            if estado.tablas_fallidas:
+                logger.warning(
+                    f"[{request_id}] ZIP incompleto, no se guarda en caché. "
+                    f"Tablas sin archivo: {', '.join(sorted(estado.tablas_fallidas))}"
+                )
+            else:
+                copia_cache.confirmar()
+    finally:
+        if copia_cache is not None:
+            copia_cache.descartar()
+        # Si la exportación sigue corriendo (cliente desconectado), se corta en el próximo archivo
+        estado.cancelada.set()
+        estado.liberar()
 
 
 def exportar_por_lote(
     request_id: str,
     tmp_dir: str,
     lote_id: int,
-    formato: str
+    formato: str,
+    al_generar_archivo: Optional[Callable[[str], None]] = None,
+    libro_unico: bool = False
 ) -> List[str]:
     """
     Exporta todos los análisis asociados a un lote específico.
     Retorna lista de archivos generados.
     """
-    # #region agent log
-    import json as _json_log
-    try:
-        with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-            _f.write(_json_log.dumps({"location": "export_service.py:exportar_por_lote", "message": "Starting export", "data": {"request_id": request_id, "lote_id": lote_id, "formato": formato}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "E"}) + "\n")
-    except: pass
-    # #endregion
+    TRAZA.evento("info", "export_service.py:exportar_por_lote", "Inicio de exportación",
+                 request_id=request_id, lote_id=lote_id, formato=formato)
     logger.info(f"[{request_id}] Exportando análisis para lote {lote_id}")
     
     # Inicializar engine y sesión
@@ -323,18 +532,14 @@ def exportar_por_lote(
     Session = sessionmaker(bind=engine)
     session = Session()
     
-    # #region agent log
-    try:
-        # Check encoding settings
-        encoding_result = session.execute(__import__('sqlalchemy').text("SHOW client_encoding")).fetchone()
-        with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-            _f.write(_json_log.dumps({"location": "export_service.py:exportar_por_lote_encoding", "message": "DB client encoding", "data": {"client_encoding": str(encoding_result[0]) if encoding_result else "unknown"}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "E"}) + "\n")
-    except Exception as _e:
+    if TRAZA.debug:
         try:
-            with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                _f.write(_json_log.dumps({"location": "export_service.py:exportar_por_lote_encoding_error", "message": "Error checking encoding", "data": {"error": str(_e)}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "E"}) + "\n")
-        except: pass
-    # #endregion
+            encoding_result = session.execute(text("SHOW client_encoding")).fetchone()
+            TRAZA.evento("debug", "export_service.py:exportar_por_lote", "Codificación del cliente",
+                         client_encoding=str(encoding_result[0]) if encoding_result else "unknown")
+        except Exception as encoding_error:
+            TRAZA.evento("error", "export_service.py:exportar_por_lote", "Error al consultar la codificación",
+                         error=str(encoding_error))
     
     try:
         # Ejecutar exportación por lote
@@ -342,15 +547,13 @@ def exportar_por_lote(
             session=session,
             lote_id=lote_id,
             output_dir=tmp_dir,
-            fmt=formato
+            fmt=formato,
+            al_generar_archivo=al_generar_archivo,
+            libro_unico=libro_unico
         )
         
-        # #region agent log
-        try:
-            with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                _f.write(_json_log.dumps({"location": "export_service.py:exportar_por_lote_success", "message": "Export completed", "data": {"archivos": archivos_generados}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "E"}) + "\n")
-        except: pass
-        # #endregion
+        TRAZA.evento("info", "export_service.py:exportar_por_lote", "Exportación completada",
+                     archivos=archivos_generados)
         
         if not archivos_generados:
             respuesta_error = crear_respuesta_error(
@@ -362,14 +565,92 @@ def exportar_por_lote(
         
         return [os.path.basename(f) for f in archivos_generados]
     except Exception as _export_err:
-        # #region agent log
-        try:
-            import traceback as _tb
-            with open(r"c:\Github\IniaProject\.cursor\debug.log", "a", encoding="utf-8") as _f:
-                _f.write(_json_log.dumps({"location": "export_service.py:exportar_por_lote_error", "message": "EXPORT ERROR", "data": {"error": str(_export_err), "type": type(_export_err).__name__, "traceback": _tb.format_exc()}, "timestamp": __import__('time').time(), "sessionId": "debug-session", "hypothesisId": "E"}) + "\n")
-        except: pass
-        # #endregion
+        if TRAZA.error:
+            TRAZA.evento("error", "export_service.py:exportar_por_lote", "Error de exportación",
+                         error=str(_export_err), tipo=type(_export_err).__name__,
+                         traceback=traceback.format_exc())
         raise
     finally:
         session.close()
 
+
+def parsear_lote_ids(lote_ids: str) -> List[int]:
+    """
+    Convierte 'id1,id2,...' en una lista de IDs de lote sin repetidos.
+    Lanza HTTPException 400 si algún ID no es entero, la lista está vacía o supera EXPORT_MAX_LOTES.
+    """
+    ids = []
+    for valor in lote_ids.split(","):
+        valor = valor.strip()
+        if not valor:
+            continue
+        try:
+            lote_id = int(valor)
+        except ValueError:
+            respuesta_error = crear_respuesta_error(
+                mensaje="ID de lote inválido",
+                codigo=400,
+                detalles=f"'{valor}' no es un ID de lote válido"
+            )
+            raise HTTPException(status_code=400, detail=respuesta_error)
+        if lote_id not in ids:
+            ids.append(lote_id)
+    
+    if not ids:
+        respuesta_error = crear_respuesta_error(
+            mensaje="No se indicaron lotes",
+            codigo=400,
+            detalles="lote_ids debe contener al menos un ID de lote"
+        )
+        raise HTTPException(status_code=400, detail=respuesta_error)
+    if len(ids) > EXPORT_MAX_LOTES:
+        respuesta_error = crear_respuesta_error(
+            mensaje="Demasiados lotes",
+            codigo=400,
+            detalles=f"Se indicaron {len(ids)} lotes; el máximo por pedido es {EXPORT_MAX_LOTES}"
+        )
+        raise HTTPException(status_code=400, detail=respuesta_error)
+    return ids
+
+
+def exportar_por_lotes(
+    request_id: str,
+    tmp_dir: str,
+    lote_ids: List[int],
+    formato: str,
+    agrupar: str = "carpetas",
+    al_generar_archivo: Optional[Callable[[str], None]] = None
+) -> List[str]:
+    """
+    Exporta los análisis de varios lotes (una consulta por tipo de análisis).
+    Retorna lista de archivos generados, relativos a tmp_dir (lote_<id>/tabla.ext o tabla.xlsx).
+    """
+    logger.info(f"[{request_id}] Exportando análisis para {len(lote_ids)} lote(s), agrupados por {agrupar}")
+    
+    engine = obtener_engine()
+    inicializar_automap(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    
+    try:
+        archivos_generados = export_analisis_por_lotes(
+            session=session,
+            lote_ids=lote_ids,
+            output_dir=tmp_dir,
+            fmt=formato,
+            al_generar_archivo=al_generar_archivo,
+            agrupar=agrupar
+        )
+        
+        if not archivos_generados:
+            respuesta_error = crear_respuesta_error(
+                mensaje="No se generaron archivos de exportación",
+                codigo=404,
+                detalles="No se encontraron análisis asociados a los lotes indicados"
+            )
+            raise HTTPException(status_code=404, detail=respuesta_error)
+        
+        return [os.path.relpath(f, tmp_dir) for f in archivos_generados]
+    finally:
+        session.close()
+
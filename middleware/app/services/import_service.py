@@ -149,9 +149,9 @@ async def procesar_un_archivo(
                 # Leer headers del archivo
                 try:
                     if fmt_temp == "csv":
-                        headers, _ = read_rows_from_csv(tmp_path)
+                        headers, _ = read_rows_from_csv(tmp_path, max_rows=1)
                     else:
-                        headers, _ = read_rows_from_xlsx(tmp_path)
+                        headers, _ = read_rows_from_xlsx(tmp_path, max_rows=1)
                 except Exception as read_error:
                     logger.error(f"Error leyendo headers del archivo: {read_error}", exc_info=True)
                     resultado["error"] = obtener_mensaje_error_seguro(read_error, "Error leyendo encabezados del archivo")
@@ -0,0 +1,51 @@
+"""
+Servicio del asesor de índices.
+Ejecuta IndexAdvisor sobre la base configurada y lo expone a la API.
+"""
+import logging
+from typing import Optional, List, Dict, Any
+from fastapi import HTTPException
+from IndexAdvisor import analizar_indices, ORIGENES_CONSULTAS
+from app.core.responses import crear_respuesta_error, obtener_mensaje_error_seguro
+from app.config import INDEX_ADVISOR_ALLOW_APPLY
+
+logger = logging.getLogger(__name__)
+
+
+def analizar_indices_bd(request_id: str, origenes: str, aplicar: bool) -> Dict[str, Any]:
+    """
+    Analiza las consultas de exportación/importación y propone índices.
+    `origenes` es una lista separada por comas (vacía = todas). Crear índices desde la API
+    requiere INDEX_ADVISOR_ALLOW_APPLY; si no está habilitado responde 403.
+    """
+    lista_origenes: Optional[List[str]] = [o.strip() for o in origenes.split(",") if o.strip()] or None
+    invalidos = [o for o in (lista_origenes or []) if o not in ORIGENES_CONSULTAS]
+    if invalidos:
+        respuesta_error = crear_respuesta_error(
+            mensaje="Origen de consultas inválido",
+            codigo=400,
+            detalles=f"Orígenes desconocidos: {', '.join(invalidos)}. Válidos: {', '.join(ORIGENES_CONSULTAS)}"
+        )
+        raise HTTPException(status_code=400, detail=respuesta_error)
+    if aplicar and not INDEX_ADVISOR_ALLOW_APPLY:
+        respuesta_error = crear_respuesta_error(
+            mensaje="Creación de índices deshabilitada",
+            codigo=403,
+            detalles="Habilite INDEX_ADVISOR_ALLOW_APPLY para crear índices desde la API"
+        )
+        raise HTTPException(status_code=403, detail=respuesta_error)
+
+    logger.info(f"[{request_id}] Analizando índices. Orígenes: {lista_origenes or 'todos'}, Aplicar: {aplicar}")
+    try:
+        reporte = analizar_indices(lista_origenes, aplicar=aplicar)
+    except Exception as e:
+        logger.error(f"[{request_id}] Error analizando índices: {e}", exc_info=True)
+        respuesta_error = crear_respuesta_error(
+            mensaje="Error analizando índices",
+            codigo=500,
+            detalles=obtener_mensaje_error_seguro(e, "Error analizando índices")
+        )
+        raise HTTPException(status_code=500, detail=respuesta_error)
+    logger.info(f"[{request_id}] Análisis de índices completado: {len(reporte['consultas'])} consulta(s), "
+                f"{len(reporte['propuestas'])} índice(s) propuesto(s)")
+    return reporte
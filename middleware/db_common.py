@@ -14,6 +14,9 @@ _engine = None
 _models_initialized = False
 MODELS = {}
 _TABLES_CACHE = {}
+_FOREIGN_KEYS_CACHE = {}
+# Planes de conversión de ImportExcel por (modelo, headers); referencian modelos del automap
+_PLANES_CONVERSION = {}
 
 logger = logging.getLogger(__name__)
 
@@ -417,10 +420,12 @@ def reset_automap():
     """
     Resetea el estado del automapeo (útil para tests).
     """
-    global Base, _engine, _models_initialized, MODELS, _TABLES_CACHE
+    global Base, _engine, _models_initialized, MODELS, _TABLES_CACHE, _FOREIGN_KEYS_CACHE
     Base = None
     _engine = None
     _models_initialized = False
     MODELS.clear()
     _TABLES_CACHE.clear()
+    _FOREIGN_KEYS_CACHE.clear()
+    _PLANES_CONVERSION.clear()
 
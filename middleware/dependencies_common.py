@@ -87,6 +87,22 @@ def importar_pandas():
     return pd, np
 
 
+def importar_pyarrow():
+    """
+    Importa pyarrow si está instalado (dependencia opcional, no se instala automáticamente).
+    
+    Returns:
+        Tupla con (success, pyarrow, pyarrow.parquet)
+        Si success es False, los demás valores serán None
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        return True, pa, pq
+    except ImportError:
+        return False, None, None
+
+
 def importar_openpyxl():
     """
     Importa openpyxl asegurando que esté instalado.
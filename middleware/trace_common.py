@@ -0,0 +1,165 @@
+"""
+Módulo común para trazas de diagnóstico.
+
+Reemplaza las escrituras directas a un archivo de debug: cada evento se descarta,
+se guarda en un buffer circular en memoria o se encola para un hilo que lo escribe
+a disco (JSON por línea), según la configuración.
+
+Configuración por variables de entorno:
+- TRACE_LEVEL: off | error | info | debug (default: off)
+- TRACE_SAMPLE_RATE: fracción (0..1) de eventos info/debug que se registran (default: 1.0)
+- TRACE_SINK: memory | file (default: memory)
+- TRACE_FILE: archivo destino cuando TRACE_SINK=file (default: trace.log)
+- TRACE_BUFFER_SIZE: eventos guardados en memoria / encolados para disco (default: 10000)
+
+Con las trazas deshabilitadas, el costo en el código caliente es leer un atributo
+booleano: los llamadores chequean `TRAZA.debug` (o `TRAZA.info`, `TRAZA.error`)
+antes de armar los datos del evento.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from collections import deque
+from typing import Optional, List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+NIVELES_TRAZA = {"off": 0, "error": 1, "info": 2, "debug": 3}
+
+
+class _SumideroMemoria:
+    """Guarda los últimos eventos en un buffer circular."""
+
+    def __init__(self, capacidad: int):
+        self.eventos = deque(maxlen=capacidad)
+
+    def escribir(self, evento: Dict[str, Any]):
+        self.eventos.append(evento)
+
+    def obtener(self) -> List[Dict[str, Any]]:
+        return list(self.eventos)
+
+    def cerrar(self):
+        pass
+
+
+class _SumideroArchivo:
+    """Encola los eventos y un hilo en segundo plano los escribe como JSON por línea."""
+
+    def __init__(self, ruta: str, capacidad: int):
+        self.ruta = ruta
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.descartados = 0
+        self.hilo = threading.Thread(target=self._escribir_en_disco, name="trace-sink", daemon=True)
+        self.hilo.start()
+
+    def escribir(self, evento: Dict[str, Any]):
+        # Nunca bloquear al llamador: si el disco no da abasto, se descarta el evento
+        try:
+            self.cola.put_nowait(evento)
+        except queue.Full:
+            self.descartados += 1
+
+    def _escribir_en_disco(self):
+        with open(self.ruta, "a", encoding="utf-8") as f:
+            while True:
+                evento = self.cola.get()
+                if evento is None:
+                    break
+                f.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+                if self.cola.empty():
+                    f.flush()
+
+    def obtener(self) -> List[Dict[str, Any]]:
+        return []
+
+    def cerrar(self):
+        self.cola.put(None)
+        self.hilo.join(timeout=5)
+        if self.descartados:
+            logger.warning(f"Trazas descartadas por cola llena: {self.descartados}")
+
+
+class Trazador:
+    """
+    Registro de eventos de diagnóstico con niveles y muestreo.
+
+    Los atributos `error`, `info` y `debug` indican si ese nivel está habilitado y
+    se recalculan solo al configurar, para que chequearlos no cueste nada.
+    """
+
+    def __init__(self):
+        self.nivel = 0
+        self.tasa_muestreo = 1.0
+        self.error = self.info = self.debug = False
+        self._sumidero = None
+        self._lock = threading.Lock()
+
+    def configurar(self, nivel: str = "off", tasa_muestreo: float = 1.0, sumidero: str = "memory",
+                   archivo: Optional[str] = None, capacidad: int = 10000):
+        """Reconfigura el nivel, el muestreo y el destino de las trazas."""
+        with self._lock:
+            if self._sumidero is not None:
+                self._sumidero.cerrar()
+                self._sumidero = None
+            self.nivel = NIVELES_TRAZA.get((nivel or "off").lower(), 0)
+            self.tasa_muestreo = min(max(float(tasa_muestreo), 0.0), 1.0)
+            if self.nivel:
+                if sumidero == "file":
+                    self._sumidero = _SumideroArchivo(archivo or "trace.log", capacidad)
+                else:
+                    self._sumidero = _SumideroMemoria(capacidad)
+            self.error = self.nivel >= NIVELES_TRAZA["error"]
+            self.info = self.nivel >= NIVELES_TRAZA["info"]
+            self.debug = self.nivel >= NIVELES_TRAZA["debug"]
+
+    def evento(self, nivel: str, ubicacion: str, mensaje: str, **datos):
+        """
+        Registra un evento si su nivel está habilitado.
+
+        Los errores se registran siempre; info y debug pasan por el muestreo.
+        """
+        nivel_evento = NIVELES_TRAZA.get(nivel, NIVELES_TRAZA["debug"])
+        sumidero = self._sumidero
+        if nivel_evento > self.nivel or sumidero is None:
+            return
+        if nivel_evento > NIVELES_TRAZA["error"] and self.tasa_muestreo < 1.0 and random.random() >= self.tasa_muestreo:
+            return
+        sumidero.escribir({
+            "timestamp": time.time(),
+            "nivel": nivel,
+            "ubicacion": ubicacion,
+            "mensaje": mensaje,
+            "hilo": threading.current_thread().name,
+            "datos": datos,
+        })
+
+    def obtener_eventos(self) -> List[Dict[str, Any]]:
+        """Retorna los eventos del buffer en memoria (vacío con sumidero de archivo)."""
+        sumidero = self._sumidero
+        return sumidero.obtener() if sumidero is not None else []
+
+    def cerrar(self):
+        """Vacía y cierra el destino actual (escribe lo pendiente si es archivo)."""
+        with self._lock:
+            if self._sumidero is not None:
+                self._sumidero.cerrar()
+                self._sumidero = None
+            self.nivel = 0
+            self.error = self.info = self.debug = False
+
+
+TRAZA = Trazador()
+TRAZA.configurar(
+    nivel=os.getenv("TRACE_LEVEL", "off"),
+    tasa_muestreo=float(os.getenv("TRACE_SAMPLE_RATE", 1.0)),
+    sumidero=os.getenv("TRACE_SINK", "memory").lower(),
+    archivo=os.getenv("TRACE_FILE", "trace.log"),
+    capacidad=int(os.getenv("TRACE_BUFFER_SIZE", 10000)),
+)
+atexit.register(TRAZA.cerrar)